@@ -1,26 +1,53 @@
 """VControld integration"""
 
+import asyncio
 import enum
 import logging
-import telnetlib
+import math
 import time
-import sys
-import re
-
-from threading import Lock
-from datetime import datetime
+import xml.etree.ElementTree as ET
 
 import voluptuous as vol
 
 from homeassistant.const import (
-    CONF_CLIENT_ID,
+    CONF_DEVICE,
     CONF_NAME,
     CONF_HOST,
+    CONF_PATH,
     CONF_PORT,
-    CONF_SCAN_INTERVAL
+    CONF_SCAN_INTERVAL,
+    CONF_SENSORS,
+    EVENT_HOMEASSISTANT_STOP,
 )
+from homeassistant.core import SupportsResponse, callback
+from homeassistant.exceptions import HomeAssistantError
 from homeassistant.helpers import discovery
+from homeassistant.helpers import entity_registry as er
 import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.storage import STORAGE_DIR, Store
+from homeassistant.util import slugify
+
+from .pyvcontrold import (
+    CIRCUITS,
+    DEFAULT_COMMANDS,
+    DEFAULT_MAX_TIMEOUT,
+    DEFAULT_MIN_TIMEOUT,
+    DEFAULT_TTLS,
+    FRESHNESS_LIVE,
+    FRESHNESS_SLOW,
+    FRESHNESS_STATIC,
+    PRIORITY_POLL,
+    PRIORITY_USER,
+    CommandCache,
+    Device,
+    OptolinkDevice,
+    TimeoutEstimator,
+    WriteCoalescer,
+    circuit_command,
+    load_commands,
+    parse_float,
+    parse_int,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -28,13 +55,83 @@ PLATFORMS = ["climate", "sensor", "binary_sensor", "water_heater"]
 
 DOMAIN = "vcontrold"
 VC_API = "api"
+VC_COORDINATOR = "coordinator"
 VC_NAME = "name"
 VC_HEATING_TYPE = "heating_type"
+VC_AGGREGATE_WINDOW = "aggregate_window"
+VC_COMMANDS = "commands"
+VC_CIRCUITS = "circuits"
+
+SERVICE_DIAGNOSTICS = "diagnostics"
 
 CONF_HEATING_TYPE = "heating_type"
+CONF_CACHE = "cache"
+CONF_COMMANDS = "commands"
+CONF_TIERS = "tiers"
+CONF_ADAPTIVE = "adaptive"
+CONF_MIN_FACTOR = "min_factor"
+CONF_MAX_FACTOR = "max_factor"
+CONF_TIMEOUTS = "timeouts"
+CONF_AGGREGATE_WINDOW = "aggregate_window"
+CONF_MIN_TIMEOUT = "min"
+CONF_MAX_TIMEOUT = "max"
+CONF_XML = "xml"
+CONF_CIRCUITS = "circuits"
+CONF_COMMAND = "command"
 DEFAULT_HEATING_TYPE = "generic"
+
+# The inventory ID of each device names its entities, it is kept across restarts
+STORAGE_KEY = DOMAIN
+STORAGE_VERSION = 1
+STORE_INVENTORY = "inventory"
+# Set once the unique IDs of the first device carry its name too, they were
+# made of the inventory ID alone before
+STORE_NAMED_IDS = "named_unique_ids"
+# Seconds between reads while no inventory ID is known
+INVENTORY_RETRY = 30
+# Command definitions parsed from vcontrold.xml, rebuilt when the file changes
+COMMANDS_CACHE = f"{DOMAIN}.commands"
 DEFAULT_HOST = "127.0.0.1"
 DEFAULT_PORT = 3002
+# Seconds of samples behind the min, mean and max of measurement sensors
+DEFAULT_AGGREGATE_WINDOW = 300
+
+TIER_FAST = "fast"
+TIER_NORMAL = "normal"
+TIER_SLOW = "slow"
+TIER_ON_DEMAND = "on_demand"
+# Fastest first, on_demand commands are only read when an entity asks for them
+TIERS = [TIER_FAST, TIER_NORMAL, TIER_SLOW, TIER_ON_DEMAND]
+DEFAULT_FAST_INTERVAL = 10
+DEFAULT_SLOW_INTERVAL = 3600
+
+# Commands of a tier are polled in batches of SLOT_SIZE spread over its interval
+SLOT_SIZE = 4
+# Commands due within this many seconds join the batch being polled
+COALESCE_WINDOW = 1
+# Seconds the first refresh waits for the platforms to register their commands
+PLATFORM_TIMEOUT = 30
+
+# In adaptive mode, the fast and normal tiers speed up while the burner or
+# the pump runs and back off while both are idle
+ADAPTIVE_TIERS = [TIER_FAST, TIER_NORMAL]
+ADAPTIVE_BURNER = "getBrennerStatus"                      # "getModulationDegree"
+ADAPTIVE_PUMP = "getPumpeStatusIntern"                    # "getInternalPump"
+DEFAULT_MIN_FACTOR = 0.25
+DEFAULT_MAX_FACTOR = 4
+# Interval growth per idle observation, up to the max factor
+IDLE_BACKOFF = 1.5
+
+# Commands whose value rarely changes, all others are read on every cycle
+DEFAULT_FRESHNESS = {
+    "getBrennerStunden1": FRESHNESS_SLOW,                 # "getBurnerHop"
+    "getBrennerStarts": FRESHNESS_SLOW,                   # "getBurnerStarts"
+    "getTempWWsoll": FRESHNESS_SLOW,                      # "getWarmwaterTtarget"
+    "getTempRaumNorSollM1": FRESHNESS_SLOW,               # "getRequestedRoomTnormalA1M1"
+    "getTempRaumRedSollM1": FRESHNESS_SLOW,
+    "getTempPartyM1": FRESHNESS_SLOW,                     # "getPartyTtargetA1M1"
+    "getInventory": FRESHNESS_STATIC,
+}
 
 class HeatingType(enum.Enum):
     """Possible options for heating type."""
@@ -45,181 +142,675 @@ class HeatingType(enum.Enum):
     fuelcell = "fuelcell"
 
 
-CONFIG_SCHEMA = vol.Schema(
+def _seconds(value):
+    return value.total_seconds()
+
+FRESHNESS_SCHEMA = vol.Any(
+    vol.In([FRESHNESS_LIVE, FRESHNESS_SLOW, FRESHNESS_STATIC]),
+    vol.All(cv.time_period, _seconds),
+)
+
+CACHE_SCHEMA = vol.Schema(
     {
-        DOMAIN: vol.Schema(
-            {
-                vol.Required(CONF_HOST, default=DEFAULT_HOST): cv.string,
-                vol.Required(CONF_PORT, default=DEFAULT_PORT): cv.port,
-                vol.Optional(CONF_NAME, default="Vitodens"): cv.string,
-                vol.Optional(CONF_SCAN_INTERVAL, default=60): vol.All(
-                    cv.time_period, lambda value: value.total_seconds()
-                ),
-                vol.Optional(CONF_HEATING_TYPE, default=DEFAULT_HEATING_TYPE): cv.enum(
-                    HeatingType
-                ),
-            }
-        )
-    },
+        vol.Optional(FRESHNESS_LIVE, default=DEFAULT_TTLS[FRESHNESS_LIVE]): vol.All(
+            cv.time_period, _seconds
+        ),
+        vol.Optional(FRESHNESS_SLOW, default=DEFAULT_TTLS[FRESHNESS_SLOW]): vol.All(
+            cv.time_period, _seconds
+        ),
+        vol.Optional(FRESHNESS_STATIC, default=DEFAULT_TTLS[FRESHNESS_STATIC]): vol.All(
+            cv.time_period, _seconds
+        ),
+        vol.Optional(CONF_COMMANDS, default={}): {cv.string: FRESHNESS_SCHEMA},
+    }
+)
+
+TIERS_SCHEMA = vol.Schema(
+    {
+        vol.Optional(TIER_FAST, default=DEFAULT_FAST_INTERVAL): vol.All(
+            cv.time_period, _seconds
+        ),
+        vol.Optional(TIER_SLOW, default=DEFAULT_SLOW_INTERVAL): vol.All(
+            cv.time_period, _seconds
+        ),
+        vol.Optional(CONF_COMMANDS, default={}): {cv.string: vol.In(TIERS)},
+    }
+)
+
+ADAPTIVE_SCHEMA = vol.Schema(
+    {
+        vol.Optional(CONF_MIN_FACTOR, default=DEFAULT_MIN_FACTOR): vol.All(
+            vol.Coerce(float), vol.Range(min=0.05, max=1)
+        ),
+        vol.Optional(CONF_MAX_FACTOR, default=DEFAULT_MAX_FACTOR): vol.All(
+            vol.Coerce(float), vol.Range(min=1)
+        ),
+    }
+)
+
+def _ordered_timeouts(timeouts):
+    if timeouts[CONF_MIN_TIMEOUT] > timeouts[CONF_MAX_TIMEOUT]:
+        raise vol.Invalid("min timeout must not exceed max timeout")
+    return timeouts
+
+
+TIMEOUTS_SCHEMA = vol.All(
+    vol.Schema(
+        {
+            vol.Optional(CONF_MIN_TIMEOUT, default=DEFAULT_MIN_TIMEOUT): vol.All(
+                cv.time_period, _seconds
+            ),
+            vol.Optional(CONF_MAX_TIMEOUT, default=DEFAULT_MAX_TIMEOUT): vol.All(
+                cv.time_period, _seconds
+            ),
+        }
+    ),
+    _ordered_timeouts,
+)
+
+# sensors lists the commands of the XML file to show as sensors
+XML_SCHEMA = vol.Schema(
+    {
+        vol.Required(CONF_PATH): cv.isfile,
+        vol.Optional(CONF_SENSORS, default=[]): vol.All(cv.ensure_list, [cv.string]),
+    }
+)
+
+def _unique_names(devices):
+    # the names end up in unique IDs and file names, slugified
+    names = [slugify(device[CONF_NAME]) for device in devices]
+    if len(set(names)) != len(names):
+        raise vol.Invalid("device names must be unique, ignoring case and punctuation")
+    return devices
+
+
+DEVICE_SCHEMA = vol.Schema(
+    {
+        vol.Required(CONF_HOST, default=DEFAULT_HOST): cv.string,
+        vol.Required(CONF_PORT, default=DEFAULT_PORT): cv.port,
+        vol.Optional(CONF_DEVICE): cv.string,
+        vol.Optional(CONF_NAME, default="Vitodens"): cv.string,
+        vol.Optional(CONF_SCAN_INTERVAL, default=60): vol.All(
+            cv.time_period, lambda value: value.total_seconds()
+        ),
+        vol.Optional(CONF_HEATING_TYPE, default=DEFAULT_HEATING_TYPE): cv.enum(
+            HeatingType
+        ),
+        vol.Optional(CONF_CACHE, default={}): CACHE_SCHEMA,
+        vol.Optional(CONF_TIERS, default={}): TIERS_SCHEMA,
+        vol.Optional(CONF_ADAPTIVE): ADAPTIVE_SCHEMA,
+        vol.Optional(CONF_TIMEOUTS, default={}): TIMEOUTS_SCHEMA,
+        vol.Optional(CONF_XML): XML_SCHEMA,
+        vol.Optional(CONF_CIRCUITS, default=[1]): vol.All(
+            cv.ensure_list,
+            [vol.All(vol.Coerce(int), vol.In(CIRCUITS))],
+            vol.Length(min=1),
+        ),
+        vol.Optional(
+            CONF_AGGREGATE_WINDOW, default=DEFAULT_AGGREGATE_WINDOW
+        ): vol.All(cv.time_period, _seconds),
+    }
+)
+
+# A single device or a list of devices, each polled on its own connection
+CONFIG_SCHEMA = vol.Schema(
+    {DOMAIN: vol.All(cv.ensure_list, [DEVICE_SCHEMA], _unique_names)},
     extra=vol.ALLOW_EXTRA,
 )
 
-VC_GET_INVENTORYID = "getInventory"
+DIAGNOSTICS_SCHEMA = vol.Schema({vol.Optional(CONF_NAME): cv.string})
+
+
+def circuit_types(types, circuits):
+    """Repeat the entity types of heating circuit 1 for every configured circuit.
+
+    Circuit 1 keeps the types as they are, the other circuits get their
+    number in the key, the name and the command of each type.
+    """
+    result = {}
+    for key, entity in types.items():
+        command = entity[CONF_COMMAND]
+        if circuit_command(command, 2) == command:
+            result[key] = entity
+            continue
+        for circuit in circuits:
+            if circuit == 1:
+                result[key] = entity
+                continue
+            result[f"{key}_m{circuit}"] = {
+                **entity,
+                CONF_NAME: f"{entity[CONF_NAME]} M{circuit}",
+                CONF_COMMAND: circuit_command(command, circuit),
+            }
+    return result
+
+def device_unique_id(inventory, name):
+    """Return the prefix of the unique IDs of the entities of a device."""
+    return f"{inventory}-{slugify(name)}"
+
+
+@callback
+def async_migrate_unique_ids(hass, inventory, name):
+    """Add the device name to unique IDs made of the inventory ID alone.
+
+    Those were given to the entities of the first or only device.
+    """
+    registry = er.async_get(hass)
+    prefix = f"{inventory}-"
+    for entry in list(registry.entities.values()):
+        if entry.platform != DOMAIN or not entry.unique_id.startswith(prefix):
+            continue
+        key = entry.unique_id[len(prefix):]
+        if "-" in key:
+            continue
+        new_unique_id = f"{device_unique_id(inventory, name)}-{key}"
+        _LOGGER.info("Migrate %s to unique ID %s", entry.entity_id, new_unique_id)
+        registry.async_update_entity(entry.entity_id, new_unique_id=new_unique_id)
+
+
+class Coordinator:
+    """Polls the commands needed by all entities, each at the rate of its tier"""
+
+    def __init__(
+        self, hass, api, intervals, tiers=None, adaptive=None, name=DOMAIN
+    ):
+        """Init function"""
+        self.hass = hass
+        self.api = api
+        self.name = name
+        self._intervals = intervals
+        self._overrides = dict(tiers or {})
+        self._adaptive = adaptive
+        self._factor = 1.0
+        self._coalescer = WriteCoalescer(api.write, self._written)
+        self._commands = {}
+        self._phases = {}
+        self._due = {}
+        self._values = {}
+        self._updated = {}
+        self._listeners = []
+        # True while listeners are told about the values of a poll
+        self.polled = False
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._started = None
+        self._created = time.monotonic()
+        self._platforms = set(PLATFORMS)
+        self._ready = asyncio.Event()
+        self.setup_duration = None
+        self.first_refresh_duration = None
+        self.available = True
+
+    @property
+    def unique_id(self):
+        """Prefix of the unique IDs of the entities of the device."""
+        return device_unique_id(self.api.id, self.name)
+
+    def register(self, commands, platform=None):
+        """Add commands with their tier to the polled set, the faster tier wins.
+
+        A tier set for the command in the YAML configuration overrides the
+        one requested by the platform. The first refresh starts once every
+        platform registered its commands.
+        """
+        if platform is not None:
+            self._platforms.discard(platform)
+            if not self._platforms:
+                self.setup_duration = time.monotonic() - self._created
+                _LOGGER.info(
+                    "Platforms of %s set up in %.2f s", self.name, self.setup_duration
+                )
+                self._ready.set()
+        for key, tier in commands.items():
+            tier = self._overrides.get(key, tier)
+            current = self._commands.get(key)
+            if current is None or TIERS.index(tier) < TIERS.index(current):
+                self._commands[key] = tier
+                self._due[key] = 0
+        self._spread()
+        self._wakeup.set()
+
+    def _spread(self):
+        """Give each batch of a tier its own phase within the tier interval."""
+        for tier in TIERS:
+            keys = [key for key, value in self._commands.items() if value == tier]
+            slots = math.ceil(len(keys) / SLOT_SIZE)
+            for index, key in enumerate(keys):
+                self._phases[key] = (index // SLOT_SIZE) / slots
+
+    def _interval(self, key):
+        tier = self._commands[key]
+        interval = self._intervals[tier]
+        if self._adaptive is None or tier not in ADAPTIVE_TIERS:
+            return interval
+        if key in (ADAPTIVE_BURNER, ADAPTIVE_PUMP):
+            # keep watching for activity at least at the configured rate
+            return interval * min(self._factor, 1)
+        return interval * self._factor
 
-class Device:
-    """This class connects to VControld"""
+    def _next_due(self, key, now):
+        interval = self._interval(key)
+        base = self._started + self._phases[key] * interval
+        return base + (math.floor((now - base) / interval) + 1) * interval
 
-    def __init__(self, host, port):
-      """Init function"""
-      self.mutex = Lock()
-      self._host = host
-      self._port = port
-      self._inventory = None
-      self.tn = None
-      self._prompt = "vctrld>"
+    def async_start(self):
+        """Start the polling task."""
+        if self._task is None:
+            self._task = self.hass.async_create_background_task(
+                self._async_run(), f"{DOMAIN} {self.name} poll"
+            )
 
-    def connect(self):
-        global tn
-        retry=3
-        while retry!=0:
+    async def async_stop(self):
+        """Cancel the polling task and send the writes still waiting."""
+        if self._task is not None:
+            self._task.cancel()
             try:
-               _LOGGER.info("Connecting to " + self._host + ":" + str(self._port))
-               self.tn = telnetlib.Telnet(self._host, self._port)
-               _LOGGER.info("Connected")
-               self.tn.read_until(self._prompt.encode(), 1)
-               return
-            except:
-               #print("Connection ERROR " , sys.exc_info()[0])
-               _LOGGER.warn("Failed to connect to port "+str(self._port) + " %s" , sys.exc_info()[1])
-               time.sleep(1)
-               retry-=1
-        if retry==0:
-            _LOGGER.warn("Failed to connect to port "+str(self._port))
-            tn.close()
-            raise ConnectionError
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._coalescer.async_stop()
+
+    async def _async_run(self):
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.wait_for(self._ready.wait(), PLATFORM_TIMEOUT)
+        except asyncio.TimeoutError:
+            _LOGGER.warning("Platforms %s not set up, poll anyway", self._platforms)
+        # every registered command is due now, the first cycle reads them all
+        self._started = loop.time()
+        while True:
+            self._wakeup.clear()
+            now = loop.time()
+            due = [
+                key for key, tier in self._commands.items()
+                if tier != TIER_ON_DEMAND and self._due[key] <= now + COALESCE_WINDOW
+            ]
+            if due:
+                await self._async_poll(due)
+                now = loop.time()
+                if self.first_refresh_duration is None:
+                    self.first_refresh_duration = now - self._started
+                    _LOGGER.info(
+                        "First refresh of %d commands done in %.2f s",
+                        len(due), self.first_refresh_duration,
+                    )
+                if self._adaptive is not None and (
+                    ADAPTIVE_BURNER in due or ADAPTIVE_PUMP in due
+                ):
+                    self._adapt(now)
+                for key in due:
+                    self._due[key] = self._next_due(key, now)
+            scheduled = [
+                self._due[key] for key, tier in self._commands.items()
+                if tier != TIER_ON_DEMAND
+            ]
+            timeout = max(0, min(scheduled) - loop.time()) if scheduled else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _adapt(self, now):
+        """Scale the adaptive tiers after a new burner or pump reading."""
+        try:
+            active = (
+                parse_float(self.read(ADAPTIVE_BURNER)) > 0
+                or self.read(ADAPTIVE_PUMP) not in ("", "0")
+            )
+        except ValueError:
+            return
+        if active:
+            factor = self._adaptive[CONF_MIN_FACTOR]
+        else:
+            factor = min(self._factor * IDLE_BACKOFF, self._adaptive[CONF_MAX_FACTOR])
+        if factor == self._factor:
+            return
+        _LOGGER.debug("Adaptive interval factor %s", factor)
+        self._factor = factor
+        for key, tier in self._commands.items():
+            if tier in ADAPTIVE_TIERS:
+                self._due[key] = min(self._due[key], self._next_due(key, now))
+
+    async def _async_poll(self, keys):
+        _LOGGER.debug("Poll %s", keys)
+        started = time.monotonic()
+        try:
+            values = await self.api.read_many(keys)
+        except ConnectionError:
+            if self.available:
+                _LOGGER.error(
+                    "Unable to retrieve data of %s, entities are unavailable", self.name
+                )
+                self.available = False
+                self._notify(list(self._commands))
+            return
+        if not self.available:
+            _LOGGER.info("Data of %s retrieved again", self.name)
+            self.available = True
+            self._notify(list(self._commands))
+        _LOGGER.debug("Cache %s", self.api.cache.stats)
+        _LOGGER.debug("Queue %s", self.api.queue_stats)
+        self._update_values(values, started)
+        self._notify(keys, polled=True)
+
+    def _update_values(self, values, started):
+        """Take the values of a read that started at the given monotonic time.
+
+        Only replies read live by it, not served from the cache, tell the
+        coalescer which values are on the device.
+        """
+        self._values.update(values)
+        now = time.monotonic()
+        for key, value in values.items():
+            if value == "":
+                self._updated.pop(key, None)
+                continue
+            self._updated[key] = now
+            read_at = self.api.cache.read_at(key)
+            if key.startswith("get") and read_at is not None and read_at >= started:
+                self._coalescer.observe("set" + key[3:], value.split(' ', 1)[0])
+
+    def _notify(self, keys, polled=False):
+        """Call the listeners of keys, polled tells them values were just read.
+
+        Other updates change the availability or show a value about to be
+        written.
+        """
+        self.polled = polled
+        try:
+            for update_callback, listen_keys in list(self._listeners):
+                if listen_keys is None or listen_keys.intersection(keys):
+                    update_callback()
+        finally:
+            self.polled = False
+
+    @callback
+    def async_add_listener(self, update_callback, keys=None):
+        """Call update_callback whenever one of keys, or anything, was polled."""
+        listener = (update_callback, None if keys is None else set(keys))
+        self._listeners.append(listener)
+
+        @callback
+        def remove_listener():
+            self._listeners.remove(listener)
+
+        return remove_listener
+
+    async def async_request(self, keys):
+        """Read commands now, whatever their tier, for a user-triggered update."""
+        started = time.monotonic()
+        self._update_values(await self.api.read_many(keys, PRIORITY_USER), started)
 
     def read(self, key):
-      with self.mutex:
-        #_LOGGER.info("Read [" + key + "]")
-        retry = 3
-        value = ""
-        while retry!=0:
-          if self.tn is None:
-            self.connect()
-          if self.tn is None:
-            _LOGGER.warn("Failed to reconnect during read, cancel")
-            return ""
-          try:
-            ru = self.tn.read_until(self._prompt.encode(), 1)
-            if ru == "":
-              self.tn.write(b"\r\n")
-              ru = self.tn.read_until(self._prompt.encode(), 1)
-
-            #_LOGGER.debug("Read1 ["+ru.decode()+"]")
-            self.tn.write(key.encode() + b"\r\n")
-            value=self.tn.read_until(self._prompt.encode(), 1).decode().strip("\n"+self._prompt)
-            #_LOGGER.debug("Read2 ["+value+"]")
-            if value != "":
-              break;
-          except:
-            _LOGGER.warn("Failed to read, retry")
-          retry-=1
-        if retry==0:
-          _LOGGER.warn("Failed to read "+key+", cancel")
-          self.tn.close()
-          self.tn = None
-          return ""
-        if value.startswith("ERR"):
-            self.tn.write(bytes('close', 'ascii') + b"\r\n")
-            self.tn = None
-            return ""
-        value = value.strip("\n"+self._prompt)
-        _LOGGER.debug("Read ["+key + "] value=[" + value + "]")
-        return value
+        """Return the last value polled for key, or the value about to be set."""
+        if key.startswith("get"):
+            pending = self._coalescer.pending("set" + key[3:])
+            if pending is not None:
+                return pending
+        return self._values.get(key, "")
+
+    def writing(self, key):
+        """Return True while a value for the get command key waits to be written."""
+        return (
+            key.startswith("get")
+            and self._coalescer.pending("set" + key[3:]) is not None
+        )
+
+    async def async_read_current(self, key):
+        """Return the current value of key, read live only when the view is stale.
+
+        The view is fresh when the command was polled or successfully set
+        within its polling interval. A value waiting to be written wins.
+        Raises HomeAssistantError when the device cannot be reached.
+        """
+        if key.startswith("get"):
+            pending = self._coalescer.pending("set" + key[3:])
+            if pending is not None:
+                return pending
+        updated = self._updated.get(key)
+        if updated is not None and time.monotonic() - updated <= self._max_age(key):
+            return self._values[key]
+        _LOGGER.debug("%s is stale, read it", key)
+        started = time.monotonic()
+        try:
+            value = await self.api.read(key)
+        except ConnectionError as err:
+            raise HomeAssistantError(
+                f"Unable to read {key} from {self.name}: {err}"
+            ) from err
+        self._update_values({key: value}, started)
+        return self._values[key]
+
+    def _max_age(self, key):
+        """Return the age up to which a value of key counts as current."""
+        if key in self._commands:
+            return self._interval(key)
+        return self._intervals[TIER_NORMAL]
 
     def readint(self, key):
-      value = self.read(key)
-      val = int(value.split(' ', 1)[0])
-      _LOGGER.debug(" int val="+str(val))
-      return val
+        return parse_int(self.read(key))
+
+    @property
+    def diagnostics(self):
+        """Return bus, queue, cache and write statistics."""
+        return {
+            "inventory": self.api.id,
+            "setup_duration": self.setup_duration,
+            "first_refresh_duration": self.first_refresh_duration,
+            "interval_factor": self._factor,
+            "breaker": self.api.circuit,
+            "bus": self.api.stats.as_dict(),
+            "queue": self.api.queue_stats,
+            "cache": self.api.cache.stats,
+            "timeouts": self.api.timeouts.stats,
+            "writes": self._coalescer.stats,
+        }
 
     def readfloat(self, key):
-      value = self.read(key)
-      val = round(float(value.split(' ', 1)[0]), 2)
-      _LOGGER.debug(" float val="+str(val))
-      return val
-
-    def write(self, key, val):
-      with self.mutex:
-        #_LOGGER.debug("Write " + key +" "+ val)
-        retry = 3
-        value=""
-        while retry!=0:
-          if self.tn is None:
-            self.connect()
-          if self.tn is None:
-            _LOGGER.warn("Failed to reconnect during write, cancel")
-            return 
-          #try:
-          msg = key+" "+val + "\r\n"
-          _LOGGER.debug("Write : "+msg)
-          self.tn.write(msg.encode())
-          response = self.tn.read_until(self._prompt.encode(), 1).decode()
-          #_LOGGER.debug("Read1 ["+ru.decode()+"]")
-          #response = self.read(key)
-          _LOGGER.debug("Response : ["+response+"]")
-          if response.startswith('OK'):
-            _LOGGER.debug("Success")
-            return
-          #except:
-          #  _LOGGER.warn("Failed to write, reconnect")
-          #  self.tn.close()
-          #  self.tn = None
-          _LOGGER.warn("retry")
-          retry-=1
-        if retry==0:
-          _LOGGER.warn("Failed to write, cancel")
-          if (self.tn is not None):
-            self.tn.close()
-            self.tn = None
+        return parse_float(self.read(key))
 
-    @property
-    def id(self):
-      """Return ID of device."""
-      if (self._inventory is None):
-        self._inventory = self.read(VC_GET_INVENTORYID).split(' ', 1)[0]
-        _LOGGER.debug("Id = " + self._inventory)
-      if (self._inventory is None):
-        return None
-      return self._inventory
-
-def setup(hass, config):
-    """Create the VControld component."""
-    conf = config[DOMAIN]
+    async def async_write(self, key, val):
+        """Queue a debounced write, entities show the new value right away."""
+        self._coalescer.schedule(key, val, self._max_age("get" + key[3:]))
+        self._notify(["get" + key[3:]])
 
-    heating_type = conf[CONF_HEATING_TYPE]
+    def _written(self, key, val, ok):
+        """Update the view of the matching get command once a write went out."""
+        get_key = "get" + key[3:]
+        if ok:
+            self._values[get_key] = val
+            self._updated[get_key] = time.monotonic()
+        else:
+            # the device value is unknown, drop the optimistic one
+            self._updated.pop(get_key, None)
+            self._notify([get_key])
+        if get_key in self._commands:
+            self._due[get_key] = 0
+            self._wakeup.set()
 
-    try:
-        vc_api = Device(conf[CONF_HOST],conf[CONF_PORT])
-    except AttributeError:
-        _LOGGER.error(
-            "Failed to create API client."
-        )
-        return False
+async def async_setup(hass, config):
+    """Create the VControld component, one coordinator per device."""
+    devices = config[DOMAIN]
+    store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+    stored = await store.async_load() or {}
+    inventories = stored.get(STORE_INVENTORY)
+    if not isinstance(inventories, dict):
+        # a single device used to be stored by its ID alone
+        inventories = {devices[0][CONF_NAME]: inventories} if inventories else {}
+    stored[STORE_INVENTORY] = inventories
 
     hass.data[DOMAIN] = {}
-    hass.data[DOMAIN][VC_API] = vc_api
-    hass.data[DOMAIN][VC_NAME] = conf[CONF_NAME]
-    hass.data[DOMAIN][VC_HEATING_TYPE] = heating_type
 
-    for platform in PLATFORMS:
-        discovery.load_platform(hass, platform, DOMAIN, {}, config)
+    async def async_diagnostics(call):
+        names = [call.data[CONF_NAME]] if CONF_NAME in call.data else hass.data[DOMAIN]
+        try:
+            return {
+                name: hass.data[DOMAIN][name][VC_COORDINATOR].diagnostics
+                for name in names
+            }
+        except KeyError as err:
+            raise HomeAssistantError(f"No vcontrold device named {err}") from err
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_DIAGNOSTICS,
+        async_diagnostics,
+        schema=DIAGNOSTICS_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
 
+    # devices share nothing but the store, they are set up and polled side by side
+    await asyncio.gather(
+        *(
+            async_setup_device(hass, config, conf, index == 0, store, stored)
+            for index, conf in enumerate(devices)
+        )
+    )
     return True
 
-def main():
-    dev = Device('127.0.0.1',3002)
-    dev.read("getTempA")
 
-if __name__ == "__main__":
-	main()
+async def async_setup_device(hass, config, conf, primary, store, stored):
+    """Create the connection, coordinator and entities of one device.
+
+    The unique IDs of the entities are made of the inventory ID and the
+    device name. Those of the first device are migrated from the inventory
+    ID alone before its platforms load.
+    """
+    name = conf[CONF_NAME]
+    inventories = stored[STORE_INVENTORY]
+    heating_type = conf[CONF_HEATING_TYPE]
+    circuits = sorted(set(conf[CONF_CIRCUITS]))
+
+    cache_conf = conf[CONF_CACHE]
+    cache = CommandCache(
+        {freshness: cache_conf[freshness]
+         for freshness in (FRESHNESS_LIVE, FRESHNESS_SLOW, FRESHNESS_STATIC)},
+        {
+            **{
+                circuit_command(key, circuit): freshness
+                for circuit in circuits
+                for key, freshness in DEFAULT_FRESHNESS.items()
+            },
+            **cache_conf[CONF_COMMANDS],
+        },
+    )
+    timeouts_conf = conf[CONF_TIMEOUTS]
+    timeouts = TimeoutEstimator(
+        timeouts_conf[CONF_MIN_TIMEOUT], timeouts_conf[CONF_MAX_TIMEOUT]
+    )
+
+    commands = dict(DEFAULT_COMMANDS)
+    sensor_commands = {}
+    if CONF_XML in conf:
+        xml_conf = conf[CONF_XML]
+        try:
+            xml_commands = await hass.async_add_executor_job(
+                load_commands,
+                xml_conf[CONF_PATH],
+                hass.config.path(STORAGE_DIR, f"{COMMANDS_CACHE}.{slugify(name)}"),
+                inventories.get(name),
+            )
+        except (OSError, ET.ParseError) as err:
+            _LOGGER.error("Unable to read %s: %s", xml_conf[CONF_PATH], err)
+            xml_commands = {}
+        commands.update(xml_commands)
+        for key in xml_conf[CONF_SENSORS]:
+            if key in xml_commands:
+                sensor_commands[key] = xml_commands[key]
+            else:
+                _LOGGER.warning("Command %s not defined in %s", key, xml_conf[CONF_PATH])
+
+    if CONF_DEVICE in conf:
+        # Optolink adapter driven directly, no vcontrold in between
+        vc_api = OptolinkDevice(conf[CONF_DEVICE], cache, timeouts, commands)
+    else:
+        vc_api = Device(conf[CONF_HOST],conf[CONF_PORT],cache,timeouts)
+    vc_api.id = inventories.get(name)
+
+    tiers_conf = conf[CONF_TIERS]
+    coordinator = Coordinator(
+        hass,
+        vc_api,
+        {
+            TIER_FAST: tiers_conf[TIER_FAST],
+            TIER_NORMAL: conf[CONF_SCAN_INTERVAL],
+            TIER_SLOW: tiers_conf[TIER_SLOW],
+        },
+        tiers_conf[CONF_COMMANDS],
+        conf.get(CONF_ADAPTIVE),
+        name,
+    )
+    if CONF_ADAPTIVE in conf:
+        coordinator.register({ADAPTIVE_BURNER: TIER_FAST, ADAPTIVE_PUMP: TIER_FAST})
+
+    async def async_close(event):
+        await coordinator.async_stop()
+        await vc_api.close()
+
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_close)
+
+    hass.data[DOMAIN][name] = {
+        VC_API: vc_api,
+        VC_COORDINATOR: coordinator,
+        VC_NAME: name,
+        VC_HEATING_TYPE: heating_type,
+        VC_AGGREGATE_WINDOW: conf[CONF_AGGREGATE_WINDOW],
+        VC_COMMANDS: sensor_commands,
+        VC_CIRCUITS: circuits,
+    }
+
+    def load_platforms():
+        for platform in PLATFORMS:
+            hass.async_create_task(
+                discovery.async_load_platform(
+                    hass, platform, DOMAIN, {VC_NAME: name}, config
+                )
+            )
+        coordinator.async_start()
+
+    async def async_name_unique_ids():
+        """Migrate the unique IDs of the first device once its ID is known."""
+        if not primary or stored.get(STORE_NAMED_IDS):
+            return
+        async_migrate_unique_ids(hass, vc_api.id, name)
+        stored[STORE_NAMED_IDS] = True
+        await store.async_save(stored)
+
+    async def async_check_inventory():
+        """Read the inventory ID from the device and store it when it changed.
+
+        Without a stored ID the entities cannot be named yet, so the
+        platforms are only loaded once the first read succeeded.
+        """
+        known = vc_api.id
+        while True:
+            try:
+                inventory = await vc_api.read_inventory(PRIORITY_POLL)
+            except ConnectionError:
+                inventory = known
+            if inventory:
+                break
+            _LOGGER.warning(
+                "Unable to read inventory of %s, retry in %d s", name, INVENTORY_RETRY
+            )
+            await asyncio.sleep(INVENTORY_RETRY)
+        if inventory != known:
+            if known:
+                _LOGGER.warning(
+                    "Inventory of %s changed from %s to %s, "
+                    "entities follow after a restart", name, known, inventory
+                )
+                vc_api.id = known
+            inventories[name] = inventory
+            await store.async_save(stored)
+        if not known:
+            await async_name_unique_ids()
+            load_platforms()
+
+    if vc_api.id:
+        await async_name_unique_ids()
+        load_platforms()
+    hass.async_create_background_task(
+        async_check_inventory(), f"{DOMAIN} {name} inventory"
+    )
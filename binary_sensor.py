@@ -6,16 +6,23 @@ from homeassistant.components.binary_sensor import (
     BinarySensorEntity,
 )
 from homeassistant.const import CONF_DEVICE_CLASS, CONF_NAME
+from homeassistant.core import callback
 
 from . import (
+    CONF_COMMAND,
     DOMAIN as VC_DOMAIN,
-    VC_API,
-    VC_NAME
+    TIER_FAST,
+    TIER_NORMAL,
+    VC_CIRCUITS,
+    VC_COORDINATOR,
+    VC_NAME,
+    circuit_types,
 )
 
 _LOGGER = logging.getLogger(__name__)
 
 CONF_GETTER = "getter"
+CONF_TIER = "tier"
 
 SENSOR_CIRCULATION_PUMP_ACTIVE = "circulationpump_active"
 SENSOR_BURNER_ACTIVE = "burner_active"
@@ -37,22 +44,30 @@ SENSOR_TYPES = {
     SENSOR_CIRCULATION_PUMP_ACTIVE: {
         CONF_NAME: "Circulation pump active",
         CONF_DEVICE_CLASS: DEVICE_CLASS_POWER,
-        CONF_GETTER: lambda api: api.read(VC_GET_PUMP_STATUS)!=VC_STATE_OFF,
+        CONF_COMMAND: VC_GET_PUMP_STATUS,
+        CONF_TIER: TIER_FAST,
+        CONF_GETTER: lambda api, key: api.read(key)!=VC_STATE_OFF,
     },
     SENSOR_BURNER_ACTIVE: {
         CONF_NAME: "Burner active",
         CONF_DEVICE_CLASS: DEVICE_CLASS_POWER,
-        CONF_GETTER: lambda api: api.read(VC_GET_BURNER_STATUS)!=VC_STATE_OFF,
+        CONF_COMMAND: VC_GET_BURNER_STATUS,
+        CONF_TIER: TIER_FAST,
+        CONF_GETTER: lambda api, key: api.read(key)!=VC_STATE_OFF,
     },
     SENSOR_COMFORT_MODE_ACTIVE: {
         CONF_NAME: "Comfort mode active",
         CONF_DEVICE_CLASS: None,
-        CONF_GETTER: lambda api: api.read(VC_GET_COMFORT_MODE)!=VC_STATE_OFF,
+        CONF_COMMAND: VC_GET_COMFORT_MODE,
+        CONF_TIER: TIER_NORMAL,
+        CONF_GETTER: lambda api, key: api.read(key)!=VC_STATE_OFF,
     },
     SENSOR_ECO_MODE_ACTIVE: {
         CONF_NAME: "Eco mode active",
         CONF_DEVICE_CLASS: None,
-        CONF_GETTER: lambda api: api.read(VC_GET_ECO_MODE)!=VC_STATE_OFF,
+        CONF_COMMAND: VC_GET_ECO_MODE,
+        CONF_TIER: TIER_NORMAL,
+        CONF_GETTER: lambda api, key: api.read(key)!=VC_STATE_OFF,
     },
     # heatpump sensors
     #SENSOR_COMPRESSOR_ACTIVE: {
@@ -73,23 +88,32 @@ SENSOR_TYPES = {
 #}
 
 
-def setup_platform(hass, config, add_entities, discovery_info=None):
+async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
     """Create the VC sensor devices."""
     if discovery_info is None:
         return
 
     _LOGGER.info("Setup VC binary_sensor platform")
 
-    vc_api = hass.data[VC_DOMAIN][VC_API]
+    data = hass.data[VC_DOMAIN][discovery_info[VC_NAME]]
+    coordinator = data[VC_COORDINATOR]
+    sensor_types = circuit_types(SENSOR_TYPES, data[VC_CIRCUITS])
+    coordinator.register(
+        {
+            sensor[CONF_COMMAND]: sensor[CONF_TIER]
+            for sensor in sensor_types.values()
+        },
+        "binary_sensor",
+    )
 
     #sensors = SENSORS_GENERIC.copy()
 
-    add_entities(
+    async_add_entities(
         [
             VCBinarySensor(
-                hass.data[VC_DOMAIN][VC_NAME], vc_api, sensor
+                data[VC_NAME], coordinator, sensor_type, sensor
             )
-            for sensor in SENSOR_TYPES
+            for sensor_type, sensor in sensor_types.items()
         ]
     )
 
@@ -97,24 +121,30 @@ def setup_platform(hass, config, add_entities, discovery_info=None):
 class VCBinarySensor(BinarySensorEntity):
     """Representation of a VControld sensor."""
 
-    def __init__(self, name, api, sensor_type):
+    def __init__(self, name, coordinator, sensor_type, sensor):
         """Initialize the sensor."""
-        self._sensor = SENSOR_TYPES[sensor_type]
+        self._sensor = sensor
         self._name = f"{name} {self._sensor[CONF_NAME]}"
-        self._api = api
+        self._coordinator = coordinator
+        self._api = coordinator.api
         self._sensor_type = sensor_type
         self._state = None
         self._inventory = None
 
+    @property
+    def should_poll(self):
+        """Values are pushed by the coordinator."""
+        return False
+
     @property
     def available(self):
         """Return True if entity is available."""
-        return self._state is not None
+        return self._coordinator.available and self._state is not None
 
     @property
     def unique_id(self):
         """Return a unique ID."""
-        return f"{self._api.id}-{self._sensor_type}"
+        return f"{self._coordinator.unique_id}-{self._sensor_type}"
 
     @property
     def name(self):
@@ -131,12 +161,33 @@ class VCBinarySensor(BinarySensorEntity):
         """Return the class of this device, from component DEVICE_CLASSES."""
         return self._sensor[CONF_DEVICE_CLASS]
 
-    def update(self):
-        """Update state of sensor."""
+    async def async_added_to_hass(self):
+        """Subscribe to coordinator updates."""
+        self.async_on_remove(
+            self._coordinator.async_add_listener(
+                self._handle_coordinator_update, [self._sensor[CONF_COMMAND]]
+            )
+        )
+
+    @callback
+    def _handle_coordinator_update(self):
+        reported = (self.available, self._state)
+        self._update_state()
+        if (self.available, self._state) != reported:
+            self.async_write_ha_state()
+
+    def _update_state(self):
         try:
-          self._state = self._sensor[CONF_GETTER](self._api)
-        except ConnectionError:
-            _LOGGER.error("Unable to retrieve sensor data")
+          self._state = self._sensor[CONF_GETTER](
+              self._coordinator, self._sensor[CONF_COMMAND]
+          )
         except ValueError:
             _LOGGER.error("Unable to decode sensor data")
 
+    async def async_update(self):
+        """Update state of sensor."""
+        try:
+          await self._coordinator.async_request([self._sensor[CONF_COMMAND]])
+        except ConnectionError:
+            _LOGGER.error("Unable to retrieve sensor data")
+        self._update_state()
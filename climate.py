@@ -17,15 +17,20 @@ from homeassistant.components.climate.const import (
     SUPPORT_TARGET_TEMPERATURE,
 )
 from homeassistant.const import ATTR_TEMPERATURE, PRECISION_WHOLE, TEMP_CELSIUS
+from homeassistant.core import callback
 from homeassistant.helpers import entity_platform
 
 from . import (
     DOMAIN as VC_DOMAIN,
-    VC_API,
+    TIER_FAST,
+    TIER_NORMAL,
+    VC_CIRCUITS,
+    VC_COORDINATOR,
     VC_HEATING_TYPE,
     VC_NAME,
     HeatingType,
 )
+from .pyvcontrold import circuit_command
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -47,6 +52,15 @@ VC_GET_ECO_MODE = "getBetriebSparM1"                      # "getSavingsModeA1M1"
 VC_GET_COMFORT_MODE = "getBetriebPartyM1"                 # "getPartyModeA1M1"
 VC_GET_CURRENT_ACTION = "getBrennerStatus"                # "getBurnerStatus"
 
+VC_POLL_COMMANDS = {
+    VC_GET_CURRENT_TEMP: TIER_NORMAL,
+    VC_GET_ECO_MODE: TIER_NORMAL,
+    VC_GET_COMFORT_MODE: TIER_NORMAL,
+    VC_GET_TARGET_TEMP: TIER_NORMAL,
+    VC_GET_MODE: TIER_NORMAL,
+    VC_GET_CURRENT_ACTION: TIER_FAST,
+}
+
 VC_SET_TARGET_TEMP = "setTempRaumNorSollM1"               # "setRequestedRoomTnormalA1M1"
 VC_SET_MODE = "setBetriebArtM1"                           # "setOpModeA1M1"
 VC_SET_ECO_MODE = "setBetriebSparM1"                      # "setSavingsModeA1M1"
@@ -109,15 +123,29 @@ async def async_setup_platform(
 
     _LOGGER.info("Setup VC climate platform")
 
-    vc_api = hass.data[VC_DOMAIN][VC_API]
-    heating_type = hass.data[VC_DOMAIN][VC_HEATING_TYPE]
+    data = hass.data[VC_DOMAIN][discovery_info[VC_NAME]]
+    coordinator = data[VC_COORDINATOR]
+    circuits = data[VC_CIRCUITS]
+    # one refresh reads the commands of every circuit
+    coordinator.register(
+        {
+            circuit_command(key, circuit): tier
+            for circuit in circuits
+            for key, tier in VC_POLL_COMMANDS.items()
+        },
+        "climate",
+    )
+    heating_type = data[VC_HEATING_TYPE]
     async_add_entities(
         [
             VCClimate(
-                f"{hass.data[VC_DOMAIN][VC_NAME]} Heating",
-                vc_api,
+                f"{data[VC_NAME]} Heating"
+                + ("" if circuit == 1 else f" M{circuit}"),
+                coordinator,
                 heating_type,
+                circuit,
             )
+            for circuit in circuits
         ]
     )
 
@@ -130,18 +158,20 @@ async def async_setup_platform(
     #            VC_TO_HA_HVAC_HEATING
     #        )
     #    },
-    #    "set_vc_mode",
+    #    "async_set_vc_mode",
     #)
 
 
 class VCClimate(ClimateEntity):
     """Representation of the heating climate device."""
 
-    def __init__(self, name, api, heating_type):
-        """Initialize the climate device."""
+    def __init__(self, name, coordinator, heating_type, circuit=1):
+        """Initialize the climate device of a heating circuit."""
         self._name = name
+        self._circuit = circuit
         self._state = None
-        self._api = api
+        self._coordinator = coordinator
+        self._api = coordinator.api
         self._attributes = {}
         self._target_temperature = None
         self._current_mode = None
@@ -150,23 +180,63 @@ class VCClimate(ClimateEntity):
         self._heating_type = heating_type
         self._current_action = None
 
-    def update(self):
+    def _key(self, key):
+        """Return the command of the heating circuit of this device."""
+        return circuit_command(key, self._circuit)
+
+    @property
+    def should_poll(self):
+        """Values are pushed by the coordinator."""
+        return False
+
+    @property
+    def available(self):
+        """Return True while vcontrold can be reached."""
+        return self._coordinator.available
+
+    async def async_added_to_hass(self):
+        """Subscribe to coordinator updates."""
+        self.async_on_remove(
+            self._coordinator.async_add_listener(
+                self._handle_coordinator_update,
+                [self._key(key) for key in VC_POLL_COMMANDS],
+            )
+        )
+
+    @callback
+    def _handle_coordinator_update(self):
+        self._update_state()
+        self.async_write_ha_state()
+
+    async def async_update(self):
         """Get data from VControld."""
         try:
+            await self._coordinator.async_request(
+                [self._key(key) for key in VC_POLL_COMMANDS]
+            )
+        except ConnectionError:
+            _LOGGER.error("Unable to retrieve data : %s",sys.exc_info()[1])
+        self._update_state()
 
-            self._current_temperature = self._api.readfloat(VC_GET_CURRENT_TEMP)
+    def _update_state(self):
+        try:
+            self._current_temperature = self._coordinator.readfloat(
+                self._key(VC_GET_CURRENT_TEMP)
+            )
 
-            if self._api.read(VC_GET_ECO_MODE)==VC_MODE_ON:
+            if self._coordinator.read(self._key(VC_GET_ECO_MODE))==VC_MODE_ON:
               self._current_program = PRESET_ECO
-            elif self._api.read(VC_GET_COMFORT_MODE)==VC_MODE_ON:
+            elif self._coordinator.read(self._key(VC_GET_COMFORT_MODE))==VC_MODE_ON:
               self._current_program = PRESET_COMFORT
             else:
               self._current_program = PRESET_NONE
             _LOGGER.info("preset=%s",self._current_program)
 
-            self._target_temperature = self._api.readfloat(VC_GET_TARGET_TEMP)
+            self._target_temperature = self._coordinator.readfloat(
+                self._key(VC_GET_TARGET_TEMP)
+            )
 
-            if VC_MODE_DHWANDHEATING in self._api.read(VC_GET_MODE):
+            if VC_MODE_DHWANDHEATING in self._coordinator.read(self._key(VC_GET_MODE)):
               self._current_mode = HVAC_MODE_HEAT
             else:
               self._current_mode = HVAC_MODE_OFF
@@ -193,13 +263,11 @@ class VCClimate(ClimateEntity):
             #elif self._heating_type == HeatingType.heatpump:
             #  self._current_action = self._api.getCompressorActive()
 
-            if int(self._api.readfloat(VC_GET_CURRENT_ACTION))==0:
+            if int(self._coordinator.readfloat(self._key(VC_GET_CURRENT_ACTION)))==0:
               self._current_action = 0
             else:
               self._current_action = 1
 
-        except ConnectionError:
-            _LOGGER.error("Unable to retrieve data : %s",sys.exc_info()[1])
         except ValueError:
             _LOGGER.error("Unable to decode climate data : %s",sys.exc_info()[1])
 
@@ -233,9 +301,11 @@ class VCClimate(ClimateEntity):
         """Return current hvac mode."""
         return self._current_mode
 
-    def set_hvac_mode(self, hvac_mode):
+    async def async_set_hvac_mode(self, hvac_mode):
         """Set a new hvac mode on the API."""
-        act_mode = self._api.read(VC_GET_MODE)
+        act_mode = await self._coordinator.async_read_current(
+            self._key(VC_GET_MODE)
+        )
         vc_mode = None
         if (hvac_mode == HVAC_MODE_HEAT):
           vc_mode = VC_MODE_DHWANDHEATING;
@@ -245,7 +315,7 @@ class VCClimate(ClimateEntity):
         if vc_mode is None:
           return
         _LOGGER.debug("Setting hvac mode to %s / %s", hvac_mode, vc_mode)
-        self._api.write(VC_SET_MODE, vc_mode)
+        await self._coordinator.async_write(self._key(VC_SET_MODE), vc_mode)
         self._current_mode = hvac_mode
 
     @property
@@ -275,12 +345,12 @@ class VCClimate(ClimateEntity):
         """Return the precision of the system."""
         return PRECISION_WHOLE
 
-    def set_temperature(self, **kwargs):
+    async def async_set_temperature(self, **kwargs):
         """Set new target temperatures."""
         temp = int(kwargs.get(ATTR_TEMPERATURE))
         if temp is not None:
             #self._api.setProgramTemperature(self._current_program, temp)
-            self._api.write(VC_SET_TARGET_TEMP, str(temp))
+            await self._coordinator.async_write(self._key(VC_SET_TARGET_TEMP), str(temp))
             _LOGGER.debug("Setting target temp to %i", temp)
             self._target_temperature = float(temp)
 
@@ -294,22 +364,22 @@ class VCClimate(ClimateEntity):
         """Return the available preset mode."""
         return [PRESET_COMFORT,PRESET_NONE,PRESET_ECO]
 
-    def set_preset_mode(self, preset_mode):
+    async def async_set_preset_mode(self, preset_mode):
         """Set new preset mode and deactivate any existing programs."""
         _LOGGER.debug("Setting preset to %s")
         if (preset_mode == PRESET_COMFORT):
-          self._api.write(VC_SET_COMFORT_MODE, VC_MODE_ON)
+          await self._coordinator.async_write(self._key(VC_SET_COMFORT_MODE), VC_MODE_ON)
         elif (preset_mode == PRESET_ECO):
-          self._api.write(VC_SET_ECO_MODE, VC_MODE_ON)
+          await self._coordinator.async_write(self._key(VC_SET_ECO_MODE), VC_MODE_ON)
         else:
-          self._api.write(VC_SET_ECO_MODE, VC_MODE_OFF)
-          self._api.write(VC_SET_COMFORT_MODE, VC_MODE_OFF)
+          await self._coordinator.async_write(self._key(VC_SET_ECO_MODE), VC_MODE_OFF)
+          await self._coordinator.async_write(self._key(VC_SET_COMFORT_MODE), VC_MODE_OFF)
 
     @property
     def extra_state_attributes(self):
         """Show Device Attributes."""
         return self._attributes
 
-    def set_vc_mode(self, vc_mode):
+    async def async_set_vc_mode(self, vc_mode):
         """Service function to set vc modes directly."""
-        self._api.write(VC_SET_MODE, vc_mode)
+        await self._coordinator.async_write(self._key(VC_SET_MODE), vc_mode)
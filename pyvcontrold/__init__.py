@@ -0,0 +1,57 @@
+"""Client library for vcontrold or an Optolink adapter, free of Home Assistant imports."""
+
+from .cache import (
+    DEFAULT_TTLS,
+    FRESHNESS_LIVE,
+    FRESHNESS_SLOW,
+    FRESHNESS_STATIC,
+    CommandCache,
+)
+from .coalesce import DEBOUNCE_WINDOW, WriteCoalescer, same_value
+from .commands import (
+    CIRCUITS,
+    DEFAULT_COMMANDS,
+    TYPE_COUNT,
+    TYPE_ENUM,
+    TYPE_HEX,
+    TYPE_HOURS,
+    TYPE_PERCENT,
+    TYPE_SETPOINT,
+    TYPE_STATE,
+    TYPE_TEMP,
+    CommandDef,
+    circuit_command,
+    decode_block,
+    encode,
+    plan,
+)
+from .device import (
+    CIRCUIT_CLOSED,
+    CIRCUIT_HALF_OPEN,
+    CIRCUIT_OPEN,
+    PRIORITY_POLL,
+    PRIORITY_USER,
+    PRIORITY_WRITE,
+    PROMPT,
+    VC_GET_INVENTORYID,
+    Device,
+    parse_float,
+    parse_int,
+)
+from .optolink import OptolinkDevice, ProtocolError
+from .stats import (
+    PHASE_CONNECT,
+    PHASE_QUEUE,
+    PHASE_REPLY,
+    PHASE_SYNC,
+    STAT_CIRCUIT_OPENS,
+    STAT_CONNECT_FAILURES,
+    STAT_ERRORS,
+    STAT_RECONNECTS,
+    STAT_RETRIES,
+    STAT_TIMEOUTS,
+    DeviceStats,
+    Histogram,
+)
+from .timeouts import DEFAULT_MAX_TIMEOUT, DEFAULT_MIN_TIMEOUT, TimeoutEstimator
+from .xmlconfig import load_commands
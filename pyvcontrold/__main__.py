@@ -0,0 +1,23 @@
+"""Read one command from vcontrold: python -m pyvcontrold [host] [port] [command]"""
+
+import asyncio
+import logging
+import sys
+
+from .device import Device
+
+
+async def main(host, port, key):
+    dev = Device(host, port)
+    print(await dev.read(key))
+    await dev.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
+    args = sys.argv[1:]
+    asyncio.run(main(
+        args[0] if len(args) > 0 else '127.0.0.1',
+        int(args[1]) if len(args) > 1 else 3002,
+        args[2] if len(args) > 2 else "getTempA",
+    ))
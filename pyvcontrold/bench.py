@@ -0,0 +1,294 @@
+"""Throughput and latency benchmark for the vcontrold client.
+
+    python -m pyvcontrold.bench [--host H] [--port P] [--command C] [--count N]
+                                [--latency S] [--faults [--fault-rate R]]
+                                [--fixed-timeout] [--optolink] [--circuits N]
+                                [--devices N]
+
+Times Device.read and a full refresh cycle over every command the
+integration polls, next to a replay of the telnetlib client's sequence,
+which waited up to READ_TIMEOUT for a leftover prompt before sending every
+command. Without --host, an in-process simulator with the given per-command
+latency stands in for vcontrold.
+
+With --faults, each fault of the simulator is measured on its own: the time
+from a single fault to the next correct reply, and the refresh throughput
+lost while the fault hits the given share of commands. --fixed-timeout
+waits READ_TIMEOUT for every reply instead of the learned timeouts, as
+the client did before TimeoutEstimator.
+
+With --optolink, the refresh cycle is also timed on OptolinkDevice against
+the P300 emulator, which answers each address range with the same latency
+the simulator spends on a single command.
+
+--circuits adds the settings of heating circuits 2 up to N to the cycle.
+
+--devices also times refresh cycles of N devices at once, each with its
+own simulator, as the integration polls several vcontrold hosts.
+"""
+
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+
+from .commands import circuit_command
+from .device import PROMPT, READ_TIMEOUT, Device
+from .emulator import Emulator, PtySerialPort
+from .optolink import OptolinkDevice
+from .simulator import COMMANDS, DEFAULT_LATENCY, FAULTS, Simulator
+from .timeouts import TimeoutEstimator
+
+# Reads given to a client to get a correct reply back after a fault
+RECOVERY_READS = 10
+DEFAULT_FAULT_RATE = 0.05
+
+
+async def bench_device(host, port, key, count):
+    """Return the duration of count Device.read calls."""
+    dev = Device(host, port)
+    await dev.read(key)
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        await dev.read(key)
+        samples.append(time.perf_counter() - start)
+    await dev.close()
+    return samples
+
+
+async def bench_cycle(host, port, keys, count):
+    """Return the duration of count refresh cycles reading all keys."""
+    dev = Device(host, port)
+    await dev.read(keys[0])
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        await dev.read_many(keys)
+        samples.append(time.perf_counter() - start)
+    await dev.close()
+    return samples
+
+
+async def bench_devices(latency, keys, count, devices):
+    """Return the duration of count refresh cycles of devices polled at once."""
+    sims = [Simulator(latency=latency) for _ in range(devices)]
+    devs = [Device("127.0.0.1", await sim.start()) for sim in sims]
+    try:
+        await asyncio.gather(*(dev.read(keys[0]) for dev in devs))
+        samples = []
+        for _ in range(count):
+            start = time.perf_counter()
+            await asyncio.gather(*(dev.read_many(keys) for dev in devs))
+            samples.append(time.perf_counter() - start)
+    finally:
+        for dev in devs:
+            await dev.close()
+        for sim in sims:
+            await sim.stop()
+    return samples
+
+
+async def bench_optolink(latency, keys, count):
+    """Return the duration of count refresh cycles over the P300 emulator."""
+    emulator = Emulator(latency=latency)
+    dev = OptolinkDevice(emulator.start(), port_class=PtySerialPort)
+    try:
+        await dev.read(keys[0])
+        samples = []
+        for _ in range(count):
+            start = time.perf_counter()
+            await dev.read_many(keys)
+            samples.append(time.perf_counter() - start)
+        await dev.close()
+    finally:
+        emulator.stop()
+    return samples
+
+
+def make_timeouts(fixed):
+    """Return the timeouts of a client, READ_TIMEOUT for every reply if fixed."""
+    if fixed:
+        return TimeoutEstimator(READ_TIMEOUT, READ_TIMEOUT)
+    return TimeoutEstimator()
+
+
+async def bench_recovery(sim, host, port, key, fault=None, fixed=False):
+    """Return the time a new client needs for a correct reply of key.
+
+    fault, when given, hits the first command or session of the client.
+    Returns None when no correct reply came within RECOVERY_READS reads.
+    """
+    dev = Device(host, port, timeouts=make_timeouts(fixed))
+    if fault is not None:
+        sim.inject(fault)
+    start = time.perf_counter()
+    try:
+        for _ in range(RECOVERY_READS):
+            try:
+                if await dev.read(key) == sim.values[key]:
+                    return time.perf_counter() - start
+            except ConnectionError:
+                pass
+        return None
+    finally:
+        await dev.close()
+
+
+async def bench_faulty_cycle(sim, host, port, keys, count, fixed=False):
+    """Return cycle durations and the number of wrong or missing replies."""
+    dev = Device(host, port, timeouts=make_timeouts(fixed))
+    samples = []
+    failed = 0
+    for _ in range(count):
+        start = time.perf_counter()
+        try:
+            values = await dev.read_many(keys)
+        except ConnectionError:
+            values = {}
+        samples.append(time.perf_counter() - start)
+        failed += sum(values.get(key) != sim.values[key] for key in keys)
+    await dev.close()
+    return samples, failed
+
+
+async def bench_faults(sim, host, port, key, keys, count, rate, fixed=False):
+    """Print recovery time and throughput loss for each fault."""
+    baseline = await bench_recovery(sim, host, port, key, fixed=fixed)
+    samples, _ = await bench_faulty_cycle(sim, host, port, keys, count, fixed)
+    clean = len(keys) * count / sum(samples)
+    print(f"{'none':8} recovery={baseline * 1000:.1f}ms reads/s={clean:.1f}")
+    for fault in FAULTS:
+        recovery = await bench_recovery(sim, host, port, key, fault, fixed)
+        sim.faults = {fault: rate}
+        sim.injected.clear()
+        samples, failed = await bench_faulty_cycle(
+            sim, host, port, keys, count, fixed
+        )
+        sim.faults = {}
+        good = (len(keys) * count - failed) / sum(samples)
+        print(
+            f"{fault:8} "
+            + (f"recovery={recovery * 1000:.1f}ms " if recovery is not None
+               else "recovery=none ")
+            + f"reads/s={good:.1f} loss={(1 - good / clean) * 100:.0f}% "
+            f"failed={failed}/{len(keys) * count} injected={sim.injected[fault]}"
+        )
+
+
+async def bench_legacy(host, port, key, count):
+    """Return the duration of count reads done the telnetlib way."""
+    reader, writer = await asyncio.open_connection(host, port)
+    prompt = PROMPT.encode()
+
+    async def read_until(timeout):
+        try:
+            return await asyncio.wait_for(reader.readuntil(prompt), timeout)
+        except asyncio.TimeoutError:
+            return b""
+
+    await read_until(READ_TIMEOUT)
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        await read_until(READ_TIMEOUT)
+        writer.write(key.encode() + b"\r\n")
+        await writer.drain()
+        await read_until(READ_TIMEOUT)
+        samples.append(time.perf_counter() - start)
+    writer.close()
+    return samples
+
+
+def percentile(samples, pct):
+    """Return the pct percentile of samples, nearest rank."""
+    ordered = sorted(samples)
+    return ordered[max(0, round(pct / 100 * len(ordered)) - 1)]
+
+
+def report(name, samples, reads=1):
+    """Print the spread of samples, each covering reads commands."""
+    print(
+        f"{name:8} n={len(samples)} "
+        f"reads/s={reads * len(samples) / sum(samples):.1f} "
+        f"min={min(samples) * 1000:.1f}ms "
+        f"mean={statistics.mean(samples) * 1000:.1f}ms "
+        f"p50={percentile(samples, 50) * 1000:.1f}ms "
+        f"p95={percentile(samples, 95) * 1000:.1f}ms "
+        f"p99={percentile(samples, 99) * 1000:.1f}ms "
+        f"max={max(samples) * 1000:.1f}ms"
+    )
+
+
+async def run(args):
+    sim = None
+    host, port = args.host, args.port
+    if host is None:
+        sim = Simulator(latency=args.latency)
+        host = "127.0.0.1"
+        port = await sim.start(host)
+    keys = list(COMMANDS) + [
+        circuit_command(key, circuit)
+        for circuit in range(2, args.circuits + 1)
+        for key in COMMANDS
+        if key.endswith("M1")
+    ]
+    try:
+        if args.faults:
+            if sim is None:
+                raise SystemExit("--faults needs the simulator, omit --host")
+            await bench_faults(
+                sim, host, port, args.command, keys, args.count, args.fault_rate,
+                args.fixed_timeout,
+            )
+            return
+        if not args.skip_legacy:
+            report("legacy", await bench_legacy(host, port, args.command, args.count))
+        report("device", await bench_device(host, port, args.command, args.count))
+        report("cycle", await bench_cycle(host, port, keys, args.count), len(keys))
+        if args.optolink:
+            report(
+                "optolink",
+                await bench_optolink(args.latency, keys, args.count),
+                len(keys),
+            )
+        if args.devices > 1:
+            report(
+                f"{args.devices} devs",
+                await bench_devices(args.latency, keys, args.count, args.devices),
+                len(keys) * args.devices,
+            )
+    finally:
+        if sim is not None:
+            await sim.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", help="vcontrold host, simulated when omitted")
+    parser.add_argument("--port", type=int, default=3002)
+    parser.add_argument("--command", default="getTempA")
+    parser.add_argument("--count", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY,
+                        help="simulated seconds per command")
+    parser.add_argument("--skip-legacy", action="store_true",
+                        help="do not replay the telnetlib client")
+    parser.add_argument("--faults", action="store_true",
+                        help="measure recovery from simulated faults")
+    parser.add_argument("--fault-rate", type=float, default=DEFAULT_FAULT_RATE,
+                        help="share of commands hit by each fault")
+    parser.add_argument("--fixed-timeout", action="store_true",
+                        help="wait READ_TIMEOUT for every reply under --faults")
+    parser.add_argument("--optolink", action="store_true",
+                        help="also time the direct P300 backend, emulated")
+    parser.add_argument("--circuits", type=int, default=1, choices=[1, 2, 3],
+                        help="heating circuits read in a cycle")
+    parser.add_argument("--devices", type=int, default=1,
+                        help="also time this many devices polled at once")
+    logging.basicConfig(level=logging.ERROR)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Freshness-classed cache of vcontrold replies."""
+
+import time
+
+FRESHNESS_LIVE = "live"
+FRESHNESS_SLOW = "slow"
+FRESHNESS_STATIC = "static"
+
+DEFAULT_TTLS = {
+    FRESHNESS_LIVE: 0,
+    FRESHNESS_SLOW: 600,
+    FRESHNESS_STATIC: 86400,
+}
+
+
+class CommandCache:
+    """Keeps replies for as long as the freshness of their command allows.
+
+    Each command belongs to a freshness class (live, slow, static) whose TTL
+    applies, or carries its own TTL in seconds. Live commands default to a
+    TTL of 0 and are never cached, but the time of their last reply is
+    kept like that of every other command.
+    """
+
+    def __init__(self, ttls=None, classes=None):
+        """Init function"""
+        self._ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self._classes = dict(classes or {})
+        self._entries = {}
+        self._read = {}
+        self.hits = 0
+        self.misses = 0
+
+    def ttl(self, key):
+        """Return the TTL in seconds that applies to a command."""
+        freshness = self._classes.get(key, FRESHNESS_LIVE)
+        if isinstance(freshness, str):
+            return self._ttls[freshness]
+        return freshness
+
+    def get(self, key):
+        """Return the cached reply of a command, None when missing or stale."""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        """Store a successful reply."""
+        if value == "":
+            return
+        now = time.monotonic()
+        self._read[key] = now
+        ttl = self.ttl(key)
+        if ttl > 0:
+            self._entries[key] = (now + ttl, value)
+
+    def read_at(self, key):
+        """Return the monotonic time a reply of a command was last stored.
+
+        Replies are stored as they come from the device, so a time later
+        than the start of a read tells a live reply from a cache hit.
+        """
+        return self._read.get(key)
+
+    def invalidate(self, key=None):
+        """Forget one command, or everything when key is None."""
+        if key is None:
+            self._entries.clear()
+            self._read.clear()
+        else:
+            self._entries.pop(key, None)
+            self._read.pop(key, None)
+
+    @property
+    def stats(self):
+        """Return hit and miss counters."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+        }
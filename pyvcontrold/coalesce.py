@@ -0,0 +1,129 @@
+"""Debounced, coalesced set commands."""
+
+import asyncio
+import logging
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+# Seconds a set command waits for a newer value before it is written
+DEBOUNCE_WINDOW = 1.5
+# Seconds a value written or read live is trusted to still be on the device
+DEFAULT_MAX_AGE = 60
+
+
+def same_value(first, second):
+    """Compare two command values, numerically when both are numbers."""
+    if first is None or second is None:
+        return False
+    try:
+        return float(first) == float(second)
+    except ValueError:
+        return first == second
+
+
+class WriteCoalescer:
+    """Writes only the last value given to a set command within the window.
+
+    A value is not written at all when it is known to be on the device:
+    this coalescer wrote it and the device confirmed, or a live read
+    returned it, no longer than max_age seconds ago. Replies served from a
+    cache confirm nothing and must not be passed to observe().
+    """
+
+    def __init__(self, write, on_done=None, window=DEBOUNCE_WINDOW):
+        """Init function"""
+        self._write = write
+        self._on_done = on_done
+        self._window = window
+        self._pending = {}
+        self._timers = {}
+        self._tasks = set()
+        self._confirmed = {}
+        self._max_ages = {}
+        self.coalesced = 0
+        self.skipped = 0
+        self.written = 0
+
+    def schedule(self, key, val, max_age=DEFAULT_MAX_AGE):
+        """Queue val for key, replacing any value still waiting for the window.
+
+        max_age is how old a confirmation of val may be for the write to be
+        skipped, usually the polling interval of the matching get command.
+        """
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            self.coalesced += 1
+            timer.cancel()
+        elif key not in self._pending and self._on_device(key, val, max_age):
+            _LOGGER.debug("Skip %s %s, already set", key, val)
+            self.skipped += 1
+            return
+        self._pending[key] = val
+        self._max_ages[key] = max_age
+        loop = asyncio.get_running_loop()
+        self._timers[key] = loop.call_later(self._window, self._flush, key)
+
+    def _flush(self, key):
+        del self._timers[key]
+        task = asyncio.get_running_loop().create_task(self._async_flush(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _async_flush(self, key):
+        val = self._pending[key]
+        ok = False
+        try:
+            if self._on_device(key, val, self._max_ages[key]):
+                self.skipped += 1
+                ok = True
+            else:
+                ok = await self._write(key, val)
+                self.written += 1
+                if ok:
+                    self._confirmed[key] = (val, time.monotonic())
+        except ConnectionError:
+            _LOGGER.error("Unable to write %s", key)
+        finally:
+            if self._pending.get(key) == val and key not in self._timers:
+                del self._pending[key]
+        if not ok:
+            # the device may or may not have taken the value
+            self._confirmed.pop(key, None)
+        if self._on_done is not None:
+            self._on_done(key, val, ok)
+
+    def pending(self, key):
+        """Return the value waiting to be written to key, None if there is none."""
+        return self._pending.get(key)
+
+    def _on_device(self, key, val, max_age):
+        """Return True when val was confirmed on the device within max_age."""
+        confirmed = self._confirmed.get(key)
+        return (
+            confirmed is not None
+            and same_value(confirmed[0], val)
+            and time.monotonic() - confirmed[1] <= max_age
+        )
+
+    def observe(self, key, val):
+        """Record a value of key read live from the device, not from a cache."""
+        self._confirmed[key] = (val, time.monotonic())
+
+    async def async_stop(self):
+        """Write the values still waiting for their window right away."""
+        for key in list(self._timers):
+            self._timers[key].cancel()
+            self._flush(key)
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    @property
+    def stats(self):
+        """Return write, coalesce and skip counters."""
+        return {
+            "written": self.written,
+            "coalesced": self.coalesced,
+            "skipped": self.skipped,
+            "pending": len(self._pending),
+        }
@@ -0,0 +1,185 @@
+"""Controller addresses behind the vcontrold commands, and block reads over them.
+
+Every get command reads a few bytes at a fixed address of the controller.
+plan() merges the commands to read into a few address ranges, and
+decode_block() turns the bytes of a range back into the text replies
+vcontrold would have given, so the rest of the client is unaffected.
+"""
+
+import collections
+
+# Signed 16 bit, tenths of a degree
+TYPE_TEMP = "temp"
+# Unsigned 8 bit, whole degrees
+TYPE_SETPOINT = "setpoint"
+# Unsigned 8 bit, half percents
+TYPE_PERCENT = "percent"
+# Unsigned 32 bit counter
+TYPE_COUNT = "count"
+# Unsigned 32 bit, seconds shown as hours
+TYPE_HOURS = "hours"
+# 0 or 1
+TYPE_STATE = "state"
+# Unsigned 8 bit, one of the names of values
+TYPE_ENUM = "enum"
+# Device identification, shown as hex
+TYPE_HEX = "hex"
+
+TYPE_SIZES = {
+    TYPE_TEMP: 2,
+    TYPE_SETPOINT: 1,
+    TYPE_PERCENT: 1,
+    TYPE_COUNT: 4,
+    TYPE_HOURS: 4,
+    TYPE_STATE: 1,
+    TYPE_ENUM: 1,
+    TYPE_HEX: 2,
+}
+
+# Bytes of unused addresses a range may span to join two commands, an extra
+# byte costs far less on the bus than an extra transaction
+MAX_GAP = 16
+# Bytes a single Optolink read returns at most
+MAX_BLOCK = 32
+
+# Heating circuits, the settings of circuit n are read by commands ending in Mn
+CIRCUITS = [1, 2, 3]
+
+OPERATING_MODES = {
+    0: "ABSCHALT",                                       # "Shut down"
+    1: "WW",                                             # "Warm-Water"
+    2: "H+WW",                                           # "Heating and Warm-Water"
+    3: "RED",                                            # "Reduced"
+    4: "NORM",                                           # "Normal"
+}
+
+# length is only given when it differs from the size of the type
+CommandDef = collections.namedtuple(
+    "CommandDef",
+    ["address", "type", "unit", "values", "length"],
+    defaults=["", None, None],
+)
+Block = collections.namedtuple("Block", ["address", "length", "keys"])
+
+DEFAULT_COMMANDS = {
+    "getTempA": CommandDef(0x5525, TYPE_TEMP, "Grad Celsius"),
+    "getTempWWist": CommandDef(0x0804, TYPE_TEMP, "Grad Celsius"),
+    "getTempWWsoll": CommandDef(0x6300, TYPE_SETPOINT, "Grad Celsius"),
+    "getTempStp2": CommandDef(0x0812, TYPE_TEMP, "Grad Celsius"),
+    "getBrennerStatus": CommandDef(0xA38F, TYPE_PERCENT, "%"),
+    "getBrennerStarts": CommandDef(0x088A, TYPE_COUNT),
+    "getBrennerStunden1": CommandDef(0x08A7, TYPE_HOURS, "Stunden"),
+    "getPumpeStatusIntern": CommandDef(0x7660, TYPE_STATE),
+    "getPumpeStatusZirku": CommandDef(0x6515, TYPE_STATE),
+    "getBetriebArtM1": CommandDef(0x2301, TYPE_ENUM, "", OPERATING_MODES),
+    "getBetriebSparM1": CommandDef(0x2302, TYPE_STATE),
+    "getBetriebPartyM1": CommandDef(0x2303, TYPE_STATE),
+    "getTempRaumNorSollM1": CommandDef(0x2306, TYPE_SETPOINT, "Grad Celsius"),
+    "getTempRaumRedSollM1": CommandDef(0x2307, TYPE_SETPOINT, "Grad Celsius"),
+    "getTempPartyM1": CommandDef(0x2308, TYPE_SETPOINT, "Grad Celsius"),
+    "getTempRaumtemperaturA1M1": CommandDef(0x0896, TYPE_TEMP, "Grad Celsius"),
+    "getBetriebArtM2": CommandDef(0x3301, TYPE_ENUM, "", OPERATING_MODES),
+    "getBetriebSparM2": CommandDef(0x3302, TYPE_STATE),
+    "getBetriebPartyM2": CommandDef(0x3303, TYPE_STATE),
+    "getTempRaumNorSollM2": CommandDef(0x3306, TYPE_SETPOINT, "Grad Celsius"),
+    "getTempRaumRedSollM2": CommandDef(0x3307, TYPE_SETPOINT, "Grad Celsius"),
+    "getTempPartyM2": CommandDef(0x3308, TYPE_SETPOINT, "Grad Celsius"),
+    "getTempRaumtemperaturA1M2": CommandDef(0x0898, TYPE_TEMP, "Grad Celsius"),
+    "getBetriebArtM3": CommandDef(0x4301, TYPE_ENUM, "", OPERATING_MODES),
+    "getBetriebSparM3": CommandDef(0x4302, TYPE_STATE),
+    "getBetriebPartyM3": CommandDef(0x4303, TYPE_STATE),
+    "getTempRaumNorSollM3": CommandDef(0x4306, TYPE_SETPOINT, "Grad Celsius"),
+    "getTempRaumRedSollM3": CommandDef(0x4307, TYPE_SETPOINT, "Grad Celsius"),
+    "getTempPartyM3": CommandDef(0x4308, TYPE_SETPOINT, "Grad Celsius"),
+    "getTempRaumtemperaturA1M3": CommandDef(0x089A, TYPE_TEMP, "Grad Celsius"),
+    "getInventory": CommandDef(0x00F8, TYPE_HEX),
+}
+
+
+def circuit_command(key, circuit):
+    """Return the command of a heating circuit for a command of circuit 1.
+
+    Commands that do not belong to a circuit are returned as they are.
+    """
+    if not key.endswith("M1"):
+        return key
+    return f"{key[:-2]}M{circuit}"
+
+
+def size(cmd):
+    """Return the number of bytes of a command."""
+    return cmd.length or TYPE_SIZES[cmd.type]
+
+
+def plan(keys, commands=DEFAULT_COMMANDS, max_gap=MAX_GAP, max_block=MAX_BLOCK):
+    """Group keys into address ranges, each read in one transaction.
+
+    Commands closer than max_gap bytes share a range as long as it stays
+    within max_block bytes. Keys without a definition raise KeyError.
+    """
+    blocks = []
+    for key in sorted(dict.fromkeys(keys), key=lambda key: commands[key].address):
+        cmd = commands[key]
+        end = cmd.address + size(cmd)
+        if blocks:
+            last = blocks[-1]
+            if (
+                cmd.address <= last.address + last.length + max_gap
+                and end - last.address <= max_block
+            ):
+                blocks[-1] = Block(
+                    last.address,
+                    max(last.length, end - last.address),
+                    last.keys + [key],
+                )
+                continue
+        blocks.append(Block(cmd.address, size(cmd), [key]))
+    return blocks
+
+
+def decode(cmd, data):
+    """Return the text vcontrold shows for the bytes of a command."""
+    if cmd.type == TYPE_HEX:
+        return data.hex().upper()
+    signed = cmd.type == TYPE_TEMP
+    raw = int.from_bytes(data, "little", signed=signed)
+    if cmd.type == TYPE_TEMP:
+        value = f"{raw / 10:.1f}"
+    elif cmd.type == TYPE_PERCENT:
+        value = f"{raw / 2:.1f}"
+    elif cmd.type == TYPE_HOURS:
+        value = f"{raw / 3600:.2f}"
+    elif cmd.type == TYPE_ENUM:
+        value = cmd.values.get(raw, str(raw))
+    else:
+        value = str(raw)
+    return f"{value} {cmd.unit}" if cmd.unit else value
+
+
+def encode(cmd, text):
+    """Return the bytes to write for the value text of a set command."""
+    if cmd.type == TYPE_HEX:
+        return bytes.fromhex(text)
+    if cmd.type == TYPE_ENUM:
+        raw = next((raw for raw, name in cmd.values.items() if name == text), None)
+        if raw is None:
+            raise ValueError(f"Unknown value {text!r}")
+    elif cmd.type == TYPE_TEMP:
+        raw = round(float(text) * 10)
+    elif cmd.type == TYPE_PERCENT:
+        raw = round(float(text) * 2)
+    elif cmd.type == TYPE_HOURS:
+        raw = round(float(text) * 3600)
+    else:
+        raw = int(float(text))
+    return raw.to_bytes(size(cmd), "little", signed=cmd.type == TYPE_TEMP)
+
+
+def decode_block(block, data, commands=DEFAULT_COMMANDS):
+    """Return the text reply of every key of a range from its bytes."""
+    values = {}
+    for key in block.keys:
+        cmd = commands[key]
+        offset = cmd.address - block.address
+        values[key] = decode(cmd, data[offset:offset + size(cmd)])
+    return values
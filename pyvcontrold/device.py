@@ -0,0 +1,511 @@
+"""Asyncio client for the vcontrold telnet interface."""
+
+import asyncio
+import itertools
+import logging
+import time
+
+from .cache import CommandCache
+from .framing import ReplyFramer
+from .stats import (
+    PHASE_CONNECT,
+    PHASE_QUEUE,
+    PHASE_SYNC,
+    STAT_CIRCUIT_OPENS,
+    STAT_CONNECT_FAILURES,
+    STAT_ERRORS,
+    STAT_RECONNECTS,
+    STAT_RETRIES,
+    STAT_TIMEOUTS,
+    DeviceStats,
+)
+from .timeouts import TimeoutEstimator
+
+_LOGGER = logging.getLogger(__name__)
+
+PROMPT = "vctrld>"
+# Seconds to wait for a prompt, replies wait as long as TimeoutEstimator says
+READ_TIMEOUT = 1
+CONNECT_TIMEOUT = 5
+RETRIES = 3
+
+# Commands are sent while the circuit is closed. Once open, they fail at once
+# until a single probe, run after the backoff delay, half-opens it and
+# connects successfully.
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+# Failed connects in a row that open the circuit
+FAILURE_THRESHOLD = 3
+# Seconds before the first probe, doubled after every failed one
+BACKOFF_MIN = 1
+BACKOFF_MAX = 300
+
+VC_GET_INVENTORYID = "getInventory"
+
+# Jobs waiting for the connection are served in this order
+PRIORITY_WRITE = 0
+PRIORITY_USER = 1
+PRIORITY_POLL = 2
+PRIORITY_NAMES = {
+    PRIORITY_WRITE: "write",
+    PRIORITY_USER: "user",
+    PRIORITY_POLL: "poll",
+}
+# Background batches are cut into jobs of this many commands, so that writes
+# and user reads get the connection in between
+PIPELINE_DEPTH = 4
+# Reads are refused once this many read calls wait for the connection, however
+# many jobs each was cut into; writes are always queued
+QUEUE_LIMIT = 32
+
+
+def parse_int(value):
+    """Convert a vcontrold reply to int, dropping the unit"""
+    return int(value.split(' ', 1)[0])
+
+
+def parse_float(value):
+    """Convert a vcontrold reply to float, dropping the unit"""
+    return round(float(value.split(' ', 1)[0]), 2)
+
+
+class Device:
+    """This class connects to VControld"""
+
+    def __init__(self, host, port, cache=None, timeouts=None):
+        """Init function"""
+        self.cache = cache if cache is not None else CommandCache()
+        self.timeouts = timeouts if timeouts is not None else TimeoutEstimator()
+        self.stats = DeviceStats()
+        self._sessions = 0
+        self.circuit = CIRCUIT_CLOSED
+        self._failures = 0
+        self._backoff = BACKOFF_MIN
+        self._probe = None
+        self._queue = asyncio.PriorityQueue()
+        # future of the job the worker runs now
+        self._current = None
+        self._sequence = itertools.count()
+        self._worker = None
+        self._worker_started = None
+        self._busy = 0.0
+        self._max_depth = 0
+        self._rejected = 0
+        self._reads = 0
+        self._waits = {priority: [0, 0.0, 0.0] for priority in PRIORITY_NAMES}
+        self._host = host
+        self._port = port
+        self._address = f"{host}:{port}"
+        self._inventory = None
+        self._reader = None
+        self._writer = None
+        self._framer = ReplyFramer(PROMPT)
+        self._synced = False
+
+    async def connect(self):
+        """Open the session, raises ConnectionError at once while the circuit is open."""
+        if self.circuit == CIRCUIT_OPEN:
+            raise ConnectionError("Circuit open")
+        start = time.monotonic()
+        try:
+            _LOGGER.info("Connecting to %s", self._address)
+            await self._open()
+            _LOGGER.info("Connected")
+        except (OSError, ConnectionError, asyncio.TimeoutError) as err:
+            _LOGGER.warning("Failed to connect to %s %s", self._address, err)
+            self.stats.count(STAT_CONNECT_FAILURES)
+            self._drop()
+            self._connect_failed()
+            raise ConnectionError from err
+        self.stats.observe_phase(PHASE_CONNECT, time.monotonic() - start)
+        if self._sessions:
+            self.stats.count(STAT_RECONNECTS)
+        self._sessions += 1
+        self._failures = 0
+        self._backoff = BACKOFF_MIN
+        if self.circuit != CIRCUIT_CLOSED:
+            _LOGGER.info("Connection to %s is back", self._address)
+            self.circuit = CIRCUIT_CLOSED
+
+    async def _open(self):
+        """Open the telnet session and consume the first prompt."""
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self._host, self._port), CONNECT_TIMEOUT
+        )
+        await self._sync()
+
+    def _connect_failed(self):
+        """Open the circuit after too many failed connects or a failed probe."""
+        self._failures += 1
+        if self.circuit == CIRCUIT_CLOSED and self._failures < FAILURE_THRESHOLD:
+            return
+        if self.circuit == CIRCUIT_CLOSED:
+            _LOGGER.warning(
+                "Unable to reach %s, stop sending commands", self._address
+            )
+            self.stats.count(STAT_CIRCUIT_OPENS)
+        self.circuit = CIRCUIT_OPEN
+        if self._probe is None:
+            self._probe = asyncio.get_running_loop().create_task(self._run_probe())
+
+    async def _run_probe(self):
+        """Try to connect after each backoff delay until it works."""
+        try:
+            while self.circuit != CIRCUIT_CLOSED:
+                _LOGGER.debug("Probe connection in %d s", self._backoff)
+                await asyncio.sleep(self._backoff)
+                self._backoff = min(self._backoff * 2, BACKOFF_MAX)
+                self.circuit = CIRCUIT_HALF_OPEN
+                try:
+                    await self._submit(PRIORITY_WRITE, self.connect, probe=True)
+                except ConnectionError:
+                    pass
+        finally:
+            self._probe = None
+
+    async def close(self):
+        """Stop the connection worker and close the telnet session."""
+        if self._probe is not None:
+            self._probe.cancel()
+            self._probe = None
+        current = self._current
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+            self._worker_started = None
+        futures = [current] if current is not None else []
+        while not self._queue.empty():
+            futures.append(self._queue.get_nowait()[-1])
+        for future in futures:
+            if not future.done():
+                future.set_exception(ConnectionError("Connection closed"))
+        writer = self._writer
+        self._drop()
+        if writer is not None:
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    async def _submit(self, priority, func, *args, probe=False):
+        """Queue a job for the connection worker and wait for its result.
+
+        Only the probe gets through while the circuit is not closed.
+        """
+        if self.circuit != CIRCUIT_CLOSED and not probe:
+            raise ConnectionError(f"Circuit {self.circuit}")
+        loop = asyncio.get_running_loop()
+        if self._worker is None:
+            self._worker = loop.create_task(self._run_worker())
+            self._worker_started = time.monotonic()
+            self._busy = 0.0
+        future = loop.create_future()
+        self._queue.put_nowait(
+            (priority, next(self._sequence), time.monotonic(), func, args, future)
+        )
+        self._max_depth = max(self._max_depth, self._queue.qsize())
+        return await future
+
+    async def _run_worker(self):
+        """Run queued jobs one at a time, the session belongs to this task."""
+        while True:
+            priority, _, queued, func, args, future = await self._queue.get()
+            if future.done():
+                continue
+            wait = time.monotonic() - queued
+            self.stats.observe_phase(PHASE_QUEUE, wait)
+            stats = self._waits[priority]
+            stats[0] += 1
+            stats[1] += wait
+            stats[2] = max(stats[2], wait)
+            start = time.monotonic()
+            self._current = future
+            try:
+                result = await func(*args)
+            except Exception as err:  # pylint: disable=broad-except
+                if not future.done():
+                    future.set_exception(err)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                self._current = None
+                self._busy += time.monotonic() - start
+            if asyncio.current_task().cancelling():
+                # wait_for before Python 3.12 drops a cancellation that
+                # arrives as the awaited call fails, close() waits for it
+                raise asyncio.CancelledError
+
+    @property
+    def queue_stats(self):
+        """Return queue depth, worker utilization and per-priority waits.
+
+        Utilization is the share of time the worker spent on jobs since it
+        started, wait times are in seconds.
+        """
+        elapsed = (
+            time.monotonic() - self._worker_started
+            if self._worker_started is not None else 0
+        )
+        stats = {
+            "depth": self._queue.qsize(),
+            "reads": self._reads,
+            "max_depth": self._max_depth,
+            "rejected": self._rejected,
+            "busy": self._busy,
+            "utilization": self._busy / elapsed if elapsed else 0.0,
+        }
+        for priority, name in PRIORITY_NAMES.items():
+            count, total, longest = self._waits[priority]
+            stats[f"{name}_jobs"] = count
+            stats[f"{name}_wait_mean"] = total / count if count else 0.0
+            stats[f"{name}_wait_max"] = longest
+        return stats
+
+    def _drop(self):
+        """Forget the current session, the next command reconnects."""
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = None
+        self._writer = None
+        self._framer.clear()
+        self._synced = False
+
+    async def _send(self, msg):
+        self._writer.write(msg.encode() + b"\r\n")
+        await self._writer.drain()
+
+    async def _read_reply(self, timeout):
+        """Return the next reply as soon as its prompt arrives.
+
+        Raises asyncio.TimeoutError when no complete reply came in time.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            reply = self._framer.next_reply()
+            if reply is not None:
+                return reply
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError
+            data = await asyncio.wait_for(self._reader.read(4096), remaining)
+            if not data:
+                raise ConnectionError("Connection closed by vcontrold")
+            self._framer.feed(data)
+
+    async def _sync(self):
+        """Make sure the last prompt has been seen before sending a command.
+
+        A session is in sync once its prompt has been consumed and no reply
+        is outstanding; only then is a prompt waited for, or requested with
+        an empty line if vcontrold did not volunteer one.
+        """
+        if self._synced:
+            return
+        start = time.monotonic()
+        try:
+            await self._read_reply(READ_TIMEOUT)
+        except asyncio.TimeoutError:
+            await self._send("")
+            await self._read_reply(READ_TIMEOUT)
+        self._synced = True
+        self.stats.observe_phase(PHASE_SYNC, time.monotonic() - start)
+
+    async def read(self, key, priority=PRIORITY_USER):
+        """Send a get command and return its raw reply.
+
+        Returns "" when the command failed, raises ConnectionError when the
+        device could not be reached.
+        """
+        return (await self.read_many([key], priority))[key]
+
+    async def read_many(self, keys, priority=PRIORITY_POLL):
+        """Pipeline get commands over the session.
+
+        All commands are written back-to-back and the prompt-terminated
+        replies are matched to them in order. Commands with a fresh cache
+        entry are answered without touching the bus; background polls are
+        queued in jobs of PIPELINE_DEPTH commands. Returns a dict of raw
+        replies in the order of keys, "" for commands that failed. A job
+        failing with ConnectionError only fails its own commands; the error
+        is raised when no job got through, or at once when QUEUE_LIMIT
+        other reads are waiting.
+        """
+        values = {}
+        pending = []
+        for key in dict.fromkeys(keys):
+            value = self.cache.get(key)
+            if value is None:
+                pending.append(key)
+            else:
+                values[key] = value
+        batches = self._batches(pending, priority) if pending else []
+        if batches and self._reads >= QUEUE_LIMIT:
+            self._rejected += 1
+            raise ConnectionError("Connection queue full")
+        self._reads += 1
+        try:
+            results = await asyncio.gather(
+                *(self._submit(priority, self._read_batch, batch) for batch in batches),
+                return_exceptions=True,
+            )
+        finally:
+            self._reads -= 1
+        errors = []
+        for batch, result in zip(batches, results):
+            if isinstance(result, ConnectionError):
+                errors.append(result)
+                values.update(dict.fromkeys(batch, ""))
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                values.update(result)
+        if errors and len(errors) == len(batches):
+            raise errors[0]
+        return {key: values[key] for key in dict.fromkeys(keys)}
+
+    def _batches(self, keys, priority):
+        """Split the keys to read into jobs for the connection worker."""
+        if priority != PRIORITY_POLL:
+            return [keys]
+        return [
+            keys[index:index + PIPELINE_DEPTH]
+            for index in range(0, len(keys), PIPELINE_DEPTH)
+        ]
+
+    async def _read_batch(self, keys):
+        values = {}
+        pending = list(keys)
+        error = False
+        retry = RETRIES
+        while pending and retry != 0:
+            if retry != RETRIES:
+                self.stats.count(STAT_RETRIES)
+            if self._writer is None:
+                await self.connect()
+            try:
+                await self._sync()
+                self._synced = False
+                await self._send("\r\n".join(pending))
+                sent = time.monotonic()
+                while pending:
+                    value = await self._read_reply(self.timeouts.timeout(pending[0]))
+                    received = time.monotonic()
+                    key = pending.pop(0)
+                    self.stats.observe_command(key, received - sent)
+                    self.timeouts.observe(key, received - sent)
+                    sent = received
+                    if value.startswith("ERR"):
+                        _LOGGER.warning("Error reply for %s: %s", key, value)
+                        self.stats.count(STAT_ERRORS)
+                        value = ""
+                        error = True
+                    else:
+                        _LOGGER.debug("Read [%s] value=[%s]", key, value)
+                        self.cache.put(key, value)
+                    values[key] = value
+                self._synced = True
+            except asyncio.TimeoutError:
+                # replies still in flight would be matched to the wrong commands
+                _LOGGER.warning("Failed to read %s, retry", pending[0])
+                self.stats.count(STAT_TIMEOUTS)
+                self.timeouts.expired(pending[0])
+                self._drop()
+            except (OSError, ConnectionError):
+                _LOGGER.warning("Failed to read, retry")
+                self._drop()
+            retry -= 1
+        if pending:
+            _LOGGER.warning("Failed to read %s, cancel", ", ".join(pending))
+            self._drop()
+            for key in pending:
+                values[key] = ""
+        if error and self._writer is not None:
+            try:
+                await self._send("close")
+            except (OSError, ConnectionError):
+                _LOGGER.warning("Failed to close the session")
+            self._drop()
+        return values
+
+    async def readint(self, key):
+        val = parse_int(await self.read(key))
+        _LOGGER.debug(" int val=%d", val)
+        return val
+
+    async def readfloat(self, key):
+        val = parse_float(await self.read(key))
+        _LOGGER.debug(" float val=%s", val)
+        return val
+
+    async def write(self, key, val):
+        """Send a set command ahead of queued reads.
+
+        Returns True once vcontrold answered OK.
+        """
+        return await self._submit(PRIORITY_WRITE, self._write, key, val)
+
+    async def _write(self, key, val):
+        retry = RETRIES
+        while retry != 0:
+            if retry != RETRIES:
+                self.stats.count(STAT_RETRIES)
+            if self._writer is None:
+                await self.connect()
+            msg = key + " " + val
+            _LOGGER.debug("Write : %s", msg)
+            try:
+                await self._sync()
+                self._synced = False
+                await self._send(msg)
+                sent = time.monotonic()
+                response = await self._read_reply(self.timeouts.timeout(key))
+                self.stats.observe_command(key, time.monotonic() - sent)
+                self.timeouts.observe(key, time.monotonic() - sent)
+                self._synced = True
+            except asyncio.TimeoutError:
+                self.stats.count(STAT_TIMEOUTS)
+                self.timeouts.expired(key)
+                self._drop()
+                response = ""
+            except (OSError, ConnectionError):
+                self._drop()
+                response = ""
+            _LOGGER.debug("Response : [%s]", response)
+            if response.startswith("ERR"):
+                self.stats.count(STAT_ERRORS)
+            if response.startswith('OK'):
+                _LOGGER.debug("Success")
+                if key.startswith("set"):
+                    self.cache.invalidate("get" + key[3:])
+                return True
+            _LOGGER.warning("retry")
+            retry -= 1
+        _LOGGER.warning("Failed to write, cancel")
+        self._drop()
+        return False
+
+    async def read_inventory(self, priority=PRIORITY_USER):
+        """Read the inventory ID, the known one is kept when the read fails."""
+        value = (await self.read(VC_GET_INVENTORYID, priority)).split(' ', 1)[0]
+        if value != "":
+            self._inventory = value
+            _LOGGER.debug("Id = %s", self._inventory)
+        return self._inventory
+
+    @property
+    def id(self):
+        """Return ID of device."""
+        return self._inventory
+
+    @id.setter
+    def id(self, value):
+        """Use an ID known from an earlier session until the device is read."""
+        self._inventory = value
+
@@ -0,0 +1,183 @@
+"""Stand-in Viessmann controller speaking P300 on a pseudo-terminal.
+
+    python -m pyvcontrold.emulator [--latency S]
+
+Prints the path of the serial device to give OptolinkDevice with
+port_class=PtySerialPort, and answers the P300 handshake and the read and
+write telegrams from a memory image laid out as in pyvcontrold.commands,
+holding the values of the simulator.
+Each telegram is answered after the given latency plus the time its bytes
+take on a 4800 baud line.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import pty
+import termios
+import tty
+
+from .commands import DEFAULT_COMMANDS, encode
+from .optolink import (
+    ACK,
+    FUNCTION_READ,
+    FUNCTION_WRITE,
+    KW_SYNC,
+    MSG_ERROR,
+    MSG_REQUEST,
+    MSG_RESPONSE,
+    NACK,
+    RESET,
+    START,
+    SYNC,
+    SerialPort,
+    telegram,
+)
+from .simulator import CIRCUIT_COMMANDS, COMMANDS, DEFAULT_LATENCY
+
+_LOGGER = logging.getLogger(__name__)
+
+# Seconds per byte at 4800 baud with start, parity and two stop bits
+BYTE_TIME = 12 / 4800
+MEMORY_SIZE = 0x10000
+
+
+class PtySerialPort(SerialPort):
+    """SerialPort on the pseudo-terminal of an Emulator.
+
+    A pseudo-terminal has no parity bit, and refuses it once the rest of
+    the line is set up.
+    """
+
+    CFLAG = SerialPort.CFLAG & ~termios.PARENB
+
+
+class Emulator:
+    """Answers P300 telegrams on the master side of a pseudo-terminal.
+
+    values holds vcontrold style replies of get commands, stored at the
+    addresses of commands. log lists (function, address, count) of every
+    telegram answered.
+    """
+
+    def __init__(self, values=None, commands=None, latency=DEFAULT_LATENCY):
+        """Init function"""
+        self.commands = commands if commands is not None else DEFAULT_COMMANDS
+        self.latency = latency
+        self.memory = bytearray(MEMORY_SIZE)
+        self.log = []
+        self.path = None
+        self._master = None
+        self._slave = None
+        self._buffer = bytearray()
+        self._bus = None
+        if values is None:
+            values = {**COMMANDS, **CIRCUIT_COMMANDS}
+        for key, value in values.items():
+            if key in self.commands:
+                self.poke(key, value.split(" ", 1)[0])
+
+    def poke(self, key, text):
+        """Store the value text of a get command."""
+        cmd = self.commands[key]
+        data = encode(cmd, text)
+        self.memory[cmd.address:cmd.address + len(data)] = data
+
+    def start(self):
+        """Open the pseudo-terminal and return the path of its serial side."""
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._master)
+        tty.setraw(self._slave)
+        os.set_blocking(self._master, False)
+        self.path = os.ttyname(self._slave)
+        self._bus = asyncio.Lock()
+        asyncio.get_running_loop().add_reader(self._master, self._on_data)
+        return self.path
+
+    def stop(self):
+        if self._master is not None:
+            asyncio.get_running_loop().remove_reader(self._master)
+            os.close(self._master)
+            os.close(self._slave)
+            self._master = self._slave = None
+
+    def _on_data(self):
+        try:
+            self._buffer += os.read(self._master, 4096)
+        except OSError:
+            return
+        while self._buffer:
+            if self._buffer[:1] == RESET:
+                del self._buffer[:1]
+                self._reply(KW_SYNC)
+            elif self._buffer[:1] == ACK:
+                del self._buffer[:1]
+            elif self._buffer[0] == SYNC[0]:
+                if len(self._buffer) < len(SYNC):
+                    return
+                del self._buffer[:len(SYNC)]
+                self._reply(ACK)
+            elif self._buffer[0] == START:
+                if len(self._buffer) < 2 or len(self._buffer) < self._buffer[1] + 3:
+                    return
+                length = self._buffer[1]
+                frame = bytes(self._buffer[:length + 3])
+                del self._buffer[:length + 3]
+                self._request(frame)
+            else:
+                del self._buffer[:1]
+
+    def _reply(self, data):
+        os.write(self._master, data)
+
+    def _request(self, frame):
+        payload, checksum = frame[1:-1], frame[-1]
+        if sum(payload) & 0xFF != checksum or payload[1] != MSG_REQUEST:
+            self._reply(NACK)
+            return
+        function = payload[2]
+        address = int.from_bytes(payload[3:5], "big")
+        count = payload[5]
+        self.log.append((function, address, count))
+        self._reply(ACK)
+        if function == FUNCTION_READ and address + count <= MEMORY_SIZE:
+            data = bytes(self.memory[address:address + count])
+            response = telegram(MSG_RESPONSE, function, address, count, data)
+        elif function == FUNCTION_WRITE and len(payload) == 6 + count:
+            self.memory[address:address + count] = payload[6:]
+            response = telegram(MSG_RESPONSE, function, address, count)
+        else:
+            response = telegram(MSG_ERROR, function, address, count)
+        asyncio.ensure_future(self._answer(response))
+
+    async def _answer(self, response):
+        """Send a response once the bus had time to carry it."""
+        async with self._bus:
+            await asyncio.sleep(self.latency + len(response) * BYTE_TIME)
+            if self._master is not None:
+                self._reply(response)
+
+
+async def serve(latency):
+    emulator = Emulator(latency=latency)
+    print(emulator.start(), flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        emulator.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(serve(args.latency))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""Incremental framing of the vcontrold prompt protocol."""
+
+
+class ReplyFramer:
+    """Buffers bytes received from vcontrold and cuts them into replies.
+
+    Every reply ends with the prompt, so a reply is complete as soon as the
+    prompt shows up in the buffer, however the bytes were split in transit.
+    """
+
+    def __init__(self, prompt):
+        """Init function"""
+        self._prompt = prompt.encode()
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        """Append bytes read from the session."""
+        self._buffer += data
+
+    def next_reply(self):
+        """Pop the next complete reply without its prompt, None if incomplete."""
+        end = self._buffer.find(self._prompt)
+        if end < 0:
+            return None
+        reply = bytes(self._buffer[:end])
+        del self._buffer[:end + len(self._prompt)]
+        return reply.decode(errors="replace").strip()
+
+    def clear(self):
+        """Drop buffered bytes, used when the session is reset."""
+        self._buffer.clear()
+
+    def __len__(self):
+        return len(self._buffer)
@@ -0,0 +1,300 @@
+"""Direct Optolink backend speaking the Viessmann P300 protocol.
+
+OptolinkDevice offers the API of Device on the serial adapter itself, with
+no vcontrold in between. Commands are read by address as planned by
+pyvcontrold.commands, so neighbouring values come in a single transaction.
+"""
+
+import asyncio
+import logging
+import os
+import termios
+import time
+
+from .commands import DEFAULT_COMMANDS, decode_block, encode, plan
+from .device import PRIORITY_POLL, READ_TIMEOUT, RETRIES, Device
+from .stats import STAT_ERRORS, STAT_RETRIES, STAT_TIMEOUTS
+
+_LOGGER = logging.getLogger(__name__)
+
+# Control bytes
+RESET = b"\x04"
+KW_SYNC = b"\x05"
+ACK = b"\x06"
+NACK = b"\x15"
+SYNC = b"\x16\x00\x00"
+START = 0x41
+# Telegram types and functions
+MSG_REQUEST = 0x00
+MSG_RESPONSE = 0x01
+MSG_ERROR = 0x03
+FUNCTION_READ = 0x01
+FUNCTION_WRITE = 0x02
+
+
+class ProtocolError(Exception):
+    """A telegram was refused, malformed or answered with an error."""
+
+
+def telegram(msg_type, function, address, count, data=b""):
+    """Return a complete P300 telegram."""
+    body = bytes([msg_type, function]) + address.to_bytes(2, "big") + bytes([count])
+    payload = bytes([len(body) + len(data)]) + body + data
+    return bytes([START]) + payload + bytes([sum(payload) & 0xFF])
+
+
+class SerialPort:
+    """Raw 4800 baud 8E2 serial line, read without blocking the event loop.
+
+    termios errors are raised as OSError, like those of the line itself.
+    """
+
+    # 8 data bits, even parity, 2 stop bits
+    CFLAG = (
+        termios.CS8 | termios.PARENB | termios.CSTOPB | termios.CREAD
+        | termios.CLOCAL
+    )
+
+    def __init__(self, path):
+        """Init function"""
+        self._path = path
+        self._fd = None
+        self._buffer = bytearray()
+
+    def open(self):
+        self._fd = os.open(self._path, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        try:
+            self._configure()
+            self.flush()
+        except OSError:
+            self.close()
+            raise
+
+    def _configure(self):
+        try:
+            attrs = termios.tcgetattr(self._fd)
+            attrs[0] = 0
+            attrs[1] = 0
+            attrs[2] = self.CFLAG
+            attrs[3] = 0
+            attrs[4] = attrs[5] = termios.B4800
+            attrs[6][termios.VMIN] = 0
+            attrs[6][termios.VTIME] = 0
+            termios.tcsetattr(self._fd, termios.TCSANOW, attrs)
+        except termios.error as err:
+            raise OSError(*err.args) from err
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self._buffer.clear()
+
+    def flush(self):
+        """Drop bytes received so far."""
+        try:
+            termios.tcflush(self._fd, termios.TCIFLUSH)
+        except termios.error as err:
+            raise OSError(*err.args) from err
+        self._buffer.clear()
+
+    def write(self, data):
+        os.write(self._fd, data)
+
+    async def read(self, count, timeout):
+        """Return exactly count bytes, raises asyncio.TimeoutError."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while len(self._buffer) < count:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError
+            readable = loop.create_future()
+            loop.add_reader(
+                self._fd, lambda: readable.done() or readable.set_result(None)
+            )
+            try:
+                await asyncio.wait_for(readable, remaining)
+            finally:
+                loop.remove_reader(self._fd)
+            try:
+                data = os.read(self._fd, 256)
+            except BlockingIOError:
+                continue
+            if not data:
+                raise ConnectionError("Serial line closed")
+            self._buffer += data
+        data = bytes(self._buffer[:count])
+        del self._buffer[:count]
+        return data
+
+
+class OptolinkDevice(Device):
+    """Reads and writes the controller over an Optolink serial adapter."""
+
+    def __init__(
+        self, path, cache=None, timeouts=None, commands=None,
+        port_class=SerialPort,
+    ):
+        """Init function"""
+        super().__init__(path, 0, cache, timeouts)
+        self._address = path
+        self.commands = commands if commands is not None else DEFAULT_COMMANDS
+        self._port_class = port_class
+        self._serial = None
+
+    async def _open(self):
+        """Open the serial line and switch the controller to P300."""
+        serial = self._port_class(self._address)
+        serial.open()
+        self._serial = serial
+        serial.write(RESET)
+        try:
+            # KW mode announces itself every 2 s, P300 acknowledges the reset
+            await serial.read(1, READ_TIMEOUT)
+        except asyncio.TimeoutError:
+            pass
+        serial.flush()
+        serial.write(SYNC)
+        if await serial.read(1, READ_TIMEOUT) != ACK:
+            raise ConnectionError("Controller did not acknowledge P300")
+
+    def _drop(self):
+        if self._serial is not None:
+            self._serial.close()
+            self._serial = None
+
+    async def _transact(self, function, address, count, data, timeout):
+        """Send one request and return the data of its response."""
+        serial = self._serial
+        serial.write(telegram(MSG_REQUEST, function, address, count, data))
+        ack = await serial.read(1, timeout)
+        if ack != ACK:
+            raise ProtocolError(f"Request refused with {ack.hex()}")
+        if (await serial.read(1, timeout))[0] != START:
+            raise ProtocolError("Response without start byte")
+        length = (await serial.read(1, timeout))[0]
+        payload = await serial.read(length + 1, timeout)
+        body, checksum = payload[:-1], payload[-1]
+        if (length + sum(body)) & 0xFF != checksum:
+            serial.write(NACK)
+            raise ProtocolError("Bad checksum")
+        serial.write(ACK)
+        if len(body) < 5:
+            raise ProtocolError("Response too short")
+        if body[0] == MSG_ERROR:
+            raise ProtocolError(f"Error response for {address:04X}")
+        if body[1] != function or int.from_bytes(body[2:4], "big") != address:
+            raise ProtocolError("Response to another request")
+        if body[4] != count or function == FUNCTION_READ and len(body) != 5 + count:
+            raise ProtocolError(f"Response of {len(body) - 5} bytes, not {count}")
+        return body[5:]
+
+    def _batches(self, keys, priority):
+        """Poll one address range per job, so writes get the line in between."""
+        if priority != PRIORITY_POLL:
+            return [keys]
+        known = [key for key in keys if key in self.commands]
+        batches = [block.keys for block in plan(known, self.commands)]
+        unknown = [key for key in keys if key not in self.commands]
+        if unknown:
+            batches.append(unknown)
+        return batches
+
+    async def _read_batch(self, keys):
+        values = {}
+        for key in keys:
+            if key not in self.commands:
+                _LOGGER.warning("No address known for %s", key)
+                self.stats.count(STAT_ERRORS)
+                values[key] = ""
+        known = [key for key in keys if key not in values]
+        for block in plan(known, self.commands):
+            values.update(await self._read_block(block))
+        return values
+
+    async def _read_block(self, block):
+        retry = RETRIES
+        while retry != 0:
+            if retry != RETRIES:
+                self.stats.count(STAT_RETRIES)
+            if self._serial is None:
+                await self.connect()
+            key = block.keys[0]
+            start = time.monotonic()
+            try:
+                data = await self._transact(
+                    FUNCTION_READ, block.address, block.length, b"",
+                    self.timeouts.timeout(key),
+                )
+            except asyncio.TimeoutError:
+                _LOGGER.warning("Failed to read %s, retry", ", ".join(block.keys))
+                self.stats.count(STAT_TIMEOUTS)
+                self.timeouts.expired(key)
+                self._drop()
+            except ProtocolError as err:
+                _LOGGER.warning("Failed to read %s: %s", ", ".join(block.keys), err)
+                self.stats.count(STAT_ERRORS)
+                self._drop()
+            except (OSError, ConnectionError):
+                _LOGGER.warning("Failed to read, retry")
+                self._drop()
+            else:
+                elapsed = time.monotonic() - start
+                self.timeouts.observe(key, elapsed)
+                values = decode_block(block, data, self.commands)
+                for key, value in values.items():
+                    _LOGGER.debug("Read [%s] value=[%s]", key, value)
+                    self.stats.observe_command(key, elapsed)
+                    self.cache.put(key, value)
+                return values
+            retry -= 1
+        _LOGGER.warning("Failed to read %s, cancel", ", ".join(block.keys))
+        return dict.fromkeys(block.keys, "")
+
+    async def _write(self, key, val):
+        get_key = "get" + key[3:]
+        cmd = None
+        if key.startswith("set"):
+            cmd = self.commands.get(key, self.commands.get(get_key))
+        if cmd is None:
+            _LOGGER.warning("No address known for %s", key)
+            return False
+        try:
+            data = encode(cmd, val)
+        except (ValueError, OverflowError):
+            _LOGGER.warning("Unable to encode %s %s", key, val)
+            return False
+        retry = RETRIES
+        while retry != 0:
+            if retry != RETRIES:
+                self.stats.count(STAT_RETRIES)
+            if self._serial is None:
+                await self.connect()
+            _LOGGER.debug("Write : %s %s", key, val)
+            start = time.monotonic()
+            try:
+                await self._transact(
+                    FUNCTION_WRITE, cmd.address, len(data), data,
+                    self.timeouts.timeout(key),
+                )
+            except asyncio.TimeoutError:
+                self.stats.count(STAT_TIMEOUTS)
+                self.timeouts.expired(key)
+                self._drop()
+            except ProtocolError as err:
+                _LOGGER.warning("Failed to write %s: %s", key, err)
+                self.stats.count(STAT_ERRORS)
+                self._drop()
+            except (OSError, ConnectionError):
+                self._drop()
+            else:
+                elapsed = time.monotonic() - start
+                self.stats.observe_command(key, elapsed)
+                self.timeouts.observe(key, elapsed)
+                self.cache.invalidate(get_key)
+                return True
+            _LOGGER.warning("retry")
+            retry -= 1
+        _LOGGER.warning("Failed to write, cancel")
+        return False
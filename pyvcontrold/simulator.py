@@ -0,0 +1,214 @@
+"""Stand-in vcontrold server speaking the vctrld> prompt protocol.
+
+    python -m pyvcontrold.simulator [--port P] [--latency S] [--fault F=RATE]
+
+Answers the get and set commands used by the integration from a table of
+values, one command at a time as the Optolink bus would, each after its
+configured latency. Set commands answer OK and change the matching get
+value. Faults of the serial adapter can be injected at a rate per command,
+or per session for refused connections.
+"""
+
+import argparse
+import asyncio
+import collections
+import logging
+import random
+
+from .commands import circuit_command
+from .device import PROMPT
+
+_LOGGER = logging.getLogger(__name__)
+
+# Seconds the Optolink bus typically needs per command
+DEFAULT_LATENCY = 0.05
+
+# Session closed without a reply
+FAULT_DROP = "drop"
+# Reply held back for STALL_TIME
+FAULT_STALL = "stall"
+# ERR reply instead of the value
+FAULT_ERR = "err"
+# Reply followed by a truncated prompt
+FAULT_PARTIAL = "partial"
+# Reply preceded by line noise
+FAULT_GARBAGE = "garbage"
+# Session closed before the first prompt
+FAULT_REFUSE = "refuse"
+COMMAND_FAULTS = [FAULT_DROP, FAULT_STALL, FAULT_ERR, FAULT_PARTIAL, FAULT_GARBAGE]
+FAULTS = COMMAND_FAULTS + [FAULT_REFUSE]
+STALL_TIME = 2
+GARBAGE = b"\x00\xff\x05\x41"
+
+COMMANDS = {
+    "getInventory": "20CB",
+    "getTempA": "12.3 Grad Celsius",
+    "getTempWWist": "48.1 Grad Celsius",
+    "getTempWWsoll": "50.0 Grad Celsius",
+    "getTempStp2": "47.0 Grad Celsius",
+    "getBrennerStatus": "0.0 %",
+    "getBrennerStarts": "12345",
+    "getBrennerStunden1": "4321.20 Stunden",
+    "getPumpeStatusIntern": "0",
+    "getPumpeStatusZirku": "0",
+    "getBetriebArtM1": "H+WW",
+    "getBetriebSparM1": "0",
+    "getBetriebPartyM1": "0",
+    "getTempRaumNorSollM1": "21.0 Grad Celsius",
+    "getTempRaumRedSollM1": "17.0 Grad Celsius",
+    "getTempPartyM1": "22.0 Grad Celsius",
+    "getTempRaumtemperaturA1M1": "20.5 Grad Celsius",
+}
+
+# Settings of the heating circuits 2 and 3, same as those of circuit 1
+CIRCUIT_COMMANDS = {
+    circuit_command(key, circuit): value
+    for circuit in (2, 3)
+    for key, value in COMMANDS.items()
+    if key.endswith("M1")
+}
+
+
+class Simulator:
+    """Serves the command table over TCP like vcontrold does.
+
+    latency applies to every command, latencies overrides it per command.
+    Commands of all sessions share one bus and are answered in turn. faults
+    maps fault names to the share of commands, or sessions, they hit.
+    """
+
+    def __init__(
+        self, values=None, latency=DEFAULT_LATENCY, latencies=None,
+        faults=None, seed=None,
+    ):
+        """Init function"""
+        self.values = dict(
+            {**COMMANDS, **CIRCUIT_COMMANDS} if values is None else values
+        )
+        self.latency = latency
+        self.latencies = dict(latencies or {})
+        self.faults = dict(faults or {})
+        self.injected = collections.Counter()
+        self.log = []
+        self.sessions = 0
+        self._forced = collections.deque()
+        self._random = random.Random(seed)
+        self._bus = asyncio.Lock()
+        self._server = None
+
+    def inject(self, fault):
+        """Make the next command, or session for FAULT_REFUSE, hit fault."""
+        self._forced.append(fault)
+
+    def _fault(self, kinds):
+        """Return the fault to apply now among kinds, None for a clean reply."""
+        if self._forced and self._forced[0] in kinds:
+            fault = self._forced.popleft()
+        else:
+            fault = next(
+                (kind for kind in kinds
+                 if self._random.random() < self.faults.get(kind, 0)),
+                None,
+            )
+        if fault is not None:
+            self.injected[fault] += 1
+        return fault
+
+    async def start(self, host="127.0.0.1", port=0):
+        """Start listening, return the port, a free one when port is 0."""
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """Stop listening and wait for the server to close."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader, writer):
+        self.sessions += 1
+        prompt = PROMPT.encode()
+        try:
+            if self._fault([FAULT_REFUSE]) is not None:
+                return
+            writer.write(prompt)
+            await writer.drain()
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                cmd = line.decode(errors="replace").strip()
+                if cmd == "close":
+                    break
+                if not cmd:
+                    writer.write(prompt)
+                    await writer.drain()
+                    continue
+                fault = self._fault(COMMAND_FAULTS)
+                reply = (await self._answer(cmd)).encode()
+                if fault == FAULT_DROP:
+                    break
+                if fault == FAULT_STALL:
+                    await asyncio.sleep(STALL_TIME)
+                elif fault == FAULT_ERR:
+                    reply = b"ERR: simulated fault\n"
+                elif fault == FAULT_GARBAGE:
+                    reply = GARBAGE + reply
+                if fault == FAULT_PARTIAL:
+                    writer.write(reply + prompt[:len(prompt) // 2])
+                else:
+                    writer.write(reply + prompt)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _answer(self, cmd):
+        """Run one command on the bus and return its reply line."""
+        self.log.append(cmd)
+        key, _, val = cmd.partition(" ")
+        async with self._bus:
+            await asyncio.sleep(self.latencies.get(key, self.latency))
+        if key.startswith("set") and val:
+            self.values["get" + key[3:]] = val
+            return "OK\n"
+        if key in self.values:
+            return self.values[key] + "\n"
+        return f"ERR: command {key} unknown\n"
+
+
+async def serve(host, port, latency, faults):
+    sim = Simulator(latency=latency, faults=faults)
+    port = await sim.start(host, port)
+    _LOGGER.info("Simulating vcontrold on %s:%d", host, port)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await sim.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3002)
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY)
+    parser.add_argument("--fault", action="append", default=[],
+                        metavar="FAULT=RATE", help=f"one of {', '.join(FAULTS)}")
+    args = parser.parse_args()
+    faults = {}
+    for fault in args.fault:
+        name, _, rate = fault.partition("=")
+        if name not in FAULTS:
+            parser.error(f"unknown fault {name}")
+        faults[name] = float(rate)
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(serve(args.host, args.port, args.latency, faults))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
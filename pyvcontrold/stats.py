@@ -0,0 +1,116 @@
+"""Latency histograms and fault counters of the vcontrold client."""
+
+# Upper bounds in seconds of the latency buckets, the last bucket is open
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+# Waiting for the connection worker, where the mutex used to be
+PHASE_QUEUE = "queue"
+# Opening the session up to its first prompt
+PHASE_CONNECT = "connect"
+# Draining the prompt before a command
+PHASE_SYNC = "sync"
+# Waiting for the reply of a command
+PHASE_REPLY = "reply"
+PHASES = [PHASE_QUEUE, PHASE_CONNECT, PHASE_SYNC, PHASE_REPLY]
+
+STAT_RETRIES = "retries"
+STAT_TIMEOUTS = "timeouts"
+STAT_ERRORS = "errors"
+STAT_RECONNECTS = "reconnects"
+STAT_CONNECT_FAILURES = "connect_failures"
+STAT_CIRCUIT_OPENS = "circuit_opens"
+COUNTERS = [
+    STAT_RETRIES, STAT_TIMEOUTS, STAT_ERRORS, STAT_RECONNECTS, STAT_CONNECT_FAILURES,
+    STAT_CIRCUIT_OPENS,
+]
+
+
+class Histogram:
+    """Counts durations into fixed latency buckets."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """Init function"""
+        self._bounds = buckets
+        self.buckets = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        """Add one duration."""
+        index = next(
+            (index for index, bound in enumerate(self._bounds) if seconds <= bound),
+            len(self._bounds),
+        )
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    @property
+    def mean(self):
+        """Return the mean duration, 0 when nothing was observed."""
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, share):
+        """Return the bucket bound below which share of the durations fell.
+
+        The bound is capped at the longest duration seen.
+        """
+        rank = share * self.count
+        seen = 0
+        for bound, count in zip(self._bounds, self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def as_dict(self):
+        """Return the histogram with durations in milliseconds."""
+        labels = [f"le_{bound * 1000:g}ms" for bound in self._bounds] + ["inf"]
+        return {
+            "count": self.count,
+            "mean_ms": round(self.mean * 1000, 1),
+            "p95_ms": round(self.quantile(0.95) * 1000, 1),
+            "max_ms": round(self.max * 1000, 1),
+            "buckets": dict(zip(labels, self.buckets)),
+        }
+
+
+class DeviceStats:
+    """Per-phase and per-command latencies plus fault counters of a Device."""
+
+    def __init__(self):
+        """Init function"""
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.phases = {phase: Histogram() for phase in PHASES}
+        self.commands = {}
+
+    def count(self, counter):
+        """Increment a counter."""
+        self.counters[counter] += 1
+
+    def observe_phase(self, phase, seconds):
+        """Add the duration of a phase."""
+        self.phases[phase].observe(seconds)
+
+    def observe_command(self, key, seconds):
+        """Add the reply latency of a command."""
+        if key not in self.commands:
+            self.commands[key] = Histogram()
+        self.commands[key].observe(seconds)
+        self.phases[PHASE_REPLY].observe(seconds)
+
+    def slowest(self, count=5):
+        """Return the commands with the highest mean reply latency."""
+        return sorted(
+            self.commands, key=lambda key: self.commands[key].mean, reverse=True
+        )[:count]
+
+    def as_dict(self):
+        """Return every counter and histogram."""
+        return {
+            **self.counters,
+            "phases": {phase: hist.as_dict() for phase, hist in self.phases.items()},
+            "commands": {key: hist.as_dict() for key, hist in self.commands.items()},
+        }
@@ -0,0 +1,64 @@
+"""Per-command reply timeouts learned from observed latency."""
+
+# Seconds, bounds of every timeout
+DEFAULT_MIN_TIMEOUT = 0.2
+DEFAULT_MAX_TIMEOUT = 5
+# Seconds, timeout of a command before its first reply
+INITIAL_TIMEOUT = 1
+# Weights of a new sample in the mean and in the deviation, and the number of
+# deviations allowed on top of the mean, as for TCP retransmission timers
+MEAN_GAIN = 1 / 8
+DEVIATION_GAIN = 1 / 4
+DEVIATION_MARGIN = 4
+# Largest factor timeouts in a row can stretch a timeout by
+MAX_BACKOFF = 64
+
+
+class TimeoutEstimator:
+    """Keeps a smoothed latency and deviation per command.
+
+    The timeout of a command is its mean latency plus DEVIATION_MARGIN
+    deviations, clamped to [min_timeout, max_timeout]. A timeout doubles
+    the timeout of its command until the next reply is observed.
+    """
+
+    def __init__(
+        self, min_timeout=DEFAULT_MIN_TIMEOUT, max_timeout=DEFAULT_MAX_TIMEOUT,
+    ):
+        """Init function"""
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self._estimates = {}
+        self._backoff = {}
+
+    def timeout(self, key):
+        """Return the seconds to wait for the reply of a command."""
+        estimate = self._estimates.get(key)
+        if estimate is None:
+            timeout = INITIAL_TIMEOUT
+        else:
+            mean, deviation = estimate
+            timeout = mean + DEVIATION_MARGIN * deviation
+        timeout *= self._backoff.get(key, 1)
+        return min(max(timeout, self.min_timeout), self.max_timeout)
+
+    def observe(self, key, seconds):
+        """Add the latency of a reply."""
+        self._backoff.pop(key, None)
+        estimate = self._estimates.get(key)
+        if estimate is None:
+            self._estimates[key] = (seconds, seconds / 2)
+            return
+        mean, deviation = estimate
+        deviation += DEVIATION_GAIN * (abs(seconds - mean) - deviation)
+        mean += MEAN_GAIN * (seconds - mean)
+        self._estimates[key] = (mean, deviation)
+
+    def expired(self, key):
+        """Record a timeout of a command."""
+        self._backoff[key] = min(self._backoff.get(key, 1) * 2, MAX_BACKOFF)
+
+    @property
+    def stats(self):
+        """Return the current timeout of every observed command."""
+        return {key: round(self.timeout(key), 3) for key in self._estimates}
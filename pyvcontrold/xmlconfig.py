@@ -0,0 +1,224 @@
+"""Command definitions read from the vcontrold.xml and vito.xml of vcontrold.
+
+    python -m pyvcontrold.xmlconfig PATH [--device ID]
+
+vcontrold.xml defines the units and includes vito.xml, which defines the
+commands. load_commands() turns both into CommandDef entries as used by
+pyvcontrold.commands, and keeps them in a JSON cache that is only rebuilt
+once one of the XML files changed, so large files are parsed once.
+"""
+
+import argparse
+import json
+import logging
+import os
+import xml.etree.ElementTree as ET
+
+from .commands import (
+    TYPE_COUNT,
+    TYPE_ENUM,
+    TYPE_HEX,
+    TYPE_HOURS,
+    TYPE_PERCENT,
+    TYPE_SETPOINT,
+    TYPE_STATE,
+    TYPE_TEMP,
+    CommandDef,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+# vcontrold.xml sits next to vito.xml when only the latter is given
+MAIN_FILE = "vcontrold.xml"
+PROTOCOL_COMMANDS = ("getaddr", "setaddr")
+
+# Conversions of vcontrold units, by the divisor of their get formula
+DIVISOR_TYPES = {
+    "10": TYPE_TEMP,
+    "2": TYPE_PERCENT,
+    "3600": TYPE_HOURS,
+}
+
+
+def _text(element, tag, default=None):
+    child = element.find(tag)
+    if child is None or child.text is None:
+        return default
+    return child.text.strip()
+
+
+def _unit_def(unit):
+    """Return type, unit name and enum values of a vcontrold unit element."""
+    entity = _text(unit, "entity", "")
+    if _text(unit, "type") == "enum":
+        # vcontrold names unlisted values by an enum without bytes, decode
+        # shows them raw instead
+        values = {
+            int.from_bytes(bytes.fromhex(enum.get("bytes")), "little"):
+                enum.get("text", "")
+            for enum in unit.iter("enum")
+            if enum.get("bytes")
+        }
+        return TYPE_ENUM, entity, values
+    calc = unit.find("calc")
+    formula = "V" if calc is None else calc.get("get", "V").replace(" ", "")
+    if formula == "V":
+        return None, entity, None
+    for variable in ("V/", "B0/"):
+        if formula.startswith(variable):
+            divisor_type = DIVISOR_TYPES.get(formula[len(variable):])
+            if divisor_type is not None:
+                return divisor_type, entity, None
+    return TYPE_HEX, entity, None
+
+
+def _integer_type(length, unit):
+    if length == 1:
+        return TYPE_SETPOINT if unit else TYPE_STATE
+    return TYPE_COUNT
+
+
+def _sources(path):
+    """Return the XML files behind path, included files after it."""
+    sources = [os.path.abspath(path)]
+    for source in sources:
+        root = ET.parse(source).getroot()
+        for element in root.iter():
+            if not isinstance(element.tag, str):
+                continue
+            href = element.get("href")
+            if element.tag.rsplit("}", 1)[-1] == "include" and href:
+                included = os.path.join(os.path.dirname(source), href)
+                if included not in sources:
+                    sources.append(included)
+    main = os.path.join(os.path.dirname(sources[0]), MAIN_FILE)
+    if main not in sources and os.path.exists(main):
+        sources.append(main)
+    return sources
+
+
+def parse_xml(sources, device_id=None):
+    """Return the command definitions of the XML files, by command name.
+
+    Settings of a command given for device_id override its defaults.
+    Commands other than address reads and writes, or without an address
+    or a known unit, are left out.
+    """
+    units = {}
+    elements = []
+    for source in sources:
+        root = ET.parse(source).getroot()
+        for unit in root.iter("unit"):
+            abbrev = _text(unit, "abbrev")
+            if abbrev:
+                units[abbrev] = _unit_def(unit)
+        elements.extend(root.iter("command"))
+    commands = {}
+    for element in elements:
+        name = element.get("name")
+        if not name or element.get("protocmd") not in PROTOCOL_COMMANDS:
+            continue
+        settings = {tag: _text(element, tag) for tag in ("addr", "len", "unit")}
+        for device in element.iter("device"):
+            if device_id is None or device.get("ID", "").upper() != device_id.upper():
+                continue
+            settings.update(
+                (tag, _text(device, tag)) for tag in ("addr", "len", "unit")
+                if _text(device, tag) is not None
+            )
+        if settings["addr"] is None or settings["unit"] not in units:
+            continue
+        try:
+            address = int(settings["addr"], 16)
+            length = int(settings["len"] or 1)
+        except ValueError:
+            _LOGGER.warning("Invalid address or length of %s", name)
+            continue
+        cmd_type, unit, values = units[settings["unit"]]
+        if cmd_type is None:
+            cmd_type = _integer_type(length, unit)
+        commands[name] = CommandDef(address, cmd_type, unit, values, length)
+    return commands
+
+
+def _stamp(sources):
+    stamp = {}
+    for source in sources:
+        stat = os.stat(source)
+        stamp[source] = [stat.st_mtime_ns, stat.st_size]
+    return stamp
+
+
+def _to_json(cmd):
+    values = None if cmd.values is None else list(cmd.values.items())
+    return [cmd.address, cmd.type, cmd.unit, values, cmd.length]
+
+
+def _from_json(entry):
+    address, cmd_type, unit, values, length = entry
+    if values is not None:
+        values = {raw: text for raw, text in values}
+    return CommandDef(address, cmd_type, unit, values, length)
+
+
+def load_commands(path, cache_path=None, device_id=None):
+    """Return the command definitions of path, from the cache while valid.
+
+    The cache is valid as long as path, device_id, and the modification
+    time and size of every XML file are those it was built from. Blocking,
+    run it in an executor from the event loop.
+    """
+    path = os.path.abspath(path)
+    cache = None
+    if cache_path is not None:
+        try:
+            with open(cache_path, encoding="utf-8") as file:
+                cache = json.load(file)
+        except (OSError, ValueError):
+            cache = None
+    if (
+        cache is not None
+        and cache.get("version") == CACHE_VERSION
+        and cache.get("path") == path
+        and cache.get("device") == device_id
+    ):
+        try:
+            if _stamp(cache["sources"]) == cache["sources"]:
+                _LOGGER.debug("Command definitions of %s from cache", path)
+                return {
+                    name: _from_json(entry)
+                    for name, entry in cache["commands"].items()
+                }
+        except OSError:
+            pass
+    sources = _sources(path)
+    commands = parse_xml(sources, device_id)
+    _LOGGER.info("Read %d command definitions from %s", len(commands), path)
+    if cache_path is not None:
+        cache = {
+            "version": CACHE_VERSION,
+            "path": path,
+            "device": device_id,
+            "sources": _stamp(sources),
+            "commands": {name: _to_json(cmd) for name, cmd in commands.items()},
+        }
+        try:
+            with open(cache_path, "w", encoding="utf-8") as file:
+                json.dump(cache, file)
+        except OSError as err:
+            _LOGGER.warning("Unable to write %s: %s", cache_path, err)
+    return commands
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="vcontrold.xml or vito.xml")
+    parser.add_argument("--device", help="device ID for device specific settings")
+    args = parser.parse_args()
+    for name, cmd in sorted(load_commands(args.path, device_id=args.device).items()):
+        print(f"{name:32} {cmd.address:04X} {cmd.length} {cmd.type:8} {cmd.unit}")
+
+
+if __name__ == "__main__":
+    main()
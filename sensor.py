@@ -1,11 +1,16 @@
 """Viessmann VControld sensor device."""
+import collections
 import sys
 import time
 import logging
 import voluptuous as vol
 
 import homeassistant.helpers.config_validation as cv
-from homeassistant.components.sensor import PLATFORM_SCHEMA
+from homeassistant.components.sensor import (
+    PLATFORM_SCHEMA,
+    SensorEntity,
+    SensorStateClass,
+)
 from homeassistant.const import (
     CONF_DEVICE_CLASS,
     CONF_ICON,
@@ -19,19 +24,50 @@ from homeassistant.const import (
     POWER_WATT,
     TEMP_CELSIUS,
     TIME_HOURS,
+    EntityCategory,
+    UnitOfTime,
 )
-from homeassistant.helpers.entity import Entity
-from homeassistant.util import Throttle
+from homeassistant.core import callback
 
 from . import (
+    CONF_COMMAND,
     DOMAIN as VC_DOMAIN,
-    VC_API,
-    VC_NAME
+    TIER_FAST,
+    TIER_NORMAL,
+    TIER_SLOW,
+    VC_AGGREGATE_WINDOW,
+    VC_CIRCUITS,
+    VC_COMMANDS,
+    VC_COORDINATOR,
+    VC_NAME,
+    circuit_types,
+)
+from .pyvcontrold import (
+    PHASE_CONNECT,
+    PHASE_QUEUE,
+    PHASE_REPLY,
+    STAT_ERRORS,
+    STAT_RECONNECTS,
+    STAT_RETRIES,
+    STAT_TIMEOUTS,
+    TYPE_COUNT,
+    TYPE_HOURS,
+    TYPE_PERCENT,
+    TYPE_SETPOINT,
+    TYPE_TEMP,
 )
 
 _LOGGER = logging.getLogger(__name__)
 
 CONF_GETTER = "getter"
+CONF_TIER = "tier"
+CONF_HISTOGRAM = "histogram"
+CONF_DEADBAND = "deadband"
+CONF_MIN_INTERVAL = "min_interval"
+CONF_STATE_CLASS = "state_class"
+ATTR_MIN = "min"
+ATTR_MEAN = "mean"
+ATTR_MAX = "max"
 SENSOR_OUTSIDE_TEMPERATURE = "outside_temperature"
 SENSOR_SUPPLY_TEMPERATURE = "supply_temperature"
 SENSOR_BOILER_TARGET = "boiler_target"
@@ -65,115 +101,298 @@ VC_GET_COMFORT_TEMP = "getTempPartyM1"                  # "getPartyTtargetA1M1"
 VC_GET_ECO_MODE = "getBetriebSparM1"                    # "getSavingsModeA1M1"
 VC_GET_RED_TEMP = "getTempRaumRedSollM1"
 
+DIAGNOSTIC_REPLY_TIME = "reply_time"
+DIAGNOSTIC_QUEUE_TIME = "queue_time"
+DIAGNOSTIC_CONNECT_TIME = "connect_time"
+DIAGNOSTIC_RETRIES = "retries"
+DIAGNOSTIC_TIMEOUTS = "timeouts"
+DIAGNOSTIC_ERRORS = "errors"
+DIAGNOSTIC_RECONNECTS = "reconnects"
+DIAGNOSTIC_QUEUE_LENGTH = "queue_length"
+DIAGNOSTIC_UTILIZATION = "utilization"
+
+# A numeric state is only written once it moved by at least its deadband,
+# None writes any change, and never sooner than min_interval seconds after
+# the previous write. Measurement sensors carry the min, mean and max of the
+# samples polled over the aggregation window as attributes.
 SENSOR_TYPES = {
     SENSOR_OUTSIDE_TEMPERATURE: {
         CONF_NAME: "Outside Temperature",
         CONF_ICON: None,
         CONF_UNIT_OF_MEASUREMENT: TEMP_CELSIUS,
-        CONF_GETTER: lambda api: api.readfloat(VC_GET_OUTSIDE_TEMP),
+        CONF_COMMAND: VC_GET_OUTSIDE_TEMP,
+        CONF_TIER: TIER_NORMAL,
+        CONF_GETTER: lambda api, key: api.readfloat(key),
         CONF_DEVICE_CLASS: DEVICE_CLASS_TEMPERATURE,
+        CONF_STATE_CLASS: SensorStateClass.MEASUREMENT,
+        CONF_DEADBAND: 0.1,
+        CONF_MIN_INTERVAL: 0,
     },
     SENSOR_SUPPLY_TEMPERATURE: {
         CONF_NAME: "Water Temp current",
         CONF_ICON: None,
         CONF_UNIT_OF_MEASUREMENT: TEMP_CELSIUS,
-        CONF_GETTER: lambda api: api.readfloat(VC_GET_SUPPLY_TEMP),
+        CONF_COMMAND: VC_GET_SUPPLY_TEMP,
+        CONF_TIER: TIER_NORMAL,
+        CONF_GETTER: lambda api, key: api.readfloat(key),
         CONF_DEVICE_CLASS: DEVICE_CLASS_TEMPERATURE,
+        CONF_STATE_CLASS: SensorStateClass.MEASUREMENT,
+        CONF_DEADBAND: 0.1,
+        CONF_MIN_INTERVAL: 30,
     },
     SENSOR_BOILER_TARGET: {
         CONF_NAME: "Boiler Temp target",
         CONF_ICON: None,
         CONF_UNIT_OF_MEASUREMENT: TEMP_CELSIUS,
-        CONF_GETTER: lambda api: api.readfloat(VC_GET_BOILER_TARGET),
+        CONF_COMMAND: VC_GET_BOILER_TARGET,
+        CONF_TIER: TIER_NORMAL,
+        CONF_GETTER: lambda api, key: api.readfloat(key),
         CONF_DEVICE_CLASS: DEVICE_CLASS_TEMPERATURE,
+        CONF_STATE_CLASS: SensorStateClass.MEASUREMENT,
+        CONF_DEADBAND: 0.1,
+        CONF_MIN_INTERVAL: 0,
     },
     SENSOR_BOILER_TEMPERATURE: {
         CONF_NAME: "Boiler Temperature",
         CONF_ICON: None,
         CONF_UNIT_OF_MEASUREMENT: TEMP_CELSIUS,
-        CONF_GETTER: lambda api: api.readfloat(VC_GET_BOILER_TEMP),
+        CONF_COMMAND: VC_GET_BOILER_TEMP,
+        CONF_TIER: TIER_NORMAL,
+        CONF_GETTER: lambda api, key: api.readfloat(key),
         CONF_DEVICE_CLASS: DEVICE_CLASS_TEMPERATURE,
+        CONF_STATE_CLASS: SensorStateClass.MEASUREMENT,
+        CONF_DEADBAND: 0.1,
+        CONF_MIN_INTERVAL: 30,
     },
     SENSOR_BURNER_MODULATION: {
         CONF_NAME: "Burner modulation",
         CONF_ICON: "mdi:percent",
         CONF_UNIT_OF_MEASUREMENT: PERCENTAGE,
-        CONF_GETTER: lambda api: api.readfloat(VC_GET_BURNER_MODULATION),
+        CONF_COMMAND: VC_GET_BURNER_MODULATION,
+        CONF_TIER: TIER_FAST,
+        CONF_GETTER: lambda api, key: api.readfloat(key),
         CONF_DEVICE_CLASS: None,
+        CONF_STATE_CLASS: SensorStateClass.MEASUREMENT,
+        CONF_DEADBAND: 1,
+        CONF_MIN_INTERVAL: 30,
     },
     SENSOR_BURNER_STARTS: {
         CONF_NAME: "Burner Starts",
         CONF_ICON: "mdi:counter",
         CONF_UNIT_OF_MEASUREMENT: None,
-        CONF_GETTER: lambda api: int(api.readfloat(VC_GET_BURNER_STARTS)),
+        CONF_COMMAND: VC_GET_BURNER_STARTS,
+        CONF_TIER: TIER_SLOW,
+        CONF_GETTER: lambda api, key: int(api.readfloat(key)),
         CONF_DEVICE_CLASS: None,
+        CONF_STATE_CLASS: SensorStateClass.TOTAL_INCREASING,
+        CONF_DEADBAND: 0,
+        CONF_MIN_INTERVAL: 0,
     },
     SENSOR_BURNER_HOURS: {
         CONF_NAME: "Burner Hours",
         CONF_ICON: "mdi:counter",
         CONF_UNIT_OF_MEASUREMENT: TIME_HOURS,
-        CONF_GETTER: lambda api: int(api.readfloat(VC_GET_BURNER_HOURS)),
+        CONF_COMMAND: VC_GET_BURNER_HOURS,
+        CONF_TIER: TIER_SLOW,
+        CONF_GETTER: lambda api, key: int(api.readfloat(key)),
         CONF_DEVICE_CLASS: None,
+        CONF_STATE_CLASS: SensorStateClass.TOTAL_INCREASING,
+        CONF_DEADBAND: 0,
+        CONF_MIN_INTERVAL: 0,
     },
     SENSOR_PUMP_STATUS: {
         CONF_NAME: "Pump status",
         CONF_ICON: None,
         CONF_UNIT_OF_MEASUREMENT: None,
-        CONF_GETTER: lambda api: api.read(VC_GET_PUMP_STATUS),
+        CONF_COMMAND: VC_GET_PUMP_STATUS,
+        CONF_TIER: TIER_FAST,
+        CONF_GETTER: lambda api, key: api.read(key),
         CONF_DEVICE_CLASS: None,
+        CONF_STATE_CLASS: None,
+        CONF_DEADBAND: None,
+        CONF_MIN_INTERVAL: 0,
     },
     SENSOR_HEAT_MODE: {
         CONF_NAME: "Heat mode",
         CONF_ICON: None,
         CONF_UNIT_OF_MEASUREMENT: None,
-        CONF_GETTER: lambda api: api.read(VC_GET_HEAT_MODE),
+        CONF_COMMAND: VC_GET_HEAT_MODE,
+        CONF_TIER: TIER_NORMAL,
+        CONF_GETTER: lambda api, key: api.read(key),
         CONF_DEVICE_CLASS: None,
+        CONF_STATE_CLASS: None,
+        CONF_DEADBAND: None,
+        CONF_MIN_INTERVAL: 0,
     },
     SENSOR_ROOM_TEMPERATURE: {
         CONF_NAME: "Room Temp",
         CONF_ICON: None,
         CONF_UNIT_OF_MEASUREMENT: TEMP_CELSIUS,
-        CONF_GETTER: lambda api: api.readfloat(VC_GET_ROOM_TEMPERATURE),
+        CONF_COMMAND: VC_GET_ROOM_TEMPERATURE,
+        CONF_TIER: TIER_NORMAL,
+        CONF_GETTER: lambda api, key: api.readfloat(key),
         CONF_DEVICE_CLASS: DEVICE_CLASS_TEMPERATURE,
+        CONF_STATE_CLASS: SensorStateClass.MEASUREMENT,
+        CONF_DEADBAND: 0.1,
+        CONF_MIN_INTERVAL: 0,
     },
     SENSOR_ROOM_TARGET: {
         CONF_NAME: "Room Temp target",
         CONF_ICON: None,
         CONF_UNIT_OF_MEASUREMENT: TEMP_CELSIUS,
-        CONF_GETTER: lambda api: api.readfloat(VC_GET_ROOM_TARGET),
+        CONF_COMMAND: VC_GET_ROOM_TARGET,
+        CONF_TIER: TIER_NORMAL,
+        CONF_GETTER: lambda api, key: api.readfloat(key),
         CONF_DEVICE_CLASS: DEVICE_CLASS_TEMPERATURE,
+        CONF_STATE_CLASS: SensorStateClass.MEASUREMENT,
+        CONF_DEADBAND: 0.1,
+        CONF_MIN_INTERVAL: 0,
     },
     SENSOR_COMFORT_MODE: {
         CONF_NAME: "Comfort Mode",
         CONF_ICON: None,
         CONF_UNIT_OF_MEASUREMENT: None,
-        CONF_GETTER: lambda api: api.read(VC_GET_COMFORT_MODE),
+        CONF_COMMAND: VC_GET_COMFORT_MODE,
+        CONF_TIER: TIER_NORMAL,
+        CONF_GETTER: lambda api, key: api.read(key),
         CONF_DEVICE_CLASS: None,
+        CONF_STATE_CLASS: None,
+        CONF_DEADBAND: None,
+        CONF_MIN_INTERVAL: 0,
     },
     SENSOR_COMFORT_TEMP: {
         CONF_NAME: "Comfort Temp target",
         CONF_ICON: None,
         CONF_UNIT_OF_MEASUREMENT: TEMP_CELSIUS,
-        CONF_GETTER: lambda api: api.readfloat(VC_GET_COMFORT_TEMP),
+        CONF_COMMAND: VC_GET_COMFORT_TEMP,
+        CONF_TIER: TIER_NORMAL,
+        CONF_GETTER: lambda api, key: api.readfloat(key),
         CONF_DEVICE_CLASS: DEVICE_CLASS_TEMPERATURE,
+        CONF_STATE_CLASS: SensorStateClass.MEASUREMENT,
+        CONF_DEADBAND: 0.1,
+        CONF_MIN_INTERVAL: 0,
     },
     SENSOR_ECO_MODE: {
         CONF_NAME: "Eco Mode",
         CONF_ICON: None,
         CONF_UNIT_OF_MEASUREMENT: None,
-        CONF_GETTER: lambda api: api.read(VC_GET_ECO_MODE),
+        CONF_COMMAND: VC_GET_ECO_MODE,
+        CONF_TIER: TIER_NORMAL,
+        CONF_GETTER: lambda api, key: api.read(key),
         CONF_DEVICE_CLASS: None,
+        CONF_STATE_CLASS: None,
+        CONF_DEADBAND: None,
+        CONF_MIN_INTERVAL: 0,
     },
     SENSOR_RED_TEMP: {
         CONF_NAME: "Reduced Temp target",
         CONF_ICON: None,
         CONF_UNIT_OF_MEASUREMENT: TEMP_CELSIUS,
-        CONF_GETTER: lambda api: api.readfloat(VC_GET_RED_TEMP),
+        CONF_COMMAND: VC_GET_RED_TEMP,
+        CONF_TIER: TIER_NORMAL,
+        CONF_GETTER: lambda api, key: api.readfloat(key),
         CONF_DEVICE_CLASS: DEVICE_CLASS_TEMPERATURE,
+        CONF_STATE_CLASS: SensorStateClass.MEASUREMENT,
+        CONF_DEADBAND: 0.1,
+        CONF_MIN_INTERVAL: 0,
+    },
+}
+
+# Units of vcontrold.xml known to Home Assistant, others are shown as they are
+XML_UNITS = {
+    "Grad Celsius": TEMP_CELSIUS,
+    "%": PERCENTAGE,
+    "Stunden": TIME_HOURS,
+}
+
+
+def command_sensor_type(key, cmd):
+  """Return a SENSOR_TYPES entry for a command defined in vcontrold.xml."""
+  unit = XML_UNITS.get(cmd.unit, cmd.unit or None)
+  sensor = {
+      CONF_NAME: key[3:] if key.startswith("get") else key,
+      CONF_ICON: None,
+      CONF_UNIT_OF_MEASUREMENT: unit,
+      CONF_COMMAND: key,
+      CONF_TIER: TIER_NORMAL,
+      CONF_GETTER: lambda api, key: api.read(key),
+      CONF_DEVICE_CLASS: DEVICE_CLASS_TEMPERATURE if unit == TEMP_CELSIUS else None,
+      CONF_STATE_CLASS: None,
+      CONF_DEADBAND: None,
+      CONF_MIN_INTERVAL: 0,
+  }
+  if cmd.type in (TYPE_TEMP, TYPE_SETPOINT, TYPE_PERCENT):
+    sensor[CONF_GETTER] = lambda api, key: api.readfloat(key)
+    sensor[CONF_STATE_CLASS] = SensorStateClass.MEASUREMENT
+    sensor[CONF_DEADBAND] = 1 if cmd.type == TYPE_PERCENT else 0.1
+  elif cmd.type in (TYPE_COUNT, TYPE_HOURS):
+    sensor[CONF_ICON] = "mdi:counter"
+    sensor[CONF_GETTER] = lambda api, key: int(api.readfloat(key))
+    sensor[CONF_STATE_CLASS] = SensorStateClass.TOTAL_INCREASING
+    sensor[CONF_DEADBAND] = 0
+  return sensor
+
+
+# Statistics of the vcontrold connection, the state of latency sensors is the
+# mean in milliseconds and their histogram goes to the attributes
+DIAGNOSTIC_TYPES = {
+    DIAGNOSTIC_REPLY_TIME: {
+        CONF_NAME: "Bus Reply Time",
+        CONF_ICON: "mdi:timer-outline",
+        CONF_UNIT_OF_MEASUREMENT: UnitOfTime.MILLISECONDS,
+        CONF_HISTOGRAM: lambda api: api.stats.phases[PHASE_REPLY],
+    },
+    DIAGNOSTIC_QUEUE_TIME: {
+        CONF_NAME: "Bus Queue Time",
+        CONF_ICON: "mdi:timer-sand",
+        CONF_UNIT_OF_MEASUREMENT: UnitOfTime.MILLISECONDS,
+        CONF_HISTOGRAM: lambda api: api.stats.phases[PHASE_QUEUE],
+    },
+    DIAGNOSTIC_CONNECT_TIME: {
+        CONF_NAME: "Bus Connect Time",
+        CONF_ICON: "mdi:lan-connect",
+        CONF_UNIT_OF_MEASUREMENT: UnitOfTime.MILLISECONDS,
+        CONF_HISTOGRAM: lambda api: api.stats.phases[PHASE_CONNECT],
+    },
+    DIAGNOSTIC_RETRIES: {
+        CONF_NAME: "Bus Retries",
+        CONF_ICON: "mdi:repeat",
+        CONF_UNIT_OF_MEASUREMENT: None,
+        CONF_GETTER: lambda api: api.stats.counters[STAT_RETRIES],
+    },
+    DIAGNOSTIC_TIMEOUTS: {
+        CONF_NAME: "Bus Timeouts",
+        CONF_ICON: "mdi:timer-alert-outline",
+        CONF_UNIT_OF_MEASUREMENT: None,
+        CONF_GETTER: lambda api: api.stats.counters[STAT_TIMEOUTS],
+    },
+    DIAGNOSTIC_ERRORS: {
+        CONF_NAME: "Bus Errors",
+        CONF_ICON: "mdi:alert-circle-outline",
+        CONF_UNIT_OF_MEASUREMENT: None,
+        CONF_GETTER: lambda api: api.stats.counters[STAT_ERRORS],
+    },
+    DIAGNOSTIC_RECONNECTS: {
+        CONF_NAME: "Bus Reconnects",
+        CONF_ICON: "mdi:lan-pending",
+        CONF_UNIT_OF_MEASUREMENT: None,
+        CONF_GETTER: lambda api: api.stats.counters[STAT_RECONNECTS],
+    },
+    DIAGNOSTIC_QUEUE_LENGTH: {
+        CONF_NAME: "Bus Queue Length",
+        CONF_ICON: "mdi:tray-full",
+        CONF_UNIT_OF_MEASUREMENT: None,
+        CONF_GETTER: lambda api: api.queue_stats["depth"],
+    },
+    DIAGNOSTIC_UTILIZATION: {
+        CONF_NAME: "Bus Utilization",
+        CONF_ICON: "mdi:gauge",
+        CONF_UNIT_OF_MEASUREMENT: PERCENTAGE,
+        CONF_GETTER: lambda api: round(api.queue_stats["utilization"] * 100, 1),
     },
 }
 
-def setup_platform(hass, config, add_entities, discovery_info=None):
+async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
   """Setup sensors"""
   if discovery_info is None:
     return
@@ -181,34 +400,90 @@ def setup_platform(hass, config, add_entities, discovery_info=None):
   _LOGGER.info("Setup VC sensor platform")
 
   entities = []
-  vc_api = hass.data[VC_DOMAIN][VC_API]
+  data = hass.data[VC_DOMAIN][discovery_info[VC_NAME]]
+  coordinator = data[VC_COORDINATOR]
+
+  sensor_types = circuit_types(SENSOR_TYPES, data[VC_CIRCUITS])
+  builtin = {sensor[CONF_COMMAND] for sensor in sensor_types.values()}
+  for key, cmd in data[VC_COMMANDS].items():
+    if key not in builtin:
+      sensor_types[key] = command_sensor_type(key, cmd)
+
+  commands = {}
+  window = data[VC_AGGREGATE_WINDOW]
+  for sensor_type, sensor in sensor_types.items():
+    commands[sensor[CONF_COMMAND]] = sensor[CONF_TIER]
+    entities.append(
+        VCSensor(
+            data[VC_NAME],coordinator,sensor_type,sensor,window
+        )
+    )
+
+  for diagnostic_type in DIAGNOSTIC_TYPES:
+    entities.append(
+        VCDiagnosticSensor(data[VC_NAME],coordinator,diagnostic_type)
+    )
 
-  for sensor_type in SENSOR_TYPES:
-    entities.append(VCSensor(hass.data[VC_DOMAIN][VC_NAME],vc_api,sensor_type))
+  coordinator.register(commands, "sensor")
+  async_add_entities(entities)
 
-  add_entities(entities, True)
 
+class RollingAggregate:
+  """Min, mean and max of the samples of the last window seconds."""
 
-class VCSensor(Entity):
+  def __init__(self, window):
+    """Init function"""
+    self._window = window
+    self._samples = collections.deque()
+
+  def add(self, value):
+    now = time.monotonic()
+    self._samples.append((now, value))
+    while self._samples[0][0] < now - self._window:
+      self._samples.popleft()
+
+  def as_dict(self):
+    if not self._samples:
+      return {}
+    values = [value for _, value in self._samples]
+    return {
+        ATTR_MIN: min(values),
+        ATTR_MEAN: round(sum(values) / len(values), 2),
+        ATTR_MAX: max(values),
+    }
+
+
+class VCSensor(SensorEntity):
   """Implementation of the Vcontrold sensor."""
 
-  def __init__(self, name, api, sensor_type):
+  def __init__(self, name, coordinator, sensor_type, sensor, window):
     """Initialize the sensor."""
-    self._sensor = SENSOR_TYPES[sensor_type]
+    self._sensor = sensor
     self._name = f"{name} {self._sensor[CONF_NAME]}"
-    self._api = api
+    self._coordinator = coordinator
+    self._api = coordinator.api
     self._sensor_type = sensor_type
     self._state = None
+    self._reported = None
+    self._reported_available = None
+    self._aggregate = None
+    if self._sensor[CONF_STATE_CLASS] == SensorStateClass.MEASUREMENT:
+      self._aggregate = RollingAggregate(window)
+
+  @property
+  def should_poll(self):
+      """Values are pushed by the coordinator."""
+      return False
 
   @property
   def available(self):
       """Return True if entity is available."""
-      return self._state is not None
+      return self._coordinator.available and self._state is not None
 
   @property
   def unique_id(self):
       """Return a unique ID."""
-      return f"{self._api.id}-{self._sensor_type}"
+      return f"{self._coordinator.unique_id}-{self._sensor_type}"
 
   @property
   def name(self):
@@ -221,12 +496,12 @@ class VCSensor(Entity):
       return self._sensor[CONF_ICON]
 
   @property
-  def state(self):
+  def native_value(self):
       """Return the state of the sensor."""
       return self._state
 
   @property
-  def unit_of_measurement(self):
+  def native_unit_of_measurement(self):
       """Return the unit of measurement."""
       return self._sensor[CONF_UNIT_OF_MEASUREMENT]
 
@@ -235,11 +510,125 @@ class VCSensor(Entity):
       """Return the class of this device, from component DEVICE_CLASSES."""
       return self._sensor[CONF_DEVICE_CLASS]
 
-  def update(self):
+  @property
+  def state_class(self):
+      """Return measurement or total_increasing for long-term statistics."""
+      return self._sensor[CONF_STATE_CLASS]
+
+  @property
+  def extra_state_attributes(self):
+      """Return the min, mean and max over the aggregation window.
+
+      They go out with each state write, so the recorder keeps a summary
+      of the polled values the deadband held back.
+      """
+      if self._aggregate is None:
+          return None
+      return self._aggregate.as_dict()
+
+  async def async_added_to_hass(self):
+      """Subscribe to coordinator updates."""
+      self.async_on_remove(
+          self._coordinator.async_add_listener(
+              self._handle_coordinator_update, [self._sensor[CONF_COMMAND]]
+          )
+      )
+
+  @callback
+  def _handle_coordinator_update(self):
+      # only polls bring values, other updates change the availability
+      changed = self._coordinator.polled and self._update_state()
+      if changed or self.available != self._reported_available:
+          self._reported_available = self.available
+          self.async_write_ha_state()
+
+  def _update_state(self):
+      """Take the polled value as state if it is worth a write."""
+      if self._coordinator.writing(self._sensor[CONF_COMMAND]):
+          # the device has yet to take the value, and may refuse it
+          return False
+      try:
+        value = self._sensor[CONF_GETTER](
+            self._coordinator, self._sensor[CONF_COMMAND]
+        )
+      except ValueError:
+          _LOGGER.error("Unable to decode sensor data")
+          return False
+      if self._aggregate is not None:
+          self._aggregate.add(value)
+      if not self._changed(value):
+          return False
+      self._state = value
+      self._reported = time.monotonic()
+      return True
+
+  def _changed(self, value):
+      if self._state is None:
+          return True
+      if value == self._state:
+          return False
+      if time.monotonic() - self._reported < self._sensor[CONF_MIN_INTERVAL]:
+          return False
+      deadband = self._sensor[CONF_DEADBAND]
+      if deadband is None or isinstance(value, str):
+          return True
+      # values come rounded to 2 decimals
+      return round(abs(value - self._state), 2) >= deadband
+
+  async def async_update(self):
       """Update state of sensor."""
       try:
-        self._state = self._sensor[CONF_GETTER](self._api)
+        await self._coordinator.async_request([self._sensor[CONF_COMMAND]])
       except ConnectionError:
           _LOGGER.error("Unable to retrieve sensor data")
-      except ValueError:
-          _LOGGER.error("Unable to decode sensor data")
+      self._update_state()
+
+
+class VCDiagnosticSensor(SensorEntity):
+  """Statistics of the connection to vcontrold."""
+
+  _attr_entity_category = EntityCategory.DIAGNOSTIC
+  _attr_should_poll = False
+
+  def __init__(self, name, coordinator, diagnostic_type):
+    """Initialize the sensor."""
+    self._diagnostic = DIAGNOSTIC_TYPES[diagnostic_type]
+    self._coordinator = coordinator
+    self._api = coordinator.api
+    self._diagnostic_type = diagnostic_type
+    self._attr_name = f"{name} {self._diagnostic[CONF_NAME]}"
+    self._attr_unique_id = f"{coordinator.unique_id}-{diagnostic_type}"
+    self._attr_icon = self._diagnostic[CONF_ICON]
+    self._attr_native_unit_of_measurement = self._diagnostic[
+        CONF_UNIT_OF_MEASUREMENT
+    ]
+    self._attr_extra_state_attributes = {}
+
+  async def async_added_to_hass(self):
+      """Subscribe to every coordinator update."""
+      self._update_state()
+      self.async_on_remove(
+          self._coordinator.async_add_listener(self._handle_coordinator_update)
+      )
+
+  @callback
+  def _handle_coordinator_update(self):
+      reported = self._attr_native_value
+      self._update_state()
+      if self._attr_native_value != reported:
+          self.async_write_ha_state()
+
+  def _update_state(self):
+      if CONF_HISTOGRAM not in self._diagnostic:
+          self._attr_native_value = self._diagnostic[CONF_GETTER](self._api)
+          return
+      stats = self._api.stats
+      histogram = self._diagnostic[CONF_HISTOGRAM](self._api)
+      self._attr_native_value = round(histogram.mean * 1000, 1)
+      attributes = histogram.as_dict()
+      if self._diagnostic_type == DIAGNOSTIC_REPLY_TIME:
+          attributes["slowest"] = {
+              key: round(stats.commands[key].mean * 1000, 1)
+              for key in stats.slowest()
+          }
+      self._attr_extra_state_attributes = attributes
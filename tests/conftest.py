@@ -0,0 +1,57 @@
+"""Shared setup of the pyvcontrold tests.
+
+pyvcontrold has no Home Assistant imports and is imported from the
+repository root. Coroutine tests run on a fresh event loop each, so no
+pytest plugin is needed.
+"""
+
+import asyncio
+import importlib
+import importlib.util
+import inspect
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from pyvcontrold.simulator import Simulator  # noqa: E402
+
+# Seconds per simulated command, small enough to keep the suite quick
+LATENCY = 0.002
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem):
+    """Run coroutine test functions with asyncio.run."""
+    if not inspect.iscoroutinefunction(pyfuncitem.obj):
+        return None
+    funcargs = pyfuncitem.funcargs
+    args = {name: funcargs[name] for name in pyfuncitem._fixtureinfo.argnames}
+    asyncio.run(pyfuncitem.obj(**args))
+    return True
+
+
+async def start_simulator(**kwargs):
+    """Return a started Simulator and its port."""
+    kwargs.setdefault("latency", LATENCY)
+    sim = Simulator(**kwargs)
+    return sim, await sim.start()
+
+
+def load_integration(module):
+    """Import a module of the repository as the vcontrold custom component.
+
+    Needs Home Assistant, callers skip without it.
+    """
+    if "vcontrold" not in sys.modules:
+        spec = importlib.util.spec_from_file_location(
+            "vcontrold", os.path.join(ROOT, "__init__.py"),
+            submodule_search_locations=[ROOT],
+        )
+        package = importlib.util.module_from_spec(spec)
+        sys.modules["vcontrold"] = package
+        spec.loader.exec_module(package)
+    return importlib.import_module(f"vcontrold{module}")
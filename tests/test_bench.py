@@ -0,0 +1,53 @@
+"""Figures of the benchmark that hold on any machine."""
+
+import asyncio
+import time
+
+from conftest import start_simulator
+from pyvcontrold.device import Device
+from pyvcontrold.simulator import COMMANDS
+
+LATENCY = 0.005
+
+
+async def test_devices_polled_at_once_do_not_wait_for_each_other():
+    """When the first device finished a refresh, the others are nearly done."""
+    keys = list(COMMANDS)
+    sims = []
+    devs = []
+    for _ in range(4):
+        sim, port = await start_simulator(latency=LATENCY)
+        sims.append(sim)
+        devs.append(Device("127.0.0.1", port))
+    answered = []
+
+    async def refresh(dev):
+        await dev.read_many(keys)
+        if not answered:
+            answered.extend(len(sim.log) for sim in sims)
+
+    try:
+        await asyncio.gather(*(refresh(dev) for dev in devs))
+    finally:
+        for dev in devs:
+            await dev.close()
+        for sim in sims:
+            await sim.stop()
+    # polled one after the other, the rest would not have started
+    assert min(answered) > len(keys) // 2
+    assert all(len(sim.log) == len(keys) for sim in sims)
+
+
+async def test_pipelined_read_beats_drain_wait():
+    """A read no longer waits READ_TIMEOUT for a leftover prompt."""
+    sim, port = await start_simulator(latency=LATENCY)
+    dev = Device("127.0.0.1", port)
+    try:
+        await dev.read("getTempA")
+        start = time.perf_counter()
+        for _ in range(10):
+            await dev.read("getTempA")
+        assert (time.perf_counter() - start) / 10 < 0.1
+    finally:
+        await dev.close()
+        await sim.stop()
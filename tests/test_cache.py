@@ -0,0 +1,57 @@
+"""Tests of the freshness-classed reply cache."""
+
+from pyvcontrold import cache as cache_module
+from pyvcontrold.cache import FRESHNESS_SLOW, FRESHNESS_STATIC, CommandCache
+
+
+def test_live_commands_are_not_cached():
+    cache = CommandCache()
+    cache.put("getTempA", "12.3 Grad Celsius")
+    assert cache.get("getTempA") is None
+    assert cache.stats == {"hits": 0, "misses": 1, "entries": 0}
+
+
+def test_entries_expire_after_their_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache = CommandCache(
+        {FRESHNESS_SLOW: 600},
+        {"getBrennerStarts": FRESHNESS_SLOW, "getTempWWsoll": 30},
+    )
+    cache.put("getBrennerStarts", "12345")
+    cache.put("getTempWWsoll", "50.0 Grad Celsius")
+    now[0] += 29
+    assert cache.get("getBrennerStarts") == "12345"
+    assert cache.get("getTempWWsoll") == "50.0 Grad Celsius"
+    now[0] += 2
+    assert cache.get("getTempWWsoll") is None
+    now[0] += 570
+    assert cache.get("getBrennerStarts") is None
+
+
+def test_failed_replies_and_invalidation():
+    cache = CommandCache(classes={"getInventory": FRESHNESS_STATIC, "getX": 60})
+    cache.put("getInventory", "")
+    assert cache.get("getInventory") is None
+    cache.put("getInventory", "20CB")
+    cache.put("getX", "1")
+    cache.invalidate("getX")
+    assert cache.get("getX") is None
+    assert cache.get("getInventory") == "20CB"
+    cache.invalidate()
+    assert cache.get("getInventory") is None
+
+
+def test_read_at_tells_live_replies_from_hits():
+    cache = CommandCache(classes={"getBrennerStarts": FRESHNESS_SLOW})
+    assert cache.read_at("getTempA") is None
+    cache.put("getTempA", "12.3 Grad Celsius")
+    cache.put("getBrennerStarts", "12345")
+    stored = cache.read_at("getBrennerStarts")
+    assert cache.read_at("getTempA") is not None
+    assert cache.get("getBrennerStarts") == "12345"
+    assert cache.read_at("getBrennerStarts") == stored
+    cache.put("getTempWWist", "")
+    assert cache.read_at("getTempWWist") is None
+    cache.invalidate("getBrennerStarts")
+    assert cache.read_at("getBrennerStarts") is None
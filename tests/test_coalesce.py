@@ -0,0 +1,102 @@
+"""Tests of the debounced set commands."""
+
+import asyncio
+
+from pyvcontrold.coalesce import WriteCoalescer, same_value
+
+WINDOW = 0.01
+
+
+class Writer:
+    """Records writes and answers them with ok."""
+
+    def __init__(self, ok=True):
+        self.ok = ok
+        self.writes = []
+        self.done = []
+
+    async def write(self, key, val):
+        self.writes.append((key, val))
+        return self.ok
+
+    def on_done(self, key, val, ok):
+        self.done.append((key, val, ok))
+
+
+def test_same_value():
+    assert same_value("21", "21.0")
+    assert same_value("H+WW", "H+WW")
+    assert not same_value("H+WW", "WW")
+    assert not same_value(None, "21")
+
+
+async def test_only_last_value_is_written():
+    writer = Writer()
+    coalescer = WriteCoalescer(writer.write, writer.on_done, WINDOW)
+    for val in ("20", "21", "22"):
+        coalescer.schedule("setTempRaumNorSollM1", val)
+    assert coalescer.pending("setTempRaumNorSollM1") == "22"
+    await asyncio.sleep(WINDOW * 5)
+    assert writer.writes == [("setTempRaumNorSollM1", "22")]
+    assert writer.done == [("setTempRaumNorSollM1", "22", True)]
+    assert coalescer.pending("setTempRaumNorSollM1") is None
+    assert coalescer.stats == {
+        "written": 1, "coalesced": 2, "skipped": 0, "pending": 0,
+    }
+
+
+async def test_confirmed_write_is_not_repeated():
+    writer = Writer()
+    coalescer = WriteCoalescer(writer.write, writer.on_done, WINDOW)
+    coalescer.schedule("setTempWWsoll", "50")
+    await asyncio.sleep(WINDOW * 5)
+    coalescer.schedule("setTempWWsoll", "50.0")
+    await asyncio.sleep(WINDOW * 5)
+    assert writer.writes == [("setTempWWsoll", "50")]
+    assert coalescer.skipped == 1
+
+
+async def test_failed_write_is_reported():
+    writer = Writer(ok=False)
+    coalescer = WriteCoalescer(writer.write, writer.on_done, WINDOW)
+    coalescer.schedule("setBetriebArtM1", "WW")
+    await asyncio.sleep(WINDOW * 5)
+    coalescer.schedule("setBetriebArtM1", "WW")
+    await asyncio.sleep(WINDOW * 5)
+    assert len(writer.writes) == 2
+    assert writer.done[-1] == ("setBetriebArtM1", "WW", False)
+
+
+async def test_stop_flushes_pending_writes():
+    writer = Writer()
+    coalescer = WriteCoalescer(writer.write, writer.on_done, 60)
+    coalescer.schedule("setTempWWsoll", "45")
+    await coalescer.async_stop()
+    assert writer.writes == [("setTempWWsoll", "45")]
+
+
+async def test_confirmation_expires_after_max_age():
+    writer = Writer()
+    coalescer = WriteCoalescer(writer.write, writer.on_done, WINDOW)
+    coalescer.observe("setTempWWsoll", "50")
+    coalescer.schedule("setTempWWsoll", "50", max_age=60)
+    assert coalescer.skipped == 1
+    await asyncio.sleep(WINDOW)
+    coalescer.schedule("setTempWWsoll", "50", max_age=WINDOW / 2)
+    await asyncio.sleep(WINDOW * 5)
+    assert writer.writes == [("setTempWWsoll", "50")]
+
+
+async def test_failed_write_forgets_the_confirmed_value():
+    writer = Writer()
+    coalescer = WriteCoalescer(writer.write, writer.on_done, WINDOW)
+    coalescer.observe("setTempWWsoll", "50")
+    coalescer.schedule("setTempWWsoll", "45")
+    await asyncio.sleep(WINDOW * 5)
+    writer.ok = False
+    coalescer.schedule("setTempWWsoll", "40")
+    await asyncio.sleep(WINDOW * 5)
+    writer.ok = True
+    coalescer.schedule("setTempWWsoll", "45")
+    await asyncio.sleep(WINDOW * 5)
+    assert [val for _, val in writer.writes] == ["45", "40", "45"]
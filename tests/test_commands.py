@@ -0,0 +1,101 @@
+"""Tests of the address map, the block planner and the P300 value codec."""
+
+import pytest
+
+from pyvcontrold.coalesce import same_value
+from pyvcontrold.commands import (
+    DEFAULT_COMMANDS,
+    MAX_BLOCK,
+    TYPE_ENUM,
+    TYPE_HEX,
+    CommandDef,
+    circuit_command,
+    decode_block,
+    encode,
+    plan,
+)
+from pyvcontrold.simulator import CIRCUIT_COMMANDS, COMMANDS
+
+
+def test_polled_commands_plan_into_ten_reads():
+    """The 17 commands of circuit 1 need 10 transactions."""
+    blocks = plan(COMMANDS)
+    assert len(COMMANDS) == 17
+    assert len(blocks) == 10
+    assert sorted(key for block in blocks for key in block.keys) == sorted(COMMANDS)
+    circuit = next(block for block in blocks if block.address == 0x2301)
+    assert circuit.length == 8
+    assert len(circuit.keys) == 6
+    assert all(block.length <= MAX_BLOCK for block in blocks)
+
+
+def test_each_circuit_adds_its_settings_block():
+    keys = list(COMMANDS)
+    counts = []
+    for circuit in (2, 3):
+        keys += [key for key in CIRCUIT_COMMANDS if key.endswith(f"M{circuit}")]
+        counts.append(len(plan(keys)))
+    # the room temperatures join the block of circuit 1, the settings do not
+    assert counts == [11, 12]
+
+
+def test_far_apart_commands_are_not_merged():
+    commands = {
+        "a": CommandDef(0x1000, "state"),
+        "b": CommandDef(0x1011, "state"),
+        "c": CommandDef(0x1040, "state"),
+    }
+    blocks = plan(["c", "a", "b"], commands)
+    assert [(block.address, block.length, block.keys) for block in blocks] == [
+        (0x1000, 0x12, ["a", "b"]),
+        (0x1040, 1, ["c"]),
+    ]
+
+
+def test_unknown_command_raises():
+    with pytest.raises(KeyError):
+        plan(["getNothing"])
+
+
+@pytest.mark.parametrize("key", sorted(COMMANDS))
+def test_encode_decode_round_trip(key):
+    """Every simulated reply survives the bytes of the controller.
+
+    Setpoints are whole degrees, so only the number has to match.
+    """
+    cmd = DEFAULT_COMMANDS[key]
+    text, _, unit = COMMANDS[key].partition(" ")
+    block = plan([key])[0]
+    value, _, decoded_unit = decode_block(block, encode(cmd, text))[key].partition(" ")
+    assert same_value(value, text)
+    assert decoded_unit == unit
+
+
+def test_negative_temperature():
+    cmd = DEFAULT_COMMANDS["getTempA"]
+    assert encode(cmd, "-7.5") == (-75).to_bytes(2, "little", signed=True)
+    block = plan(["getTempA"])[0]
+    assert decode_block(block, encode(cmd, "-7.5"))["getTempA"] == "-7.5 Grad Celsius"
+
+
+def test_unknown_enum_raw_value_is_shown_as_number():
+    cmd = CommandDef(0x10, TYPE_ENUM, "", {0: "OFF", 1: "ON"})
+    block = plan(["x"], {"x": cmd})[0]
+    assert decode_block(block, b"\x07", {"x": cmd}) == {"x": "7"}
+
+
+def test_unknown_enum_name_raises():
+    cmd = CommandDef(0x10, TYPE_ENUM, "", {0: "OFF", 1: "ON"})
+    with pytest.raises(ValueError):
+        encode(cmd, "UNKNOWN")
+
+
+def test_length_overrides_type_size():
+    cmd = CommandDef(0x00F8, TYPE_HEX, "", None, 8)
+    assert encode(cmd, "20CB00000000ABCD") == bytes.fromhex("20CB00000000ABCD")
+    assert plan(["x"], {"x": cmd})[0].length == 8
+
+
+def test_circuit_command():
+    assert circuit_command("getBetriebArtM1", 3) == "getBetriebArtM3"
+    assert circuit_command("getTempA", 2) == "getTempA"
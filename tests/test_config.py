@@ -0,0 +1,29 @@
+"""Tests of the configuration schema of the integration."""
+
+import pytest
+
+pytest.importorskip("homeassistant")
+
+import voluptuous as vol  # noqa: E402
+
+from conftest import load_integration  # noqa: E402
+
+
+def test_timeouts_in_order():
+    integration = load_integration("")
+    assert integration.TIMEOUTS_SCHEMA({"min": 1, "max": 1}) == {"min": 1, "max": 1}
+    with pytest.raises(vol.Invalid):
+        integration.TIMEOUTS_SCHEMA({"min": 3, "max": 2})
+    # the default max is below a min of 10 s
+    with pytest.raises(vol.Invalid):
+        integration.TIMEOUTS_SCHEMA({"min": 10})
+
+
+def test_device_names_differ_once_slugified():
+    integration = load_integration("")
+    devices = [{"name": "Vitodens 200", "port": 3002}, {"name": "Keller", "port": 3003}]
+    assert len(integration.CONFIG_SCHEMA({"vcontrold": devices})["vcontrold"]) == 2
+    # both name the entities vitodens_200
+    devices[1]["name"] = "vitodens-200"
+    with pytest.raises(vol.Invalid):
+        integration.CONFIG_SCHEMA({"vcontrold": devices})
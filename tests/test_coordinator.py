@@ -0,0 +1,243 @@
+"""Tests of the coordinator of the integration against the simulator."""
+
+import asyncio
+import collections
+
+import pytest
+
+pytest.importorskip("homeassistant")
+
+from conftest import load_integration, start_simulator  # noqa: E402
+from pyvcontrold.cache import FRESHNESS_SLOW, CommandCache  # noqa: E402
+from pyvcontrold.device import (  # noqa: E402
+    CIRCUIT_OPEN,
+    FAILURE_THRESHOLD,
+    Device,
+)
+
+# Seconds, short enough for a value to age out of its interval in a test
+INTERVAL = 0.05
+WINDOW = 0.01
+
+
+async def make_coordinator(sim_port):
+    integration = load_integration("")
+    cache = CommandCache(classes={"getTempWWsoll": FRESHNESS_SLOW})
+    dev = Device("127.0.0.1", sim_port, cache)
+    coordinator = integration.Coordinator(
+        None,
+        dev,
+        {
+            integration.TIER_FAST: INTERVAL,
+            integration.TIER_NORMAL: INTERVAL,
+            integration.TIER_SLOW: INTERVAL,
+        },
+    )
+    coordinator._coalescer._window = WINDOW
+    return coordinator
+
+
+async def test_cached_value_does_not_confirm_a_write():
+    """A setpoint changed at the panel can be set back from Home Assistant."""
+    sim, port = await start_simulator()
+    coordinator = await make_coordinator(port)
+    try:
+        await coordinator._async_poll(["getTempWWsoll"])
+        assert coordinator.read("getTempWWsoll") == "50.0 Grad Celsius"
+        sim.values["getTempWWsoll"] = "45"
+        await asyncio.sleep(INTERVAL * 2)
+        # served from the cache, the old value is polled again
+        await coordinator._async_poll(["getTempWWsoll"])
+        assert coordinator.read("getTempWWsoll") == "50.0 Grad Celsius"
+        await coordinator.async_write("setTempWWsoll", "50")
+        await asyncio.sleep(WINDOW * 10)
+        assert "setTempWWsoll 50" in sim.log
+        assert sim.values["getTempWWsoll"] == "50"
+    finally:
+        await coordinator._coalescer.async_stop()
+        await coordinator.api.close()
+        await sim.stop()
+
+
+async def test_live_value_skips_the_same_write():
+    sim, port = await start_simulator()
+    coordinator = await make_coordinator(port)
+    try:
+        await coordinator._async_poll(["getTempA"])
+        await coordinator.async_write("setTempA", "12.3")
+        await asyncio.sleep(WINDOW * 10)
+        assert not [cmd for cmd in sim.log if cmd.startswith("set")]
+        assert coordinator._coalescer.skipped == 1
+    finally:
+        await coordinator._coalescer.async_stop()
+        await coordinator.api.close()
+        await sim.stop()
+
+
+async def test_unreachable_device_fails_a_live_read_cleanly():
+    """Mode changes read live, they fail with a message once the circuit opens."""
+    integration = load_integration("")
+    sim, port = await start_simulator()
+    await sim.stop()
+    coordinator = await make_coordinator(port)
+    try:
+        for _ in range(FAILURE_THRESHOLD + 1):
+            with pytest.raises(integration.HomeAssistantError):
+                await coordinator.async_read_current("getBetriebArtM1")
+        assert coordinator.api.circuit == CIRCUIT_OPEN
+    finally:
+        await coordinator._coalescer.async_stop()
+        await coordinator.api.close()
+
+
+async def test_listeners_learn_which_updates_are_polls():
+    sim, port = await start_simulator()
+    coordinator = await make_coordinator(port)
+    polled = []
+    coordinator.async_add_listener(
+        lambda: polled.append(coordinator.polled), ["getTempWWsoll"]
+    )
+    try:
+        await coordinator._async_poll(["getTempWWsoll"])
+        await coordinator.async_write("setTempWWsoll", "45")
+        assert coordinator.writing("getTempWWsoll")
+        await asyncio.sleep(WINDOW * 10)
+        assert not coordinator.writing("getTempWWsoll")
+        assert polled == [True, False]
+        assert not coordinator.polled
+    finally:
+        await coordinator._coalescer.async_stop()
+        await coordinator.api.close()
+        await sim.stop()
+
+
+def make_scheduler(adaptive=None, tiers=None):
+    """Return a coordinator of a device never connected, to test its schedule."""
+    integration = load_integration("")
+    coordinator = integration.Coordinator(
+        None,
+        Device("127.0.0.1", 0),
+        {
+            integration.TIER_FAST: 10,
+            integration.TIER_NORMAL: 60,
+            integration.TIER_SLOW: 3600,
+        },
+        tiers,
+        adaptive,
+    )
+    coordinator._started = 0
+    return integration, coordinator
+
+
+def test_faster_tier_and_configured_tier_win():
+    integration, coordinator = make_scheduler(tiers={"getTempWWist": "slow"})
+    coordinator.register({"getTempA": integration.TIER_NORMAL})
+    coordinator.register({
+        "getTempA": integration.TIER_FAST,
+        "getBrennerStarts": integration.TIER_SLOW,
+        "getTempWWist": integration.TIER_FAST,
+    })
+    coordinator.register({"getTempA": integration.TIER_SLOW})
+    assert coordinator._commands == {
+        "getTempA": integration.TIER_FAST,
+        "getBrennerStarts": integration.TIER_SLOW,
+        "getTempWWist": integration.TIER_SLOW,
+    }
+
+
+def test_batches_of_a_tier_are_spread_over_its_interval():
+    integration, coordinator = make_scheduler()
+    keys = [f"getKey{index}" for index in range(2 * integration.SLOT_SIZE + 1)]
+    coordinator.register(dict.fromkeys(keys, integration.TIER_NORMAL))
+    assert [coordinator._phases[key] for key in keys[::integration.SLOT_SIZE]] == [
+        0, 1 / 3, 2 / 3,
+    ]
+    second = keys[integration.SLOT_SIZE]
+    assert coordinator._next_due(keys[0], 0) == 60
+    assert coordinator._next_due(second, 0) == 20
+    assert coordinator._next_due(second, 25) == 80
+
+
+async def test_tiers_poll_at_their_own_rates(monkeypatch):
+    integration = load_integration("")
+    monkeypatch.setattr(integration, "COALESCE_WINDOW", 0.005)
+    sim, port = await start_simulator(latency=0)
+    coordinator = integration.Coordinator(
+        None,
+        Device("127.0.0.1", port),
+        {
+            integration.TIER_FAST: 0.05,
+            integration.TIER_NORMAL: 0.2,
+            integration.TIER_SLOW: 60,
+        },
+    )
+    coordinator.register({
+        "getTempA": integration.TIER_FAST,
+        "getTempWWist": integration.TIER_NORMAL,
+        "getBrennerStarts": integration.TIER_SLOW,
+        "getBrennerStunden1": integration.TIER_ON_DEMAND,
+    })
+    coordinator._ready.set()
+    task = asyncio.ensure_future(coordinator._async_run())
+    try:
+        await asyncio.sleep(0.5)
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await coordinator.api.close()
+        await sim.stop()
+    polls = collections.Counter(sim.log)
+    assert polls["getTempA"] > polls["getTempWWist"] > polls["getBrennerStarts"] == 1
+    assert polls["getBrennerStunden1"] == 0
+
+
+def make_adaptive():
+    integration, coordinator = make_scheduler(
+        adaptive={"min_factor": 0.25, "max_factor": 4}
+    )
+    coordinator.register({
+        integration.ADAPTIVE_BURNER: integration.TIER_FAST,
+        integration.ADAPTIVE_PUMP: integration.TIER_FAST,
+        "getTempA": integration.TIER_NORMAL,
+        "getBrennerStarts": integration.TIER_SLOW,
+    })
+    return integration, coordinator
+
+
+def test_idle_device_is_polled_less_often():
+    integration, coordinator = make_adaptive()
+    coordinator._values = {
+        integration.ADAPTIVE_BURNER: "0.0 %",
+        integration.ADAPTIVE_PUMP: "0",
+    }
+    factors = []
+    for _ in range(5):
+        coordinator._adapt(0)
+        factors.append(coordinator._factor)
+    assert factors == [1.5, 2.25, 3.375, 4, 4]
+    assert coordinator._interval("getTempA") == 240
+    # burner and pump keep the configured rate, slow commands are not adapted
+    assert coordinator._interval(integration.ADAPTIVE_BURNER) == 10
+    assert coordinator._interval("getBrennerStarts") == 3600
+
+
+def test_active_burner_speeds_up_polls_at_once():
+    integration, coordinator = make_adaptive()
+    coordinator._values = {
+        integration.ADAPTIVE_BURNER: "40.0 %",
+        integration.ADAPTIVE_PUMP: "1",
+    }
+    coordinator._due = dict.fromkeys(coordinator._commands, 1000)
+    coordinator._adapt(100)
+    assert coordinator._factor == 0.25
+    assert coordinator._interval("getTempA") == 15
+    assert coordinator._interval(integration.ADAPTIVE_PUMP) == 2.5
+    assert coordinator._due["getTempA"] == 105
+    assert coordinator._due["getBrennerStarts"] == 1000
+
+
+def test_unreadable_activity_keeps_the_factor():
+    integration, coordinator = make_adaptive()
+    coordinator._values = {integration.ADAPTIVE_BURNER: "", integration.ADAPTIVE_PUMP: ""}
+    coordinator._adapt(0)
+    assert coordinator._factor == 1.0
@@ -0,0 +1,298 @@
+"""Tests of the telnet client against the simulator."""
+
+import asyncio
+
+import pytest
+
+from conftest import start_simulator
+from pyvcontrold.cache import FRESHNESS_SLOW, CommandCache
+from pyvcontrold.device import (
+    CIRCUIT_CLOSED,
+    CIRCUIT_OPEN,
+    FAILURE_THRESHOLD,
+    PIPELINE_DEPTH,
+    PRIORITY_POLL,
+    QUEUE_LIMIT,
+    Device,
+)
+from pyvcontrold.simulator import (
+    COMMANDS,
+    FAULT_DROP,
+    FAULT_ERR,
+    FAULT_PARTIAL,
+    FAULT_REFUSE,
+    FAULT_STALL,
+)
+from pyvcontrold.stats import STAT_ERRORS, STAT_RETRIES, STAT_TIMEOUTS
+from pyvcontrold.timeouts import TimeoutEstimator
+
+
+async def test_read_many_pipelines_one_session():
+    sim, port = await start_simulator()
+    dev = Device("127.0.0.1", port)
+    try:
+        values = await dev.read_many(list(COMMANDS))
+        assert values == COMMANDS
+        assert list(values) == list(COMMANDS)
+        assert sim.sessions == 1
+        assert await dev.readfloat("getTempA") == 12.3
+        assert await dev.readint("getBrennerStarts") == 12345
+        assert dev.queue_stats["poll_jobs"] == -(-len(COMMANDS) // PIPELINE_DEPTH)
+    finally:
+        await dev.close()
+        await sim.stop()
+
+
+async def test_cached_commands_stay_off_the_bus():
+    sim, port = await start_simulator()
+    cache = CommandCache(classes={"getBrennerStarts": FRESHNESS_SLOW})
+    dev = Device("127.0.0.1", port, cache)
+    try:
+        for _ in range(3):
+            await dev.read_many(["getTempA", "getBrennerStarts"])
+        assert sim.log.count("getTempA") == 3
+        assert sim.log.count("getBrennerStarts") == 1
+        assert await dev.write("setBrennerStarts", "1")
+        assert await dev.read("getBrennerStarts") == "1"
+        assert sim.log.count("getBrennerStarts") == 2
+    finally:
+        await dev.close()
+        await sim.stop()
+
+
+async def test_err_reply_reads_empty():
+    sim, port = await start_simulator()
+    dev = Device("127.0.0.1", port)
+    try:
+        values = await dev.read_many(["getTempA", "getNothing", "getTempWWist"])
+        assert values == {
+            "getTempA": COMMANDS["getTempA"],
+            "getNothing": "",
+            "getTempWWist": COMMANDS["getTempWWist"],
+        }
+        assert dev.stats.counters[STAT_ERRORS] == 1
+    finally:
+        await dev.close()
+        await sim.stop()
+
+
+class ResetOnCloseDevice(Device):
+    """Loses the connection while ending a session."""
+
+    async def _send(self, msg):
+        if msg == "close":
+            raise ConnectionResetError("Connection reset by peer")
+        await super()._send(msg)
+
+
+async def test_reset_while_closing_drops_the_connection():
+    sim, port = await start_simulator()
+    dev = ResetOnCloseDevice("127.0.0.1", port)
+    try:
+        values = await dev.read_many(["getTempA", "getNothing"])
+        assert values == {"getTempA": COMMANDS["getTempA"], "getNothing": ""}
+        assert await dev.read("getTempWWist") == COMMANDS["getTempWWist"]
+    finally:
+        await dev.close()
+        await sim.stop()
+
+
+@pytest.mark.parametrize("fault", [FAULT_DROP, FAULT_ERR, FAULT_PARTIAL, FAULT_REFUSE])
+async def test_recovers_from_fault(fault):
+    sim, port = await start_simulator()
+    dev = Device("127.0.0.1", port, timeouts=TimeoutEstimator(0.05, 0.2))
+    try:
+        await dev.read("getTempA")
+        await dev.close()
+        sim.inject(fault)
+        try:
+            first = await dev.read("getTempA")
+        except ConnectionError:
+            # a refused session fails the read, the next one reconnects
+            first = ""
+        second = await dev.read("getTempA")
+        assert COMMANDS["getTempA"] in (first, second)
+        assert sim.injected[fault] == 1
+    finally:
+        await dev.close()
+        await sim.stop()
+
+
+async def test_stalled_reply_times_out_and_retries():
+    sim, port = await start_simulator()
+    dev = Device("127.0.0.1", port, timeouts=TimeoutEstimator(0.05, 0.2))
+    try:
+        await dev.read("getTempA")
+        sim.inject(FAULT_STALL)
+        assert await dev.read("getTempWWist") == COMMANDS["getTempWWist"]
+        assert dev.stats.counters[STAT_TIMEOUTS] == 1
+        assert dev.stats.counters[STAT_RETRIES] == 1
+    finally:
+        await dev.close()
+        await sim.stop()
+
+
+async def test_write_preempts_queued_polls():
+    sim, port = await start_simulator(latency=0.01)
+    dev = Device("127.0.0.1", port)
+    try:
+        poll = asyncio.ensure_future(dev.read_many(list(COMMANDS), PRIORITY_POLL))
+        await asyncio.sleep(0.015)
+        assert await dev.write("setTempWWsoll", "45")
+        values = await poll
+        # the write went out after the first job of the poll, not after all
+        assert sim.log.index("setTempWWsoll 45") <= 2 * PIPELINE_DEPTH
+        assert values["getTempWWist"] == COMMANDS["getTempWWist"]
+        assert sim.values["getTempWWsoll"] == "45"
+    finally:
+        await dev.close()
+        await sim.stop()
+
+
+async def test_circuit_opens_and_probe_closes_it():
+    sim, port = await start_simulator()
+    await sim.stop()
+    dev = Device("127.0.0.1", port)
+    dev._backoff = 0.05
+    try:
+        for _ in range(FAILURE_THRESHOLD):
+            with pytest.raises(ConnectionError):
+                await dev.read("getTempA")
+        assert dev.circuit == CIRCUIT_OPEN
+        with pytest.raises(ConnectionError, match="Circuit open"):
+            await dev.read("getTempA")
+        sim, _ = await start_simulator()
+        await sim.stop()
+        await sim.start(port=port)
+        for _ in range(50):
+            if dev.circuit == CIRCUIT_CLOSED:
+                break
+            await asyncio.sleep(0.02)
+        assert dev.circuit == CIRCUIT_CLOSED
+        assert await dev.read("getTempA") == COMMANDS["getTempA"]
+    finally:
+        await dev.close()
+        await sim.stop()
+
+
+async def test_inventory_kept_when_read_fails():
+    sim, port = await start_simulator()
+    dev = Device("127.0.0.1", port)
+    try:
+        assert await dev.read_inventory() == "20CB"
+        sim.values["getInventory"] = ""
+        sim.inject(FAULT_ERR)
+        assert await dev.read_inventory() == "20CB"
+        assert dev.id == "20CB"
+    finally:
+        await dev.close()
+        await sim.stop()
+
+
+class FailingDevice(Device):
+    """Fails the jobs reading getTempStp2 as a lost adapter would."""
+
+    async def _read_batch(self, keys):
+        if "getTempStp2" in keys:
+            raise ConnectionError("Serial line closed")
+        return await super()._read_batch(keys)
+
+
+async def test_failed_job_keeps_the_replies_of_the_others():
+    sim, port = await start_simulator()
+    dev = FailingDevice("127.0.0.1", port)
+    try:
+        keys = list(COMMANDS)
+        values = await dev.read_many(keys)
+        failed = keys.index("getTempStp2") // PIPELINE_DEPTH * PIPELINE_DEPTH
+        for index, key in enumerate(keys):
+            if failed <= index < failed + PIPELINE_DEPTH:
+                assert values[key] == ""
+            else:
+                assert values[key] == COMMANDS[key]
+        assert list(values) == keys
+        assert len(sim.log) == len(keys) - PIPELINE_DEPTH
+    finally:
+        await dev.close()
+        await sim.stop()
+
+
+async def test_read_many_raises_when_nothing_got_through():
+    sim, port = await start_simulator()
+    dev = Device("127.0.0.1", port)
+    try:
+        dev.circuit = CIRCUIT_OPEN
+        with pytest.raises(ConnectionError):
+            await dev.read_many(list(COMMANDS))
+    finally:
+        await dev.close()
+        await sim.stop()
+
+
+async def test_large_poll_is_not_refused():
+    """A poll cut into more jobs than QUEUE_LIMIT is read in full."""
+    keys = [f"getValue{index}" for index in range(QUEUE_LIMIT * PIPELINE_DEPTH + 12)]
+    sim, port = await start_simulator(
+        latency=0, values={key: str(index) for index, key in enumerate(keys)}
+    )
+    dev = Device("127.0.0.1", port)
+    try:
+        values = await dev.read_many(keys)
+        assert values == {key: str(index) for index, key in enumerate(keys)}
+        assert dev.queue_stats["rejected"] == 0
+        assert len(sim.log) == len(keys)
+    finally:
+        await dev.close()
+        await sim.stop()
+
+
+async def test_reads_beyond_the_limit_are_refused():
+    sim, port = await start_simulator()
+    dev = Device("127.0.0.1", port)
+    try:
+        results = await asyncio.gather(
+            *(dev.read_many(list(COMMANDS)) for _ in range(QUEUE_LIMIT + 1)),
+            return_exceptions=True,
+        )
+        refused = [result for result in results if isinstance(result, Exception)]
+        assert len(refused) == 1
+        assert isinstance(refused[0], ConnectionError)
+        assert dev.queue_stats["rejected"] == 1
+        assert dev.queue_stats["reads"] == 0
+        # writes are never refused
+        assert await dev.write("setTempWWsoll", "45")
+    finally:
+        await dev.close()
+        await sim.stop()
+
+
+async def test_close_fails_the_job_in_flight():
+    sim, port = await start_simulator(latency=5)
+    dev = Device("127.0.0.1", port)
+    try:
+        read = asyncio.ensure_future(dev.read("getTempA"))
+        queued = asyncio.ensure_future(dev.read("getTempWWist"))
+        while not sim.log:
+            await asyncio.sleep(0.01)
+        await dev.close()
+        for job in (read, queued):
+            with pytest.raises(ConnectionError):
+                await asyncio.wait_for(job, 1)
+    finally:
+        await dev.close()
+        await sim.stop()
+
+
+async def test_close_while_connecting_returns():
+    sim, port = await start_simulator()
+    await sim.stop()
+    # step by step through the connect, one step lets the refusal and the
+    # cancellation of the worker meet
+    for steps in range(12):
+        dev = Device("127.0.0.1", port)
+        read = asyncio.ensure_future(dev.read("getTempA"))
+        for _ in range(steps):
+            await asyncio.sleep(0)
+        await asyncio.wait_for(asyncio.shield(dev.close()), 1)
+        with pytest.raises(ConnectionError):
+            await read
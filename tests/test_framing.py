@@ -0,0 +1,32 @@
+"""Tests of the prompt framing."""
+
+from pyvcontrold.device import PROMPT
+from pyvcontrold.framing import ReplyFramer
+
+
+def test_reply_split_across_reads():
+    framer = ReplyFramer(PROMPT)
+    framer.feed(b"12.3 Grad Cel")
+    assert framer.next_reply() is None
+    framer.feed(b"sius\nvctr")
+    assert framer.next_reply() is None
+    framer.feed(b"ld>")
+    assert framer.next_reply() == "12.3 Grad Celsius"
+    assert len(framer) == 0
+
+
+def test_several_replies_in_one_read():
+    framer = ReplyFramer(PROMPT)
+    framer.feed(b"1\nvctrld>2\nvctrld>3")
+    assert framer.next_reply() == "1"
+    assert framer.next_reply() == "2"
+    assert framer.next_reply() is None
+    framer.clear()
+    assert len(framer) == 0
+
+
+def test_prompt_characters_kept_in_value():
+    """Only whitespace is stripped, not the characters of the prompt."""
+    framer = ReplyFramer(PROMPT)
+    framer.feed(b"vd\nvctrld>")
+    assert framer.next_reply() == "vd"
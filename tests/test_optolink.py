@@ -0,0 +1,160 @@
+"""Tests of the P300 backend against the emulator."""
+
+import os
+
+import pytest
+
+from pyvcontrold.coalesce import same_value
+from pyvcontrold.commands import plan
+from pyvcontrold.emulator import Emulator, PtySerialPort
+from pyvcontrold.optolink import (
+    ACK,
+    FUNCTION_READ,
+    FUNCTION_WRITE,
+    MSG_REQUEST,
+    MSG_RESPONSE,
+    OptolinkDevice,
+    ProtocolError,
+    SerialPort,
+    telegram,
+)
+from pyvcontrold.simulator import CIRCUIT_COMMANDS, COMMANDS
+from pyvcontrold.stats import STAT_ERRORS
+
+LATENCY = 0.001
+
+
+def assert_replies(values, expected):
+    """Setpoints come back as whole degrees, compare the numbers."""
+    for key, reply in expected.items():
+        value, _, unit = values[key].partition(" ")
+        text, _, expected_unit = reply.partition(" ")
+        assert same_value(value, text), key
+        assert unit == expected_unit, key
+
+
+class ScriptedPort:
+    """Serial line replaying the given bytes."""
+
+    def __init__(self, data):
+        self.data = bytearray(data)
+        self.written = []
+
+    def write(self, data):
+        self.written.append(data)
+
+    async def read(self, count, timeout):
+        data = bytes(self.data[:count])
+        del self.data[:count]
+        return data
+
+
+@pytest.fixture
+def emulator():
+    return Emulator(latency=LATENCY)
+
+
+def test_telegram_layout():
+    assert telegram(MSG_REQUEST, FUNCTION_READ, 0x5525, 2) == bytes.fromhex(
+        "41 05 00 01 55 25 02 82"
+    )
+
+
+async def test_refresh_reads_one_telegram_per_block(emulator):
+    dev = OptolinkDevice(emulator.start(), port_class=PtySerialPort)
+    try:
+        values = await dev.read_many(list(COMMANDS))
+        assert_replies(values, COMMANDS)
+        reads = [entry for entry in emulator.log if entry[0] == FUNCTION_READ]
+        assert len(reads) == len(plan(COMMANDS)) == 10
+    finally:
+        await dev.close()
+        emulator.stop()
+
+
+async def test_circuits_add_telegrams_not_commands(emulator):
+    dev = OptolinkDevice(emulator.start(), port_class=PtySerialPort)
+    try:
+        keys = list(COMMANDS) + list(CIRCUIT_COMMANDS)
+        values = await dev.read_many(keys)
+        assert_replies(values, {**COMMANDS, **CIRCUIT_COMMANDS})
+        assert len(emulator.log) == len(plan(keys)) == 12
+    finally:
+        await dev.close()
+        emulator.stop()
+
+
+async def test_write_then_read_back(emulator):
+    dev = OptolinkDevice(emulator.start(), port_class=PtySerialPort)
+    try:
+        assert await dev.write("setTempWWsoll", "45")
+        assert await dev.write("setBetriebArtM1", "RED")
+        assert (FUNCTION_WRITE, 0x6300, 1) in emulator.log
+        assert await dev.read("getTempWWsoll") == "45 Grad Celsius"
+        assert await dev.read("getBetriebArtM1") == "RED"
+    finally:
+        await dev.close()
+        emulator.stop()
+
+
+async def test_unknown_commands(emulator):
+    dev = OptolinkDevice(emulator.start(), port_class=PtySerialPort)
+    try:
+        assert await dev.read_many(["getNothing", "getTempA"]) == {
+            "getNothing": "",
+            "getTempA": COMMANDS["getTempA"],
+        }
+        assert dev.stats.counters[STAT_ERRORS] == 1
+        assert not await dev.write("setNothing", "1")
+        assert not await dev.write("setBetriebArtM1", "PARTY")
+    finally:
+        await dev.close()
+        emulator.stop()
+
+
+async def test_missing_device_fails_to_connect():
+    dev = OptolinkDevice("/dev/nonexistent-optolink")
+    try:
+        with pytest.raises(ConnectionError):
+            await dev.read("getTempA")
+    finally:
+        await dev.close()
+
+
+@pytest.mark.parametrize(
+    "response",
+    [
+        # one byte of the two requested
+        telegram(MSG_RESPONSE, FUNCTION_READ, 0x5525, 2, b"\x01"),
+        # one byte, announced as one
+        telegram(MSG_RESPONSE, FUNCTION_READ, 0x5525, 1, b"\x01"),
+        # body cut off after the function
+        bytes([0x41, 0x02, MSG_RESPONSE, FUNCTION_READ, 0x04]),
+    ],
+)
+async def test_short_response_is_refused(response):
+    dev = OptolinkDevice("/dev/nonexistent-optolink")
+    dev._serial = ScriptedPort(ACK + response)
+    with pytest.raises(ProtocolError):
+        await dev._transact(FUNCTION_READ, 0x5525, 2, b"", 1)
+
+
+def test_terminal_errors_are_os_errors():
+    port = SerialPort(os.devnull)
+    with pytest.raises(OSError):
+        port.open()
+    assert port._fd is None
+
+
+async def test_non_terminal_fails_to_connect():
+    dev = OptolinkDevice(os.devnull)
+    try:
+        with pytest.raises(ConnectionError):
+            await dev.read("getTempA")
+    finally:
+        await dev.close()
+
+
+def test_tcp_port_of_the_base_class_is_left_alone():
+    dev = OptolinkDevice("/dev/ttyUSB0", port_class=PtySerialPort)
+    assert dev._port == 0
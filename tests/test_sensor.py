@@ -0,0 +1,189 @@
+"""State writes of the sensor platform, replayed without a running Home Assistant."""
+
+import random
+import types
+
+import pytest
+
+pytest.importorskip("homeassistant")
+
+from conftest import load_integration  # noqa: E402
+from pyvcontrold.stats import PHASE_REPLY, STAT_RETRIES, DeviceStats  # noqa: E402
+
+# Seconds between polls of the replayed minute
+POLL = 5
+
+
+class Coordinator:
+    """Serves one scripted value per command, as polled."""
+
+    def __init__(self):
+        self.api = types.SimpleNamespace(id="20CB")
+        self.unique_id = "20CB-vitodens"
+        self.available = True
+        self.polled = True
+        self.values = {}
+        self.pending = {}
+
+    def writing(self, key):
+        return key in self.pending
+
+    def read(self, key):
+        return self.pending.get(key, self.values[key])
+
+    def readfloat(self, key):
+        return round(float(self.read(key).split(" ", 1)[0]), 2)
+
+
+def scripted_minute():
+    """Return the replies of each poll of one minute, at POLL seconds."""
+    rng = random.Random(1)
+    polls = []
+    outside, supply, modulation = 12.3, 48.1, 40.0
+    for _ in range(60 // POLL):
+        outside += rng.choice([-0.02, 0.0, 0.02, 0.04])
+        supply += rng.uniform(0.1, 0.4)
+        modulation = max(0.0, modulation + rng.uniform(-3, 3))
+        polls.append({
+            "getTempA": f"{outside:.1f} Grad Celsius",
+            "getTempWWist": f"{supply:.1f} Grad Celsius",
+            "getBrennerStatus": f"{modulation:.1f} %",
+            "getBrennerStarts": "12345",
+            "getBetriebArtM1": "H+WW",
+            "getTempRaumNorSollM1": "21.0 Grad Celsius",
+        })
+    return polls
+
+
+def test_deadband_and_min_interval_cut_state_writes(monkeypatch):
+    sensor = load_integration(".sensor")
+    coordinator = Coordinator()
+    now = [1000.0]
+    monkeypatch.setattr(sensor.time, "monotonic", lambda: now[0])
+    writes = {}
+    entities = []
+    for sensor_type, config in sensor.SENSOR_TYPES.items():
+        entity = sensor.VCSensor("Vitodens", coordinator, sensor_type, config, 300)
+        entity.async_write_ha_state = (
+            lambda sensor_type=sensor_type:
+            writes.__setitem__(sensor_type, writes.get(sensor_type, 0) + 1)
+        )
+        entities.append(entity)
+    polls = scripted_minute()
+    notified = 0
+    for values in polls:
+        coordinator.values = values
+        for entity in entities:
+            if entity._sensor[sensor.CONF_COMMAND] in values:
+                notified += 1
+                entity._handle_coordinator_update()
+        now[0] += POLL
+    total = sum(writes.values())
+    # every notification used to be a state write
+    assert notified == 6 * len(polls) == 72
+    assert total == 12
+    # sub-deadband steps of the outside temperature are not written
+    assert writes[sensor.SENSOR_OUTSIDE_TEMPERATURE] < len(polls)
+    # min_interval holds the rising water temperature to one write per 30 s
+    assert writes[sensor.SENSOR_SUPPLY_TEMPERATURE] == 2
+    # unchanged values are written once
+    assert writes[sensor.SENSOR_BURNER_STARTS] == 1
+    assert writes[sensor.SENSOR_HEAT_MODE] == 1
+
+
+def test_diagnostic_sensors_report_bus_statistics():
+    sensor = load_integration(".sensor")
+    coordinator = Coordinator()
+    coordinator.api.stats = DeviceStats()
+    coordinator.api.stats.observe_command("getTempA", 0.05)
+    coordinator.api.stats.observe_phase(PHASE_REPLY, 0.05)
+    reply = sensor.VCDiagnosticSensor(
+        "Vitodens", coordinator, sensor.DIAGNOSTIC_REPLY_TIME
+    )
+    retries = sensor.VCDiagnosticSensor(
+        "Vitodens", coordinator, sensor.DIAGNOSTIC_RETRIES
+    )
+    writes = []
+    retries.async_write_ha_state = lambda: writes.append(retries.native_value)
+    reply._update_state()
+    retries._update_state()
+    assert reply.unique_id == "20CB-vitodens-reply_time"
+    assert reply.name == "Vitodens Bus Reply Time"
+    assert reply.native_unit_of_measurement == "ms"
+    assert reply.native_value == 50.0
+    assert reply.extra_state_attributes["slowest"] == {"getTempA": 50.0}
+    assert retries.native_value == 0
+    coordinator.api.stats.count(STAT_RETRIES)
+    retries._handle_coordinator_update()
+    retries._handle_coordinator_update()
+    assert writes == [1]
+
+
+def outside_sensor(sensor, coordinator, writes):
+    entity = sensor.VCSensor(
+        "Vitodens", coordinator, sensor.SENSOR_OUTSIDE_TEMPERATURE,
+        sensor.SENSOR_TYPES[sensor.SENSOR_OUTSIDE_TEMPERATURE], 300,
+    )
+    entity.async_write_ha_state = lambda: writes.append(
+        (entity.available, entity.native_value)
+    )
+    return entity
+
+
+def test_only_polls_change_the_state():
+    sensor = load_integration(".sensor")
+    coordinator = Coordinator()
+    writes = []
+    entity = outside_sensor(sensor, coordinator, writes)
+    coordinator.values = {"getTempA": "12.3 Grad Celsius"}
+    entity._handle_coordinator_update()
+    # the device went away, the last value is not taken again
+    coordinator.polled = False
+    coordinator.available = False
+    coordinator.values = {"getTempA": "15.0 Grad Celsius"}
+    entity._handle_coordinator_update()
+    coordinator.available = True
+    entity._handle_coordinator_update()
+    coordinator.polled = True
+    entity._handle_coordinator_update()
+    assert writes == [(True, 12.3), (False, 12.3), (True, 12.3), (True, 15.0)]
+
+
+def test_value_waiting_to_be_written_is_not_taken():
+    sensor = load_integration(".sensor")
+    coordinator = Coordinator()
+    writes = []
+    entity = outside_sensor(sensor, coordinator, writes)
+    coordinator.values = {"getTempA": "12.3 Grad Celsius"}
+    entity._handle_coordinator_update()
+    coordinator.pending = {"getTempA": "15.0 Grad Celsius"}
+    entity._handle_coordinator_update()
+    coordinator.pending = {}
+    coordinator.values = {"getTempA": "12.4 Grad Celsius"}
+    entity._handle_coordinator_update()
+    assert writes == [(True, 12.3), (True, 12.4)]
+
+
+def test_aggregate_summarizes_polls_held_back(monkeypatch):
+    sensor = load_integration(".sensor")
+    coordinator = Coordinator()
+    now = [1000.0]
+    monkeypatch.setattr(sensor.time, "monotonic", lambda: now[0])
+    recorded = []
+    entity = outside_sensor(sensor, coordinator, [])
+    entity.async_write_ha_state = lambda: recorded.append(
+        (entity.native_value, entity.extra_state_attributes)
+    )
+    for value in ("12.3", "12.35", "12.25", "12.5"):
+        coordinator.values = {"getTempA": f"{value} Grad Celsius"}
+        entity._handle_coordinator_update()
+        # an availability update does not count as a sample
+        coordinator.polled = False
+        entity._handle_coordinator_update()
+        coordinator.polled = True
+        now[0] += 5
+    assert recorded == [
+        (12.3, {"min": 12.3, "mean": 12.3, "max": 12.3}),
+        (12.5, {"min": 12.25, "mean": 12.35, "max": 12.5}),
+    ]
+    assert not {"min", "mean", "max"} & entity._unrecorded_attributes
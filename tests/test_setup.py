@@ -0,0 +1,239 @@
+"""Tests of the setup of the integration, its store and entity registry."""
+
+import asyncio
+import copy
+import types
+
+import pytest
+
+pytest.importorskip("homeassistant")
+
+from conftest import load_integration, start_simulator  # noqa: E402
+
+# Seconds to wait for the platforms of a device to load
+LOAD_TIMEOUT = 2
+
+
+class Hass:
+    """The parts of Home Assistant the setup uses, tasks run on the test loop."""
+
+    def __init__(self, tmp_path):
+        self.data = {}
+        self.services = types.SimpleNamespace(async_register=lambda *args, **kw: None)
+        self.bus = types.SimpleNamespace(async_listen_once=lambda *args: None)
+        self.config = types.SimpleNamespace(
+            path=lambda *parts: str(tmp_path.joinpath(*parts))
+        )
+        self.tasks = []
+
+    def async_create_task(self, coro):
+        task = asyncio.ensure_future(coro)
+        self.tasks.append(task)
+        return task
+
+    def async_create_background_task(self, coro, name):
+        return self.async_create_task(coro)
+
+    async def async_stop(self, integration):
+        for data in self.data.get(integration.DOMAIN, {}).values():
+            await data[integration.VC_COORDINATOR].async_stop()
+            await data[integration.VC_API].close()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+
+class Registry:
+    """Entity registry holding entries by entity ID."""
+
+    def __init__(self, entries):
+        self.entities = {
+            entity_id: types.SimpleNamespace(
+                entity_id=entity_id, platform=platform, unique_id=unique_id
+            )
+            for entity_id, platform, unique_id in entries
+        }
+
+    def async_update_entity(self, entity_id, new_unique_id):
+        self.entities[entity_id].unique_id = new_unique_id
+
+    def unique_ids(self):
+        return {
+            entity_id: entry.unique_id for entity_id, entry in self.entities.items()
+        }
+
+
+class Setup:
+    """Runs async_setup with a given store and registry, records what it did."""
+
+    def __init__(self, monkeypatch, tmp_path, stored=None, entries=()):
+        self.integration = load_integration("")
+        self.hass = Hass(tmp_path)
+        self.registry = Registry(entries)
+        self.stored = stored
+        self.saves = []
+        # device name and the unique IDs of the registry when its platforms load
+        self.loaded = {}
+        setup = self
+
+        class Store:
+            def __init__(self, hass, version, key):
+                pass
+
+            async def async_load(self):
+                return copy.deepcopy(setup.stored)
+
+            async def async_save(self, data):
+                setup.saves.append(copy.deepcopy(data))
+
+        async def async_load_platform(hass, platform, domain, info, config):
+            name = info[self.integration.VC_NAME]
+            self.loaded.setdefault(name, self.registry.unique_ids())
+
+        monkeypatch.setattr(self.integration, "Store", Store)
+        monkeypatch.setattr(
+            self.integration.discovery, "async_load_platform", async_load_platform
+        )
+        monkeypatch.setattr(
+            self.integration.er, "async_get", lambda hass: self.registry
+        )
+
+    async def run(self, *devices):
+        config = self.integration.CONFIG_SCHEMA(
+            {self.integration.DOMAIN: list(devices)}
+        )
+        await self.integration.async_setup(self.hass, config)
+
+    async def wait_loaded(self, *names):
+        async with asyncio.timeout(LOAD_TIMEOUT):
+            while not set(names) <= set(self.loaded):
+                await asyncio.sleep(0.01)
+
+    def coordinator(self, name):
+        data = self.hass.data[self.integration.DOMAIN][name]
+        return data[self.integration.VC_COORDINATOR]
+
+
+def test_unique_ids_of_the_first_device_get_its_name(monkeypatch, tmp_path):
+    setup = Setup(monkeypatch, tmp_path, entries=[
+        ("sensor.outside", "vcontrold", "20CB-outside_temperature"),
+        ("sensor.second", "vcontrold", "20CB-keller-outside_temperature"),
+        ("sensor.other", "vcontrold", "2098-outside_temperature"),
+        ("sensor.foreign", "template", "20CB-outside_temperature"),
+    ])
+    setup.integration.async_migrate_unique_ids(None, "20CB", "Vitodens 200")
+    assert setup.registry.unique_ids() == {
+        "sensor.outside": "20CB-vitodens_200-outside_temperature",
+        "sensor.second": "20CB-keller-outside_temperature",
+        "sensor.other": "2098-outside_temperature",
+        "sensor.foreign": "20CB-outside_temperature",
+    }
+
+
+async def test_upgrade_from_unstored_inventory_keeps_entities(monkeypatch, tmp_path):
+    """Releases before the store named entities by the ID read at each start."""
+    sim, port = await start_simulator()
+    setup = Setup(monkeypatch, tmp_path, entries=[
+        ("sensor.vitodens_outside", "vcontrold", "20CB-outside_temperature"),
+    ])
+    try:
+        await setup.run({"name": "Vitodens", "port": port})
+        await setup.wait_loaded("Vitodens")
+        assert setup.loaded["Vitodens"] == {
+            "sensor.vitodens_outside": "20CB-vitodens-outside_temperature",
+        }
+        assert setup.saves[-1] == {
+            "inventory": {"Vitodens": "20CB"},
+            "named_unique_ids": True,
+        }
+    finally:
+        await setup.hass.async_stop(setup.integration)
+        await sim.stop()
+
+
+async def test_unique_ids_are_migrated_once(monkeypatch, tmp_path):
+    sim, port = await start_simulator()
+    await sim.stop()
+    setup = Setup(
+        monkeypatch, tmp_path,
+        stored={"inventory": {"Vitodens": "20CB"}, "named_unique_ids": True},
+        entries=[("sensor.old", "vcontrold", "20CB-outside_temperature")],
+    )
+    try:
+        await setup.run({"name": "Vitodens", "port": port})
+        await setup.wait_loaded("Vitodens")
+        assert setup.registry.unique_ids() == {
+            "sensor.old": "20CB-outside_temperature",
+        }
+    finally:
+        await setup.hass.async_stop(setup.integration)
+
+
+async def test_devices_are_named_apart(monkeypatch, tmp_path):
+    sims = [await start_simulator() for _ in range(2)]
+    setup = Setup(monkeypatch, tmp_path, entries=[
+        ("sensor.outside", "vcontrold", "20CB-outside_temperature"),
+    ])
+    try:
+        await setup.run(
+            {"name": "Vitodens", "port": sims[0][1]},
+            {"name": "Keller", "port": sims[1][1]},
+        )
+        await setup.wait_loaded("Vitodens", "Keller")
+        # both controllers report the same inventory ID
+        assert setup.coordinator("Vitodens").unique_id == "20CB-vitodens"
+        assert setup.coordinator("Keller").unique_id == "20CB-keller"
+        assert setup.registry.unique_ids() == {
+            "sensor.outside": "20CB-vitodens-outside_temperature",
+        }
+        assert setup.saves[-1]["inventory"] == {"Vitodens": "20CB", "Keller": "20CB"}
+    finally:
+        await setup.hass.async_stop(setup.integration)
+        for sim, _ in sims:
+            await sim.stop()
+
+
+async def test_stored_inventory_loads_platforms_at_once(monkeypatch, tmp_path):
+    """An ID stored by a single device release names the entities offline."""
+    sim, port = await start_simulator()
+    await sim.stop()
+    setup = Setup(monkeypatch, tmp_path, stored={"inventory": "20CB"})
+    try:
+        await setup.run({"name": "Vitodens", "port": port})
+        await setup.wait_loaded("Vitodens")
+        assert setup.coordinator("Vitodens").unique_id == "20CB-vitodens"
+    finally:
+        await setup.hass.async_stop(setup.integration)
+
+
+async def test_platforms_wait_for_the_first_inventory(monkeypatch, tmp_path):
+    sim, port = await start_simulator()
+    await sim.stop()
+    setup = Setup(monkeypatch, tmp_path)
+    try:
+        await setup.run({"name": "Vitodens", "port": port})
+        await asyncio.sleep(0.2)
+        assert setup.loaded == {}
+        assert setup.saves == []
+    finally:
+        await setup.hass.async_stop(setup.integration)
+
+
+async def test_changed_inventory_is_stored_for_the_next_start(monkeypatch, tmp_path):
+    sim, port = await start_simulator()
+    setup = Setup(
+        monkeypatch, tmp_path,
+        stored={"inventory": {"Vitodens": "2098"}, "named_unique_ids": True},
+    )
+    try:
+        await setup.run({"name": "Vitodens", "port": port})
+        await setup.wait_loaded("Vitodens")
+        async with asyncio.timeout(LOAD_TIMEOUT):
+            while not setup.saves:
+                await asyncio.sleep(0.01)
+        # the entities keep their IDs until the restart
+        assert setup.coordinator("Vitodens").unique_id == "2098-vitodens"
+        assert setup.saves[-1]["inventory"] == {"Vitodens": "20CB"}
+    finally:
+        await setup.hass.async_stop(setup.integration)
+        await sim.stop()
@@ -0,0 +1,35 @@
+"""Tests of the learned reply timeouts."""
+
+import pytest
+
+from pyvcontrold.timeouts import INITIAL_TIMEOUT, TimeoutEstimator
+
+
+def test_unknown_command_uses_initial_timeout():
+    assert TimeoutEstimator().timeout("getTempA") == INITIAL_TIMEOUT
+
+
+def test_timeout_follows_latency_within_bounds():
+    timeouts = TimeoutEstimator(0.2, 5)
+    for _ in range(50):
+        timeouts.observe("getTempA", 0.1)
+    # a steady latency leaves almost no deviation, the lower bound applies
+    assert timeouts.timeout("getTempA") == 0.2
+    for _ in range(50):
+        timeouts.observe("getTempA", 1.0)
+    assert 0.9 <= timeouts.timeout("getTempA") < 2.0
+    for _ in range(50):
+        timeouts.observe("getTempA", 10.0)
+    assert timeouts.timeout("getTempA") == 5
+
+
+def test_expired_doubles_until_next_reply():
+    timeouts = TimeoutEstimator(0.1, 5)
+    timeouts.observe("setTempWWsoll", 0.4)
+    base = timeouts.timeout("setTempWWsoll")
+    timeouts.expired("setTempWWsoll")
+    assert timeouts.timeout("setTempWWsoll") == pytest.approx(base * 2)
+    timeouts.expired("setTempWWsoll")
+    assert timeouts.timeout("setTempWWsoll") == pytest.approx(base * 4)
+    timeouts.observe("setTempWWsoll", 0.4)
+    assert timeouts.timeout("setTempWWsoll") <= base
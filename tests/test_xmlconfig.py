@@ -0,0 +1,90 @@
+"""Tests of the command definitions read from vcontrold.xml."""
+
+import os
+import shutil
+
+import pytest
+
+from pyvcontrold import xmlconfig
+from pyvcontrold.commands import (
+    OPERATING_MODES,
+    TYPE_COUNT,
+    TYPE_ENUM,
+    TYPE_HEX,
+    TYPE_HOURS,
+    TYPE_PERCENT,
+    TYPE_SETPOINT,
+    TYPE_STATE,
+    TYPE_TEMP,
+    CommandDef,
+    encode,
+)
+from pyvcontrold.xmlconfig import load_commands
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+
+
+@pytest.fixture
+def xml_dir(tmp_path):
+    for name in ("vcontrold.xml", "vito.xml"):
+        shutil.copy(os.path.join(DATA, name), tmp_path / name)
+    return tmp_path
+
+
+def test_units_map_to_command_types(xml_dir):
+    commands = load_commands(xml_dir / "vcontrold.xml")
+    assert commands["getTempA"] == CommandDef(0x5525, TYPE_TEMP, "Grad Celsius", None, 2)
+    assert commands["getTempWWsoll"].type == TYPE_SETPOINT
+    assert commands["getBrennerStatus"].type == TYPE_PERCENT
+    assert commands["getBrennerStarts"].type == TYPE_COUNT
+    assert commands["getBrennerStunden1"].type == TYPE_HOURS
+    assert commands["getPumpeStatusZirku"].type == TYPE_STATE
+    assert commands["getBetriebArtM2"].type == TYPE_ENUM
+    assert commands["getBetriebArtM2"].values == OPERATING_MODES
+    # formulas without a known divisor are shown raw
+    assert commands["getDruck"].type == TYPE_HEX
+
+
+def test_enum_without_bytes_is_not_a_value(xml_dir):
+    """vcontrold units end their enums with a fallback name without bytes."""
+    cmd = load_commands(xml_dir / "vcontrold.xml")["getBetriebArtM2"]
+    assert "UNKNOWN" not in cmd.values.values()
+    assert cmd.values[0] == "ABSCHALT"
+    assert encode(cmd, "ABSCHALT") == b"\x00"
+
+
+def test_unusable_commands_are_left_out(xml_dir):
+    commands = load_commands(xml_dir / "vito.xml")
+    # unknown unit, and a protocol command other than getaddr and setaddr
+    assert "getDevType" not in commands
+    assert "getError0" not in commands
+    assert "setTempWWsoll" in commands
+
+
+def test_device_overrides(xml_dir):
+    assert load_commands(xml_dir / "vito.xml")["getTempAbgas"].address == 0x0808
+    commands = load_commands(xml_dir / "vito.xml", device_id="20cb")
+    assert commands["getTempAbgas"].address == 0x0816
+
+
+def test_cache_skips_parsing_until_a_file_changes(xml_dir, monkeypatch):
+    cache_path = xml_dir / "commands.json"
+    parsed = load_commands(xml_dir / "vcontrold.xml", cache_path)
+
+    def fail(*args):
+        raise AssertionError("parsed again")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(xmlconfig, "parse_xml", fail)
+        assert load_commands(xml_dir / "vcontrold.xml", cache_path) == parsed
+    with open(xml_dir / "vito.xml", "a", encoding="utf-8") as file:
+        file.write("\n")
+    calls = []
+    monkeypatch.setattr(
+        xmlconfig, "parse_xml",
+        lambda sources, device_id: calls.append(sources) or {},
+    )
+    assert load_commands(xml_dir / "vcontrold.xml", cache_path) == {}
+    assert len(calls) == 1
+    assert load_commands(xml_dir / "vcontrold.xml", cache_path, "20CB") == {}
+    assert len(calls) == 2
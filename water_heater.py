@@ -1,6 +1,5 @@
 
 """Viessmann water_heater device."""
-import sys
 import logging
 
 from homeassistant.components.water_heater import (
@@ -15,8 +14,9 @@ from homeassistant.const import (
   STATE_OFF,
   STATE_ON,
 )
+from homeassistant.core import callback
 
-from . import DOMAIN as VC_DOMAIN, VC_API, VC_HEATING_TYPE, VC_NAME
+from . import DOMAIN as VC_DOMAIN, TIER_NORMAL, VC_COORDINATOR, VC_HEATING_TYPE, VC_NAME
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -32,6 +32,12 @@ VC_GET_CURRENT_TEMP = "getTempWWist"                      # "getWarmwaterTcurren
 VC_GET_TARGET_TEMP = "getTempWWsoll"                      # "getWarmwaterTtarget"
 VC_GET_MODE = "getBetriebArtM1"                           # "getOpModeM1_vito"
 
+VC_POLL_COMMANDS = {
+    VC_GET_CURRENT_TEMP: TIER_NORMAL,
+    VC_GET_TARGET_TEMP: TIER_NORMAL,
+    VC_GET_MODE: TIER_NORMAL,
+}
+
 VC_SET_MODE = "setBetriebArtM1"                           # "setOpModeA1M1"
 VC_SET_TARGET_TEMP = "setTempWWsoll"                      # "setWarmwaterTtarget"
 
@@ -56,7 +62,7 @@ SUPPORT_FLAGS_HEATER = SUPPORT_TARGET_TEMPERATURE | SUPPORT_OPERATION_MODE
 #    OPERATION_MODE_ON: VC_MODE_WW,
 #}
 
-def setup_platform(hass, config, add_entities, discovery_info=None):
+async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
     """Create the VC water_heater devices."""
 
     if discovery_info is None:
@@ -64,13 +70,15 @@ def setup_platform(hass, config, add_entities, discovery_info=None):
 
     _LOGGER.info("Setup VC waterheater platform")
 
-    vc_api = hass.data[VC_DOMAIN][VC_API]
-    heating_type = hass.data[VC_DOMAIN][VC_HEATING_TYPE]
-    add_entities(
+    data = hass.data[VC_DOMAIN][discovery_info[VC_NAME]]
+    coordinator = data[VC_COORDINATOR]
+    coordinator.register(VC_POLL_COMMANDS, "water_heater")
+    heating_type = data[VC_HEATING_TYPE]
+    async_add_entities(
         [
             VCWater(
-                f"{hass.data[VC_DOMAIN][VC_NAME]} Water Heater",
-                vc_api,
+                f"{data[VC_NAME]} Water Heater",
+                coordinator,
                 heating_type,
             )
         ]
@@ -80,35 +88,64 @@ def setup_platform(hass, config, add_entities, discovery_info=None):
 class VCWater(WaterHeaterEntity):
     """Representation of the domestic hot water device."""
 
-    def __init__(self, name, api, heating_type):
+    def __init__(self, name, coordinator, heating_type):
         """Initialize the DHW water_heater device."""
         self._name = name
         self._state = None
-        self._api = api
+        self._coordinator = coordinator
+        self._api = coordinator.api
         self._attributes = {}
         self._target_temperature = None
         self._current_temperature = None
         self._current_mode = None
         self._heating_type = heating_type
 
-    def update(self):
+    @property
+    def should_poll(self):
+        """Values are pushed by the coordinator."""
+        return False
+
+    @property
+    def available(self):
+        """Return True while vcontrold can be reached."""
+        return self._coordinator.available
+
+    async def async_added_to_hass(self):
+        """Subscribe to coordinator updates."""
+        self.async_on_remove(
+            self._coordinator.async_add_listener(
+                self._handle_coordinator_update, VC_POLL_COMMANDS
+            )
+        )
+
+    @callback
+    def _handle_coordinator_update(self):
+        self._update_state()
+        self.async_write_ha_state()
+
+    async def async_update(self):
         """Let HA know there has been an update from the API."""
+        try:
+            await self._coordinator.async_request(list(VC_POLL_COMMANDS))
+        except ConnectionError:
+            _LOGGER.error("Unable to retrieve data from VControld")
+        self._update_state()
+
+    def _update_state(self):
         try:
               self._current_temperature = (
-                  self._api.readfloat(VC_GET_CURRENT_TEMP)
+                  self._coordinator.readfloat(VC_GET_CURRENT_TEMP)
               )
 
               self._target_temperature = (
-                  self._api.readfloat(VC_GET_TARGET_TEMP)
+                  self._coordinator.readfloat(VC_GET_TARGET_TEMP)
               )
 
-              if VC_MODE_DHW in self._api.read(VC_GET_MODE):
+              if VC_MODE_DHW in self._coordinator.read(VC_GET_MODE):
                 self._current_mode = STATE_ON
               else:
                 self._current_mode = STATE_OFF
 
-        except ConnectionError:
-            _LOGGER.error("Unable to retrieve data from VControld")
         except ValueError:
             _LOGGER.error("Unable to decode data from VControld")
 
@@ -137,11 +174,11 @@ class VCWater(WaterHeaterEntity):
         """Return the temperature we try to reach."""
         return self._target_temperature
 
-    def set_temperature(self, **kwargs):
+    async def async_set_temperature(self, **kwargs):
         """Set new target temperatures."""
         temp = int(kwargs.get(ATTR_TEMPERATURE))
         if temp is not None:
-            self._api.write(VC_SET_TARGET_TEMP, str(temp))
+            await self._coordinator.async_write(VC_SET_TARGET_TEMP, str(temp))
             _LOGGER.debug("Setting target temp to %i", temp)
             self._target_temperature = float(temp)
 
@@ -165,8 +202,8 @@ class VCWater(WaterHeaterEntity):
         """Return current operation ie. heat, cool, idle."""
         return self._current_mode
 
-    def set_operation_mode(self, op_mode):
-        act_mode = self._api.read(VC_GET_MODE)
+    async def async_set_operation_mode(self, op_mode):
+        act_mode = await self._coordinator.async_read_current(VC_GET_MODE)
         vc_mode = None
         if (op_mode == STATE_ON):
           if act_mode != VC_MODE_DHWANDHEATING:
@@ -176,7 +213,7 @@ class VCWater(WaterHeaterEntity):
         if vc_mode is None:
           return
         _LOGGER.debug("Setting water mode to %s / %s", op_mode, vc_mode)
-        self._api.write(VC_SET_MODE, vc_mode)
+        await self._coordinator.async_write(VC_SET_MODE, vc_mode)
         self._current_mode = op_mode
 
     @property